@@ -3,12 +3,18 @@ from datetime import timezone
 from django.contrib import admin
 from .tasks import generate_report
 
-from libraryMS.models import BorrowingTransaction, Reservation, Book, Borrower, Report, Notification, Review, Author
+from django.db.models import Avg, Count, Max
+
+from libraryMS.models import (
+    BorrowingTransaction, Reservation, Hold, Book, Copy, Borrower, Report, Notification, Review, Author, TaskRun
+)
 
 # Register your models here.
 admin.site.register(BorrowingTransaction)
 admin.site.register(Reservation)
+admin.site.register(Hold)
 admin.site.register(Book)
+admin.site.register(Copy)
 admin.site.register(Borrower)
 admin.site.register(Notification)
 admin.site.register(Review)
@@ -36,3 +42,38 @@ class ReportAdmin(admin.ModelAdmin):
 
 
 admin.site.register(Report, ReportAdmin)
+
+
+class TaskRunAdmin(admin.ModelAdmin):
+    list_display = (
+        'task_name', 'status', 'started_at', 'runtime', 'queue_lag', 'rows_scanned', 'rows_written',
+        'rows_deleted', 'chunks', 'rows_per_sec', 'worker'
+    )
+    list_filter = ('task_name', 'status')
+    date_hierarchy = 'started_at'
+    search_fields = ('task_id',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        # Per-task totals over the runs matching the current filters, above the run history
+        response = super().changelist_view(request, extra_context)
+        changelist = getattr(response, 'context_data', {}).get('cl')
+        if changelist is not None:
+            response.context_data['task_summary'] = (
+                changelist.queryset.order_by().values('task_name')
+                .annotate(
+                    runs=Count('id'), avg_runtime=Avg('runtime'), max_runtime=Max('runtime'),
+                    avg_queue_lag=Avg('queue_lag'), max_queue_lag=Max('queue_lag'),
+                    avg_rows_scanned=Avg('rows_scanned'), last_started=Max('started_at'),
+                )
+                .order_by('task_name')
+            )
+        return response
+
+
+admin.site.register(TaskRun, TaskRunAdmin)
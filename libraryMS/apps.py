@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class LibraryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'libraryMS'
+
+    def ready(self):
+        # Connect the Celery task telemetry signal handlers
+        from libraryMS import telemetry  # noqa: F401
+        from libraryMS.routers import check_pin_cache
+        check_pin_cache()
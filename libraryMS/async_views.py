@@ -0,0 +1,122 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from libraryMS.conditional import acatalog_version
+from libraryMS.pagination import IdCursorPagination
+from libraryMS.routers import ais_pinned, use_replica
+from libraryMS.serializers import ReviewSerializer
+from libraryMS.views import BookViewSet, BorrowingTransactionViewSet, NotificationViewSet
+
+
+class AsyncReadMixin:
+    """
+    Run a viewset's coroutine handlers on the event loop, and the rest in a worker thread as usual.
+
+    Authentication and permission checks are the viewset's own; they read the
+    token and the user's role, never the database. Queries go through Django's
+    async ORM. Rows are loaded with their relations before serialization, so
+    serializers never touch the database and run on the loop.
+    """
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        # The view returns dispatch()'s coroutine for Django to await
+        return markcoroutinefunction(super().as_view(actions, **initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        handler = getattr(self, request.method.lower(), None)
+        if not iscoroutinefunction(handler):
+            return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+        # APIView.dispatch, awaiting the handler
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            if self.may_read_replica(request):
+                # Looked up here rather than by initial(), whose cache read would block the loop
+                self._pinned = await ais_pinned(request.user)
+            self.initial(request, *args, **kwargs)
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    def is_pinned(self, request):
+        return self._pinned
+
+    async def afilter_queryset(self, queryset):
+        # django-filter checks model choices, such as the author filter, against the database
+        if self.filter_backends:
+            return await sync_to_async(self.filter_queryset)(queryset)
+        return self.filter_queryset(queryset)
+
+    async def aget_object(self):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        lookup = {self.lookup_field: self.kwargs[self.lookup_url_kwarg or self.lookup_field]}
+        try:
+            obj = await queryset.aget(**lookup)
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def list(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        if page is None:
+            return Response(self.get_serializer([row async for row in queryset], many=True).data)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    async def retrieve(self, request, *args, **kwargs):
+        return Response(self.get_serializer(await self.aget_object()).data)
+
+
+class AsyncBookViewSet(AsyncReadMixin, BookViewSet):
+
+    async def list(self, request, *args, **kwargs):
+        version, changed_at = await acatalog_version()
+        etag = self.list_etag(request, version)
+        response = self.not_modified(request, etag, changed_at)
+        if response is None:
+            key, response = await self.acached_response(request)
+            if response is None:
+                # Filled from the primary, as on the sync path
+                with use_replica(False):
+                    response = await super().list(request, *args, **kwargs)
+                response = await self.astore_response(request, key, response)
+        return self.add_validators(response, etag, changed_at)
+
+    async def retrieve(self, request, *args, **kwargs):
+        lookup = self.detail_lookup()
+        queryset = await self.afilter_queryset(self.get_queryset())
+        updated_at = await queryset.filter(**lookup).values_list('updated_at', flat=True).afirst()
+        if updated_at is None:
+            return await super().retrieve(request, *args, **kwargs)
+        etag = self.detail_etag(request, lookup, updated_at)
+        response = self.not_modified(request, etag, updated_at)
+        if response is None:
+            response = await super().retrieve(request, *args, **kwargs)
+        return self.add_validators(response, etag, updated_at)
+
+    @action(detail=True, methods=['get'], serializer_class=ReviewSerializer)
+    async def reviews(self, request, pk=None):
+        """Fetch reviews for a specific book"""
+        book = await self.aget_object()
+        paginator = IdCursorPagination()
+        page = await paginator.apaginate_queryset(self.reviews_queryset(book), request, view=self)
+        return paginator.get_paginated_response(self.get_serializer(page, many=True).data)
+
+
+class AsyncBorrowingTransactionViewSet(AsyncReadMixin, BorrowingTransactionViewSet):
+    pass
+
+
+class AsyncNotificationViewSet(AsyncReadMixin, NotificationViewSet):
+    pass
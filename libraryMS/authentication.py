@@ -1,23 +1,63 @@
 from django.contrib.auth.backends import ModelBackend
+from django.db.models import Value
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.models import TokenUser
 from .models import Author, Borrower
 
+# Account models a token's role claim may refer to
+ROLE_MODELS = {
+    'author': Author,
+    'borrower': Borrower,
+}
+
 
 class CustomModelBackend(ModelBackend):
     def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            # Check Author model
-            user = Author.objects.get(username=username)
-            if user.check_password(password):
-                return user
-        except Author.DoesNotExist:
-            pass
+        if username is None or password is None:
+            return None
+
+        # Look up the username in both account tables with a single query
+        fields = ('id', 'password', 'is_active')
+        author_rows = Author.objects.filter(username=username).values(*fields, role=Value('author'))
+        borrower_rows = Borrower.objects.filter(username=username).values(*fields, role=Value('borrower'))
+        # Check Author before Borrower
+        candidates = sorted(author_rows.union(borrower_rows, all=True), key=lambda row: row['role'] != 'author')
 
-        try:
-            # Check Borrower model
-            user = Borrower.objects.get(username=username)
-            if user.check_password(password):
+        for row in candidates:
+            model = ROLE_MODELS[row['role']]
+            user = model(id=row['id'], username=username, password=row['password'], is_active=row['is_active'])
+            if user.check_password(password) and self.user_can_authenticate(user):
                 return user
-        except Borrower.DoesNotExist:
-            pass
 
         return None
+
+
+class RoleTokenUser(TokenUser):
+    """
+    Request user built from the access token alone, without touching the database.
+
+    The token's ``role`` claim decides which of ``author`` or ``borrower`` is
+    available. Each resolves to an unsaved model instance carrying only its
+    primary key, which is enough for filtering, comparing and assigning foreign
+    keys. ``hasattr(user, 'author')`` keeps working as a role check.
+    """
+
+    def _role_instance(self, role):
+        if self.token.get('role') != role:
+            raise AttributeError(role)
+        return ROLE_MODELS[role](pk=self.token['role_id'])
+
+    @cached_property
+    def author(self):
+        return self._role_instance('author')
+
+    @cached_property
+    def borrower(self):
+        return self._role_instance('borrower')
+
+    def __getattr__(self, attr):
+        # TokenUser falls back to token claims for unknown attributes, which would turn the
+        # other role's AttributeError into None and make hasattr() true for both roles
+        if attr in ROLE_MODELS:
+            raise AttributeError(attr)
+        return super().__getattr__(attr)
@@ -0,0 +1,390 @@
+import math
+import os
+import platform
+import random
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+from itertools import islice
+
+import django
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from libraryMS import renderers, tasks
+from libraryMS.models import (
+    Author, Borrower, Book, BorrowingTransaction, Copy, Notification, Report, Reservation, Review,
+)
+from libraryMS.ratings import rebuild_counters
+from libraryMS.serializers import BookSerializer, BorrowingTransactionSerializer, RoleTokenObtainPairSerializer
+
+# Row counts of the synthetic library, by preset
+SCALES = {
+    'tiny': {
+        'authors': 5, 'books': 60, 'borrowers': 40, 'loans': 300, 'reservations': 5,
+        'reviews': 150, 'notifications': 400,
+    },
+    'small': {
+        'authors': 100, 'books': 2_000, 'borrowers': 500, 'loans': 20_000, 'reservations': 100,
+        'reviews': 10_000, 'notifications': 40_000,
+    },
+    'large': {
+        'authors': 50_000, 'books': 1_000_000, 'borrowers': 200_000, 'loans': 10_000_000,
+        'reservations': 50_000, 'reviews': 5_000_000, 'notifications': 20_000_000,
+    },
+}
+
+# A quarter of the borrowers hold a book
+OPEN_LOAN_SHARE = 0.25
+
+# Rows per payload in the renderer cases, about what a bulk sync pulls per request
+RENDER_ROWS = 500
+
+
+def _batches(rows, batch_size):
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        yield batch
+
+
+def _bulk_insert(model, rows, batch_size, log):
+    """Insert ``rows`` in batches and return their primary keys."""
+    ids = []
+    for batch in _batches(rows, batch_size):
+        ids.extend(obj.pk for obj in model.objects.bulk_create(batch))
+        log(f"  {model._meta.model_name}: {len(ids)}")
+    return ids
+
+
+def seed_library(scale, batch_size=5000, seed=0, log=lambda message: None):
+    """
+    Fill the database with a synthetic library of the given row counts, using bulk inserts only.
+
+    Rows are tagged with a random prefix, so a database can be seeded more than once.
+    Returns the counts actually inserted.
+    """
+    rng = random.Random(seed)
+    tag = uuid.uuid4().hex[:4]
+    now = timezone.now()
+    categories = [choice for choice, _ in Book.CATEGORY_CHOICES]
+
+    author_ids = _bulk_insert(Author, (
+        Author(
+            username=f'{tag}-author-{i}', password='!', name=f"Author {i}", biography="",
+            nationality="", date_of_birth='1970-01-01'
+        )
+        for i in range(scale['authors'])
+    ), batch_size, log)
+    borrower_ids = _bulk_insert(Borrower, (
+        Borrower(username=f'{tag}-borrower-{i}', password='!') for i in range(scale['borrowers'])
+    ), batch_size, log)
+    # Reports are generated by staff accounts
+    User.objects.create(username=f'{tag}-admin', password='!', is_staff=True)
+
+    # Book i, a single copy, is lent to borrower i; the first `reservations` of those are reserved by the next borrower
+    open_loans = min(int(len(borrower_ids) * OPEN_LOAN_SHARE), scale['books'])
+    reservations = min(scale['reservations'], open_loans, max(len(borrower_ids) - 1, 0))
+    book_ids = _bulk_insert(Book, (
+        Book(
+            title=f"Book {i}", description=f"Synthetic book number {i}", author_id=author_ids[i % len(author_ids)],
+            ISBN=f'{tag}{i:09d}', category=categories[i % len(categories)], publication_date='2000-01-01',
+            available_copies=0 if i < open_loans else 1,
+            reserved_by_id=borrower_ids[i + 1] if i < reservations else None,
+        )
+        for i in range(scale['books'])
+    ), batch_size, log)
+
+    copy_ids = _bulk_insert(Copy, (
+        Copy(book_id=book_id, status=Copy.ON_LOAN, borrower_id=borrower_ids[i]) if i < open_loans
+        else Copy(book_id=book_id)
+        for i, book_id in enumerate(book_ids)
+    ), batch_size, log)
+
+    due_dates = [now + timedelta(days=rng.randint(-10, 20)) for _ in range(open_loans)]
+    loans = _bulk_insert(BorrowingTransaction, (
+        BorrowingTransaction(
+            borrower_id=borrower_ids[i], book_id=book_ids[i], copy_id=copy_ids[i], due_date=due_dates[i]
+        )
+        for i in range(open_loans)
+    ), batch_size, log)
+    for batch in _batches(borrower_ids[:open_loans], batch_size):
+        Borrower.objects.filter(pk__in=batch).update(active_loans=1)
+    loans += _bulk_insert(BorrowingTransaction, (
+        BorrowingTransaction(
+            borrower_id=rng.choice(borrower_ids), book_id=rng.choice(book_ids),
+            due_date=now - timedelta(days=rng.randint(1, 365)), is_returned=True
+        )
+        for _ in range(max(scale['loans'] - open_loans, 0))
+    ), batch_size, log)
+
+    reservation_ids = _bulk_insert(Reservation, (
+        Reservation(
+            borrower_id=borrower_ids[i + 1], book_id=book_ids[i], expiration_date=due_dates[i] + timedelta(days=10)
+        )
+        for i in range(reservations)
+    ), batch_size, log)
+    review_ids = _bulk_insert(Review, (
+        Review(
+            borrower_id=rng.choice(borrower_ids), book_id=rng.choice(book_ids), review_message="",
+            rating=rng.randint(1, 5)
+        )
+        for _ in range(scale['reviews'])
+    ), batch_size, log)
+    rebuild_counters(batch_size=batch_size)
+    notification_ids = _bulk_insert(Notification, (
+        Notification(borrower_id=rng.choice(borrower_ids), message="Synthetic notification", read=rng.random() < 0.8)
+        for _ in range(scale['notifications'])
+    ), batch_size, log)
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    return {
+        'authors': len(author_ids), 'books': len(book_ids), 'copies': len(copy_ids), 'borrowers': len(borrower_ids),
+        'loans': len(loans),
+        'reservations': len(reservation_ids), 'reviews': len(review_ids), 'notifications': len(notification_ids),
+    }
+
+
+def percentile(sorted_values, share):
+    """Nearest-rank percentile of an ascending list."""
+    return sorted_values[max(math.ceil(share * len(sorted_values)) - 1, 0)]
+
+
+def measure(run, repeat, rollback=False):
+    """
+    Call ``run`` ``repeat`` times after one warm-up call and summarise latency and queries.
+
+    Every call starts with an empty cache, so list endpoints are timed on the
+    database path. With ``rollback`` each call runs in a transaction that is
+    rolled back, so writes can be repeated against the same rows.
+    """
+    timings, queries, status = [], [], None
+    for attempt in range(repeat + 1):
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            if rollback:
+                with transaction.atomic():
+                    status = run()
+                    transaction.set_rollback(True)
+            else:
+                status = run()
+            elapsed = time.perf_counter() - started
+        if attempt:
+            timings.append(elapsed * 1000)
+            queries.append(len(captured))
+    timings.sort()
+    return {
+        'status': status,
+        'queries': max(queries),
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'max_ms': round(timings[-1], 3),
+    }
+
+
+class Fixtures:
+    """Rows of a seeded library that the benchmark cases act on, found by query rather than assumed."""
+
+    def __init__(self):
+        # An open loan nobody queued for, so it can also be extended
+        loan = BorrowingTransaction.objects.filter(is_returned=False, book__reserved_by=None).order_by('id').first()
+        if loan is None:
+            raise LookupError("The database has no open loans; seed it first.")
+        self.loan = loan
+        self.borrower = loan.borrower
+        self.author = loan.book.author
+        self.author_book = loan.book
+        self.available_book = Book.objects.filter(available_copies__gt=0, reserved_by=None).order_by('id').first()
+        # Book.reserved_by allows one reservation per borrower, so reserving takes someone holding none
+        self.reserver = Borrower.objects.filter(reserved_book=None).exclude(pk=self.borrower.pk).order_by('id').first()
+        self.reservable_book = (
+            Book.objects.filter(available_copies=0, reserved_by=None).exclude(copies__borrower=self.reserver)
+            .order_by('id').first()
+        )
+        self.reservation = Reservation.objects.order_by('id').first()
+        # Someone else holds it, so the loan's borrower joins its hold queue
+        self.queued_book = (
+            Book.objects.filter(reserved_by__isnull=False).exclude(copies__borrower=self.borrower)
+            .exclude(reserved_by=self.borrower).order_by('id').first()
+        )
+        self.notification = Notification.objects.filter(borrower=self.borrower).order_by('id').first()
+        self.review = Review.objects.order_by('id').first()
+        self.admin = User.objects.filter(is_staff=True).order_by('id').first()
+
+    @staticmethod
+    def client_for(account):
+        client = APIClient(SERVER_NAME='localhost')
+        token = RoleTokenObtainPairSerializer.get_token(account).access_token
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client
+
+
+def endpoint_cases(fixtures):
+    """Yield ``(name, run, rollback)`` for every route of the libraryMS router."""
+    borrower = fixtures.client_for(fixtures.borrower)
+    author = fixtures.client_for(fixtures.author)
+    reserver = fixtures.client_for(fixtures.reserver) if fixtures.reserver else None
+    reservation_owner = fixtures.client_for(fixtures.reservation.borrower) if fixtures.reservation else None
+    review_owner = fixtures.client_for(fixtures.review.borrower) if fixtures.review else None
+
+    def call(client, method, path, data=None):
+        return lambda: getattr(client, method)(f'/libraryMS/{path}', data, format='json').status_code
+
+    book, loan = fixtures.author_book, fixtures.loan
+    yield 'authors-list', call(borrower, 'get', 'authors/'), False
+    yield 'authors-detail', call(borrower, 'get', f'authors/{fixtures.author.pk}/'), False
+    yield 'borrowers-list', call(borrower, 'get', 'borrowers/'), False
+    yield 'borrowers-detail', call(borrower, 'get', f'borrowers/{fixtures.borrower.pk}/'), False
+    yield 'books-list-author', call(author, 'get', 'books/'), False
+    yield 'books-detail', call(author, 'get', f'books/{book.pk}/'), False
+    yield 'books-reviews', call(author, 'get', f'books/{book.pk}/reviews/'), False
+    yield 'books-update', call(author, 'patch', f'books/{book.pk}/', {'title': "Renamed"}), True
+    yield 'books-create', call(author, 'post', 'books/', {
+        'title': "New", 'description': "Benchmark", 'ISBN': uuid.uuid4().hex[:13], 'category': 'fiction',
+        'publication_date': '2024-01-01',
+    }), True
+    yield 'books-list-page', call(author, 'get', 'books/?page_size=50'), False
+    yield 'books-search', call(author, 'get', 'books/?search=synthetic%20book'), False
+    # Borrowers browse the whole catalog
+    yield 'books-list-available', call(borrower, 'get', 'books/?available=true&page_size=50'), False
+    if fixtures.available_book:
+        yield 'books-borrow', call(borrower, 'post', f'books/{fixtures.available_book.pk}/borrow/'), True
+    yield 'borrowings-list', call(borrower, 'get', 'borrowings/'), False
+    yield 'borrowings-list-due', call(borrower, 'get', 'borrowings/?filter=due_date'), False
+    yield 'borrowings-detail', call(borrower, 'get', f'borrowings/{loan.pk}/'), False
+    yield 'borrowings-return', call(borrower, 'post', f'borrowings/{loan.pk}/return_book/'), True
+    yield 'borrowings-extend', call(borrower, 'post', f'borrowings/{loan.pk}/extend/'), True
+    yield 'borrowings-batch', call(borrower, 'post', 'borrowings/batch/', {
+        'operations': [{'op': 'return', 'loan': loan.pk}] + (
+            [{'op': 'borrow', 'book': fixtures.available_book.pk}] if fixtures.available_book else []
+        ),
+    }), True
+    yield 'reservations-list', call(borrower, 'get', 'reservations/'), False
+    if reserver and fixtures.reservable_book:
+        yield 'reservations-reserve', call(
+            reserver, 'post', f'reservations/{fixtures.reservable_book.pk}/reserve_book/'
+        ), True
+    if fixtures.queued_book:
+        yield 'reservations-join-queue', call(
+            borrower, 'post', f'reservations/{fixtures.queued_book.pk}/reserve_book/'
+        ), True
+    yield 'reservations-holds', call(borrower, 'get', 'reservations/holds/'), False
+    if reservation_owner:
+        yield 'reservations-cancel', call(
+            reservation_owner, 'post', f'reservations/{fixtures.reservation.pk}/cancel/'
+        ), True
+    yield 'reviews-list', call(borrower, 'get', 'reviews/'), False
+    yield 'reviews-by-book', call(borrower, 'get', f'reviews/book/{book.pk}/'), False
+    yield 'reviews-create', call(borrower, 'post', 'reviews/', {
+        'book_id': book.pk, 'review_message': "Benchmark", 'rating': 4,
+    }), True
+    if review_owner:
+        yield 'reviews-update', call(review_owner, 'patch', f'reviews/{fixtures.review.pk}/', {'rating': 1}), True
+    yield 'notifications-list', call(borrower, 'get', 'notifications/'), False
+    if fixtures.notification:
+        yield 'notifications-mark-read', call(
+            borrower, 'post', f'notifications/{fixtures.notification.pk}/mark_as_read/'
+        ), True
+    yield 'notifications-mark-all-read', call(borrower, 'post', 'notifications/mark_all_as_read/'), True
+
+
+def task_cases(fixtures):
+    """Yield ``(name, run, rollback)`` for every Celery task, and each report type of ``generate_report``."""
+    for task in (
+        tasks.daily_circulation_sweep, tasks.cancel_expired_reservations, tasks.send_reservation_available_notifications,
+        tasks.send_due_date_notifications, tasks.send_overdue_notifications,
+    ):
+        yield f'task-{task.name.rsplit(".", 1)[-1]}', lambda task=task: task()['rows_written'], True
+
+    for report_type, _ in Report.REPORT_TYPES:
+        def run(report_type=report_type):
+            report = Report.objects.create(report_type=report_type, generated_by=fixtures.admin)
+            tasks.generate_report(report.pk)
+            return Report.objects.values_list('status', flat=True).get(pk=report.pk)
+        yield f'report-{report_type}', run, True
+
+
+def render_cases():
+    """
+    Yield ``(name, run, rollback)`` rendering serialized books and loans with each renderer.
+
+    The data is serialized once up front, with its relations expanded, so the
+    cases time the renderer alone on the heaviest payloads.
+    """
+    payloads = {}
+    for payload, serializer_class, expand in (
+        ('books', BookSerializer, ['author', 'reserved_by']),
+        ('loans', BorrowingTransactionSerializer, ['borrower', 'book.author', 'book.reserved_by']),
+    ):
+        queryset = serializer_class.Meta.model.objects.order_by('id')
+        rows = serializer_class.plan_queryset(queryset, expand=expand)[:RENDER_ROWS]
+        payloads[payload] = serializer_class(rows, many=True, expand=expand).data
+    formats = {'stdlib-json': JSONRenderer(), 'json': renderers.FastJSONRenderer()}
+    if renderers.msgpack is not None:
+        formats['msgpack'] = renderers.MessagePackRenderer()
+    for payload, data in payloads.items():
+        for name, renderer in formats.items():
+            def run(data=data, renderer=renderer):
+                renderer.render(data)
+                return renderer.media_type
+            yield f'render-{payload}-{name}', run, False
+
+
+def run_suite(repeat=20, only=None, log=lambda message: None):
+    """Measure every case against the current database and return the results document."""
+    fixtures = Fixtures()
+    cases = {}
+    with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+        os.makedirs(os.path.join(media_root, 'reports'))
+        for name, run, rollback in [*endpoint_cases(fixtures), *task_cases(fixtures), *render_cases()]:
+            if only and not any(pattern in name for pattern in only):
+                continue
+            cases[name] = measure(run, repeat, rollback=rollback)
+            log(f"{name:<46} {cases[name]['p50_ms']:>9.2f} ms p50 {cases[name]['p95_ms']:>9.2f} ms p95 "
+                f"{cases[name]['queries']:>4} queries  [{cases[name]['status']}]")
+    return {
+        'meta': {
+            'database': connection.vendor,
+            'rows': {
+                'books': Book.objects.count(), 'borrowers': Borrower.objects.count(),
+                'loans': BorrowingTransaction.objects.count(), 'reviews': Review.objects.count(),
+                'notifications': Notification.objects.count(),
+            },
+            'repeat': repeat,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'recorded_at': timezone.now().isoformat(),
+        },
+        'cases': cases,
+    }
+
+
+def compare(results, baseline, latency_tolerance=0.25, latency_floor_ms=2.0, query_tolerance=0):
+    """
+    Return a list of regressions of ``results`` against ``baseline``.
+
+    A case regresses when it issues more than ``query_tolerance`` extra queries,
+    when its p95 grows by more than ``latency_tolerance`` (a fraction) and by
+    more than ``latency_floor_ms``, or when its status changes.
+    """
+    regressions = []
+    for name, base in baseline['cases'].items():
+        current = results['cases'].get(name)
+        if current is None:
+            continue
+        if current['status'] != base['status']:
+            regressions.append(f"{name}: status {base['status']} -> {current['status']}")
+        if current['queries'] > base['queries'] + query_tolerance:
+            regressions.append(f"{name}: {base['queries']} -> {current['queries']} queries")
+        slower = current['p95_ms'] - base['p95_ms']
+        if slower > latency_floor_ms and current['p95_ms'] > base['p95_ms'] * (1 + latency_tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+    return regressions
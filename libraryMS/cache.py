@@ -0,0 +1,204 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+from libraryMS.routers import use_replica
+
+KEY_PREFIX = 'catalog'
+# Bumped to drop every cached page at once; part of every page key
+GENERATION_KEY = f'{KEY_PREFIX}:generation'
+# Pages filtered on availability can gain or lose books whenever any copy moves
+AVAILABILITY_SCOPE = 'available'
+STAT_NAMES = ('hits', 'misses', 'evictions')
+
+
+def get_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def cache_timeout():
+    return getattr(settings, 'CATALOG_CACHE_SECONDS', 300)
+
+
+def _tag_key(tag):
+    return f'{KEY_PREFIX}:tag:{tag}'
+
+
+def book_tag(book_id):
+    return f'book:{book_id}'
+
+
+def page_key(generation, variant, path):
+    digest = hashlib.sha1(f'{variant}:{path}'.encode()).hexdigest()
+    return f'{KEY_PREFIX}:page:{generation}:{digest}'
+
+
+def current_generation(cache):
+    return cache.get_or_set(GENERATION_KEY, 0, None)
+
+
+async def acurrent_generation(cache):
+    return await cache.aget_or_set(GENERATION_KEY, 0, None)
+
+
+def store_page(cache, key, data, tags):
+    """
+    Cache a rendered page and register it under each of ``tags``.
+
+    The tag indexes are read-modify-write, so two pages stored at the same
+    instant may lose one registration; the page timeout bounds how long such
+    an entry can outlive an eviction.
+    """
+    timeout = cache_timeout()
+    updated = _registered(cache.get_many([_tag_key(tag) for tag in tags]), key, tags)
+    cache.set(key, data, timeout)
+    if updated:
+        cache.set_many(updated, timeout)
+
+
+async def astore_page(cache, key, data, tags):
+    timeout = cache_timeout()
+    updated = _registered(await cache.aget_many([_tag_key(tag) for tag in tags]), key, tags)
+    await cache.aset(key, data, timeout)
+    if updated:
+        await cache.aset_many(updated, timeout)
+
+
+def _registered(indexes, key, tags):
+    """Return the tag indexes of ``tags`` that don't list ``key`` yet, with it added."""
+    updated = {}
+    for tag in tags:
+        index = indexes.get(_tag_key(tag), set())
+        if key not in index:
+            updated[_tag_key(tag)] = index | {key}
+    return updated
+
+
+def evict_tags(tags):
+    """Delete every cached page registered under any of ``tags``."""
+    cache = get_cache()
+    tag_keys = [_tag_key(tag) for tag in tags]
+    pages = set().union(*cache.get_many(tag_keys).values())
+    cache.delete_many([*pages, *tag_keys])
+    if pages:
+        _count(cache, 'evictions', len(pages))
+
+
+def evict_books(book_ids, availability=False):
+    """
+    Drop the cached pages showing any of ``book_ids``.
+
+    ``availability`` also drops every page filtered on availability, whose
+    membership a borrow or reservation changes.
+    """
+    tags = [book_tag(book_id) for book_id in book_ids]
+    if availability:
+        tags.append(AVAILABILITY_SCOPE)
+    evict_tags(tags)
+
+
+def evict_all():
+    cache = get_cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
+
+
+def _count(cache, name, amount=1):
+    key = f'{KEY_PREFIX}:stats:{name}'
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        cache.set(key, amount, None)
+
+
+async def _acount(cache, name, amount=1):
+    key = f'{KEY_PREFIX}:stats:{name}'
+    try:
+        await cache.aincr(key, amount)
+    except ValueError:
+        await cache.aset(key, amount, None)
+
+
+def cache_stats():
+    """Return the hit, miss and eviction counters shared by every process using the cache."""
+    cache = get_cache()
+    values = cache.get_many([f'{KEY_PREFIX}:stats:{name}' for name in STAT_NAMES])
+    stats = {name: values.get(f'{KEY_PREFIX}:stats:{name}', 0) for name in STAT_NAMES}
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else None
+    return stats
+
+
+def reset_stats():
+    get_cache().delete_many([f'{KEY_PREFIX}:stats:{name}' for name in STAT_NAMES])
+
+
+class CachedListMixin:
+    """
+    Serve list pages from the cache framework, keyed by caller variant and full path.
+
+    Each stored page is tagged with the ids of the books it shows, so a write
+    evicts only the pages containing the books it touched (see ``evict_books``).
+    Pages filtered with one of ``availability_params`` are also tagged with
+    the availability scope.
+    """
+    availability_params = ('available',)
+
+    def cache_variant(self, request):
+        return self.variant_key(request)
+
+    def list(self, request, *args, **kwargs):
+        key, response = self.cached_response(request)
+        if response is not None:
+            return response
+        # A page rendered on a lagging replica could miss a write whose eviction has already run,
+        # and would then be served stale until it expires
+        with use_replica(False):
+            response = super().list(request, *args, **kwargs)
+        return self.store_response(request, key, response)
+
+    def cached_response(self, request):
+        """Return the page's cache key and its cached response, if there is one."""
+        cache = get_cache()
+        key = page_key(current_generation(cache), self.cache_variant(request), request.get_full_path())
+        data = cache.get(key)
+        _count(cache, 'misses' if data is None else 'hits')
+        return key, self.hit_response(data)
+
+    async def acached_response(self, request):
+        """``cached_response()`` through the cache's async API, for async views."""
+        cache = get_cache()
+        key = page_key(await acurrent_generation(cache), self.cache_variant(request), request.get_full_path())
+        data = await cache.aget(key)
+        await _acount(cache, 'misses' if data is None else 'hits')
+        return key, self.hit_response(data)
+
+    def hit_response(self, data):
+        if data is None:
+            return None
+        response = Response(data)
+        response['X-Cache'] = 'HIT'
+        return response
+
+    def store_response(self, request, key, response):
+        if response.status_code == 200:
+            store_page(get_cache(), key, response.data, self.page_tags(request, response))
+        response['X-Cache'] = 'MISS'
+        return response
+
+    async def astore_response(self, request, key, response):
+        if response.status_code == 200:
+            await astore_page(get_cache(), key, response.data, self.page_tags(request, response))
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def page_tags(self, request, response):
+        results = response.data.get('results', response.data)
+        tags = [book_tag(item['id']) for item in results]
+        if any(param in request.query_params for param in self.availability_params):
+            tags.append(AVAILABILITY_SCOPE)
+        return tags
@@ -0,0 +1,285 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from libraryMS.conditional import bump_catalog_version
+from libraryMS.holds import announce_available, promote
+from libraryMS.models import Book, Borrower, BorrowingTransaction, Copy, Reservation
+
+MAX_ACTIVE_LOANS = 5
+LOAN_PERIOD = timedelta(days=30)
+# Largest stack a kiosk may submit in one batch
+MAX_BATCH_SIZE = 50
+# Most copies of a title added to the collection at once
+MAX_COPIES_ADDED = 100
+
+
+class CirculationError(Exception):
+    """A borrow or return that was refused; the message is safe to show to the borrower."""
+
+
+def borrow(book_id, borrower_id, books=None):
+    """
+    Lend a copy of a book to a borrower and return the new ``BorrowingTransaction``.
+
+    Every step is a conditional UPDATE whose row count decides the outcome, so
+    two borrowers racing for the last copy can never both win. ``books``
+    narrows which books may be borrowed (e.g. a viewset's queryset) and
+    defaults to all of them.
+
+    Raises ``Book.DoesNotExist`` for an unknown book and ``CirculationError``
+    when the loan is refused.
+    """
+    books = Book.objects.all() if books is None else books
+
+    with transaction.atomic():
+        # Take a copy off the counter; a reservation keeps the last copy on the shelf for its holder.
+        # The update locks the book row, so concurrent borrows of the title are served one at a time.
+        claimed = (
+            books.filter(pk=book_id, available_copies__gt=0)
+            .filter(Q(reserved_by__isnull=True) | Q(reserved_by=borrower_id) | Q(available_copies__gt=1))
+            .update(available_copies=F('available_copies') - 1, updated_at=timezone.now())
+        )
+        if not claimed:
+            raise CirculationError(_unavailable_reason(books, book_id, borrower_id))
+
+        # Claim a loan slot against the denormalized counter instead of counting open loans
+        if not Borrower.objects.filter(pk=borrower_id, active_loans__lt=MAX_ACTIVE_LOANS).update(
+                active_loans=F('active_loans') + 1):
+            raise CirculationError(f"You cannot borrow more than {MAX_ACTIVE_LOANS} books at a time.")
+
+        copy_id = Copy.objects.filter(book_id=book_id, status=Copy.AVAILABLE).values_list('id', flat=True).first()
+        if copy_id is None:
+            raise CirculationError("No copy of this book is on the shelf.")
+        Copy.objects.filter(pk=copy_id).update(status=Copy.ON_LOAN, borrower=borrower_id)
+
+        # A reservation is fulfilled by borrowing the book
+        fulfilled, _ = Reservation.objects.filter(book_id=book_id, borrower_id=borrower_id).delete()
+        if fulfilled:
+            Book.objects.filter(pk=book_id, reserved_by=borrower_id).update(reserved_by=None)
+        bump_catalog_version([book_id], availability=True)
+
+        borrowed_date = timezone.now()
+        loan = BorrowingTransaction.objects.create(
+            borrower_id=borrower_id,
+            book_id=book_id,
+            copy_id=copy_id,
+            borrowed_date=borrowed_date,
+            due_date=borrowed_date + LOAN_PERIOD,
+            is_returned=False
+        )
+        if fulfilled:
+            # The next patron in the book's queue now reserves it
+            promote([book_id])
+        return loan
+
+
+def return_book(loan):
+    """
+    Close a ``BorrowingTransaction`` and put its copy back on the shelf.
+
+    Only the first of several concurrent returns of the same loan succeeds;
+    the others raise ``CirculationError``.
+    """
+    with transaction.atomic():
+        if not BorrowingTransaction.objects.filter(pk=loan.pk, is_returned=False).update(is_returned=True):
+            raise CirculationError("This book has already been returned.")
+        loan.is_returned = True
+
+        if Copy.objects.filter(pk=loan.copy_id, status=Copy.ON_LOAN).update(status=Copy.AVAILABLE, borrower=None):
+            Book.objects.filter(pk=loan.book_id).update(
+                available_copies=F('available_copies') + 1, updated_at=timezone.now()
+            )
+        Borrower.objects.filter(pk=loan.borrower_id, active_loans__gt=0).update(
+            active_loans=F('active_loans') - 1
+        )
+        bump_catalog_version([loan.book_id], availability=True)
+        announce_available([loan.book_id])
+    return loan
+
+
+def apply_batch(borrower_id, operations):
+    """
+    Apply a kiosk batch of borrow, return and extend operations for one borrower.
+
+    ``operations`` is a list of dicts with an ``op`` of ``'borrow'`` (with a
+    ``book`` id), ``'return'`` or ``'extend'`` (with a ``loan`` id). Everything
+    is read with one query per table, validated together and written with one
+    bulk statement per kind of change, all in a single transaction. Returns are
+    validated first so that they free loan slots for the borrows of the batch.
+
+    Returns one result dict per operation, in input order, with ``status`` set to
+    ``'ok'`` or ``'error'`` (plus a ``detail`` message for refusals).
+    """
+    results = [dict(operation, status='ok') for operation in operations]
+    by_op = {'borrow': [], 'return': [], 'extend': []}
+    for result in results:
+        by_op[result['op']].append(result)
+
+    def refuse(result, detail):
+        result.update(status='error', detail=detail)
+
+    now = timezone.now()
+    with transaction.atomic():
+        borrower = Borrower.objects.select_for_update().only('id', 'active_loans').get(pk=borrower_id)
+        # Loans of other borrowers are simply not found
+        loans = (
+            BorrowingTransaction.objects.select_for_update()
+            .filter(borrower_id=borrower_id)
+            .only('id', 'book_id', 'copy_id', 'due_date', 'is_returned')
+            .in_bulk([result['loan'] for result in by_op['return'] + by_op['extend']])
+        )
+        books = Book.objects.select_for_update().only('id', 'available_copies', 'reserved_by').in_bulk(
+            [result['book'] for result in by_op['borrow']]
+        )
+        # The first copy on the shelf of each title, in one query. Like borrow(), a title whose
+        # counter promises a copy the shelf doesn't have is refused rather than lent without one
+        shelf_copies = dict(Book.objects.filter(pk__in=list(books)).annotate(copy_id=Subquery(
+            Copy.objects.filter(book=OuterRef('pk'), status=Copy.AVAILABLE).order_by('id').values('id')[:1]
+        )).values_list('id', 'copy_id')) if books else {}
+        reserved_book_ids = set(
+            Reservation.objects.filter(
+                book_id__in=[loan.book_id for loan in loans.values()], expiration_date__gt=now
+            ).values_list('book_id', flat=True)
+        )
+
+        returned = []
+        for result in by_op['return']:
+            loan = loans.get(result['loan'])
+            if loan is None:
+                refuse(result, "You can only return books you have borrowed.")
+            elif loan.is_returned or loan in returned:
+                refuse(result, "This book has already been returned.")
+            else:
+                returned.append(loan)
+
+        extended = []
+        for result in by_op['extend']:
+            loan = loans.get(result['loan'])
+            if loan is None or loan.is_returned or loan in returned:
+                refuse(result, "Only current loans can be extended.")
+            elif loan.book_id in reserved_book_ids:
+                refuse(result, "Book is reserved by another borrower. Cannot extend.")
+            elif loan in extended:
+                refuse(result, "This loan is already extended in this batch.")
+            else:
+                loan.due_date += LOAN_PERIOD
+                extended.append(loan)
+
+        borrowed = []
+        free_slots = MAX_ACTIVE_LOANS - borrower.active_loans + len(returned)
+        for result in by_op['borrow']:
+            book = books.get(result['book'])
+            if book is None:
+                refuse(result, "Book not found.")
+            elif not book.available_copies or book in borrowed:
+                refuse(result, "This book is currently borrowed by someone else.")
+            elif book.reserved_by_id not in (None, borrower_id) and book.available_copies == 1:
+                refuse(result, "This book is currently reserved by someone else.")
+            elif shelf_copies.get(book.pk) is None:
+                refuse(result, "No copy of this book is on the shelf.")
+            elif len(borrowed) >= free_slots:
+                refuse(result, f"You cannot borrow more than {MAX_ACTIVE_LOANS} books at a time.")
+            else:
+                borrowed.append(book)
+
+        if returned:
+            BorrowingTransaction.objects.filter(pk__in=[loan.pk for loan in returned]).update(is_returned=True)
+            Copy.objects.filter(pk__in=[loan.copy_id for loan in returned], status=Copy.ON_LOAN).update(
+                status=Copy.AVAILABLE, borrower=None
+            )
+            # One UPDATE per distinct number of copies of a title coming back
+            by_count = defaultdict(list)
+            for book_id, count in Counter(loan.book_id for loan in returned if loan.copy_id).items():
+                by_count[count].append(book_id)
+            for count, book_ids in by_count.items():
+                Book.objects.filter(pk__in=book_ids).update(
+                    available_copies=F('available_copies') + count, updated_at=now
+                )
+            announce_available([loan.book_id for loan in returned])
+        if extended:
+            BorrowingTransaction.objects.bulk_update(extended, ['due_date'])
+        if borrowed:
+            book_ids = [book.pk for book in borrowed]
+            Book.objects.filter(pk__in=book_ids).update(available_copies=F('available_copies') - 1, updated_at=now)
+            copy_ids = {book_id: shelf_copies[book_id] for book_id in book_ids}
+            Copy.objects.filter(pk__in=copy_ids.values()).update(status=Copy.ON_LOAN, borrower=borrower_id)
+            fulfilled, _ = Reservation.objects.filter(book_id__in=book_ids, borrower_id=borrower_id).delete()
+            if fulfilled:
+                Book.objects.filter(pk__in=book_ids, reserved_by=borrower_id).update(reserved_by=None)
+            new_loans = BorrowingTransaction.objects.bulk_create(
+                BorrowingTransaction(
+                    borrower_id=borrower_id, book_id=book_id, copy_id=copy_ids[book_id], borrowed_date=now,
+                    due_date=now + LOAN_PERIOD
+                )
+                for book_id in book_ids
+            )
+            if fulfilled:
+                promote(book_ids)
+            loan_ids = {loan.book_id: loan.pk for loan in new_loans}
+            for result in by_op['borrow']:
+                if result['status'] == 'ok':
+                    result['loan'] = loan_ids[result['book']]
+        if borrowed or returned:
+            Borrower.objects.filter(pk=borrower_id).update(
+                active_loans=F('active_loans') + len(borrowed) - len(returned)
+            )
+            bump_catalog_version(
+                [book.pk for book in borrowed] + [loan.book_id for loan in returned], availability=True
+            )
+
+    return results
+
+
+def add_copies(book_id, count):
+    """Put ``count`` new copies of a book on the shelf."""
+    with transaction.atomic():
+        Copy.objects.bulk_create(Copy(book_id=book_id) for _ in range(count))
+        Book.objects.filter(pk=book_id).update(
+            total_copies=F('total_copies') + count, available_copies=F('available_copies') + count,
+            updated_at=timezone.now()
+        )
+        bump_catalog_version([book_id], availability=True)
+        # Patrons queued for the title may now be served
+        promote([book_id])
+
+
+def rebuild_copy_counters(batch_size=1000):
+    """
+    Recompute every book's copy counters from its copies.
+
+    Books are processed in batches of ``batch_size``: one aggregate over the
+    batch's copies and one bulk UPDATE per batch. Returns the number of books
+    updated.
+    """
+    updated = 0
+    books = Book.objects.only('id').order_by('id').iterator(chunk_size=batch_size)
+    while batch := list(islice(books, batch_size)):
+        counts = {
+            row['book']: row
+            for row in Copy.objects.filter(book__in=[book.id for book in batch]).values('book').annotate(
+                total=Count('id'), available=Count('id', filter=Q(status=Copy.AVAILABLE))
+            )
+        }
+        now = timezone.now()
+        for book in batch:
+            book.updated_at = now
+            book.total_copies = counts.get(book.id, {}).get('total', 0)
+            book.available_copies = counts.get(book.id, {}).get('available', 0)
+        updated += Book.objects.bulk_update(batch, ['updated_at', 'total_copies', 'available_copies'])
+    bump_catalog_version()
+    return updated
+
+
+def _unavailable_reason(books, book_id, borrower_id):
+    # Only reached on the slow path, after the conditional update lost
+    state = books.filter(pk=book_id).values('available_copies', 'reserved_by').first()
+    if state is None:
+        raise Book.DoesNotExist
+    if not state['available_copies']:
+        return "This book is currently borrowed by someone else."
+    return "This book is currently reserved by someone else."
@@ -0,0 +1,121 @@
+import hashlib
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from libraryMS.cache import evict_all, evict_books
+from libraryMS.models import CatalogVersion
+from libraryMS.routers import account_key
+
+CATALOG_VERSION_ID = 1
+
+
+def _catalog_version_row():
+    return CatalogVersion.objects.filter(pk=CATALOG_VERSION_ID).values_list('version', 'changed_at')
+
+
+def catalog_version():
+    """Return ``(version, changed_at)`` of the catalog, in one primary-key lookup."""
+    return _catalog_version_row().first() or (0, None)
+
+
+async def acatalog_version():
+    return await _catalog_version_row().afirst() or (0, None)
+
+
+def bump_catalog_version(book_ids=None, availability=False):
+    """
+    Record a catalog change once the current transaction commits.
+
+    Clients' list ETags change with the version; server-side cached pages are
+    evicted for ``book_ids`` only (plus the availability-filtered pages when
+    ``availability``), or all of them when no ids are given.
+
+    Deferring the bump keeps the single counter row out of the caller's
+    transaction, so circulation writes never queue behind each other on it.
+    """
+    transaction.on_commit(lambda: _bump(book_ids, availability))
+
+
+def _bump(book_ids, availability):
+    CatalogVersion.objects.filter(pk=CATALOG_VERSION_ID).update(
+        version=F('version') + 1, changed_at=timezone.now()
+    )
+    if book_ids is None:
+        evict_all()
+    else:
+        evict_books(book_ids, availability)
+
+
+def make_etag(*parts):
+    return '"{}"'.format(hashlib.sha1(':'.join(map(str, parts)).encode()).hexdigest())
+
+
+class ConditionalGetMixin:
+    """
+    Answer ``If-None-Match`` / ``If-Modified-Since`` on list and retrieve before
+    the queryset or serializer runs.
+
+    The collection is validated against the catalog version, a single object
+    against its ``updated_at``. Both are combined with ``variant_key()`` since
+    what a user sees depends on who they are, and with the negotiated format
+    since JSON and MessagePack bodies differ.
+    """
+
+    def variant_key(self, request):
+        return account_key(request.user)
+
+    def list(self, request, *args, **kwargs):
+        version, changed_at = catalog_version()
+        etag = self.list_etag(request, version)
+        return self.conditional_response(request, etag, changed_at, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = self.detail_lookup()
+        updated_at = (
+            self.filter_queryset(self.get_queryset()).filter(**lookup)
+            .values_list('updated_at', flat=True).first()
+        )
+        if updated_at is None:
+            # Let the regular path produce the 404
+            return super().retrieve(request, *args, **kwargs)
+        etag = self.detail_etag(request, lookup, updated_at)
+        return self.conditional_response(request, etag, updated_at, super().retrieve, *args, **kwargs)
+
+    def list_etag(self, request, version):
+        return make_etag(
+            'list', version, self.variant_key(request), request.accepted_renderer.format, request.get_full_path()
+        )
+
+    def detail_lookup(self):
+        return {self.lookup_field: self.kwargs[self.lookup_url_kwarg or self.lookup_field]}
+
+    def detail_etag(self, request, lookup, updated_at):
+        # The path carries ?fields= and ?expand=, which pick the representation
+        return make_etag(
+            'detail', lookup, updated_at.isoformat(), self.variant_key(request), request.accepted_renderer.format,
+            request.get_full_path()
+        )
+
+    def conditional_response(self, request, etag, last_modified, render, *args, **kwargs):
+        response = self.not_modified(request, etag, last_modified)
+        if response is None:
+            response = render(request, *args, **kwargs)
+        return self.add_validators(response, etag, last_modified)
+
+    def not_modified(self, request, etag, last_modified):
+        """Return the 304 answering the request's preconditions, or None when the body must be sent."""
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+        return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+    def add_validators(self, response, etag, last_modified):
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_vary_headers(response, ['Authorization', 'Accept'])
+        return response
@@ -0,0 +1,10 @@
+import pytest
+from django.core.cache import cache
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Cached catalog pages are keyed by ids that the next test's database reuses
+    cache.clear()
+    yield
+    cache.clear()
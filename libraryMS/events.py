@@ -0,0 +1,143 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+import redis
+import redis.asyncio
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+
+CHANNEL_PREFIX = 'notifications:'
+
+
+class InProcessBroker:
+    """
+    Fan notification events out to the streams open in this process.
+
+    ``publish`` may be called from any thread (sync views, ``sync_to_async``
+    workers); delivery is handed to each subscriber's event loop.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, borrower_id, event):
+        self._deliver(borrower_id, event)
+
+    def _deliver(self, borrower_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(borrower_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    @asynccontextmanager
+    async def subscribe(self, borrower_id):
+        """Yield an ``asyncio.Queue`` receiving every event published for ``borrower_id``."""
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers[borrower_id].add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                self._subscribers[borrower_id].discard(subscriber)
+                if not self._subscribers[borrower_id]:
+                    del self._subscribers[borrower_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+class RedisBroker(InProcessBroker):
+    """
+    Publish through Redis so events reach streams held by other processes.
+
+    Each process keeps one pattern subscription for all borrowers and fans the
+    messages out locally, so idle streams cost no Redis connection of their own.
+    """
+
+    def __init__(self, url):
+        super().__init__()
+        self.url = url
+        self._redis = redis.Redis.from_url(url)
+        self._listener = None
+
+    def publish(self, borrower_id, event):
+        self._redis.publish(f'{CHANNEL_PREFIX}{borrower_id}', json.dumps(event))
+
+    @asynccontextmanager
+    async def subscribe(self, borrower_id):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+        async with super().subscribe(borrower_id) as queue:
+            yield queue
+
+    async def _listen(self):
+        client = redis.asyncio.Redis.from_url(self.url)
+        async with client.pubsub() as pubsub:
+            await pubsub.psubscribe(f'{CHANNEL_PREFIX}*')
+            async for message in pubsub.listen():
+                if message['type'] == 'pmessage':
+                    borrower_id = int(message['channel'].decode().removeprefix(CHANNEL_PREFIX))
+                    self._deliver(borrower_id, json.loads(message['data']))
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    """Return the broker configured by ``NOTIFICATION_EVENTS_URL``, or ``None`` when events are off."""
+    url = getattr(settings, 'NOTIFICATION_EVENTS_URL', '')
+    if not url:
+        return None
+    if url.startswith('memory://'):
+        return InProcessBroker()
+    return RedisBroker(url)
+
+
+@receiver(setting_changed)
+def reset_broker(setting, **kwargs):
+    if setting == 'NOTIFICATION_EVENTS_URL':
+        get_broker.cache_clear()
+
+
+def notification_event(notification):
+    return {
+        'id': notification.id,
+        'kind': notification.kind,
+        'message': notification.message,
+        'created_at': notification.created_at.isoformat(),
+        'read': notification.read,
+    }
+
+
+def read_event(ids):
+    # Streams tell a read event from a notification by its 'event' key
+    return {'event': 'read', 'ids': ids}
+
+
+def publish_notifications(notifications):
+    """Push saved notifications to their borrowers' open streams."""
+    broker = get_broker()
+    if broker is None:
+        return
+    for notification in notifications:
+        broker.publish(notification.borrower_id, notification_event(notification))
+
+
+def publish_read(borrower_id, ids=None):
+    """
+    Tell the borrower's open streams, once committed, that notifications were read.
+
+    ``ids`` lists them; ``None`` stands for all of the borrower's notifications.
+    """
+    broker = get_broker()
+    if broker is None:
+        return
+    # A broker outage must not fail the request that marked them read
+    transaction.on_commit(lambda: broker.publish(borrower_id, read_event(ids)), robust=True)
@@ -0,0 +1,152 @@
+from functools import lru_cache
+
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse_paths(value):
+    """Split a ``?fields=`` or ``?expand=`` value into its dotted paths."""
+    return [path.strip() for path in (value or '').split(',') if path.strip()]
+
+
+def by_first_step(paths):
+    """
+    Group dotted paths by their first step.
+
+    ``['title', 'book.title', 'book.author']`` gives
+    ``{'title': None, 'book': ['title', 'author']}``: ``None`` stands for a
+    name listed on its own, i.e. all of it.
+    """
+    branches = {}
+    for path in paths:
+        name, _, rest = path.partition('.')
+        if not rest:
+            branches[name] = None
+        elif branches.get(name, []) is not None:
+            branches.setdefault(name, []).append(rest)
+    return branches
+
+
+class ExpandableFieldsMixin:
+    """
+    Render relations as ids unless expanded, and only the fields asked for.
+
+    ``expandable_fields`` maps a relation to the serializer rendering it once
+    expanded. ``expand`` names the relations to expand, with dotted paths
+    (``book.author``) expanding through them; ``fields`` names the fields to
+    keep, dotted paths selecting inside expanded relations. The primary key is
+    always kept.
+
+    ``field_columns`` lists the columns read by fields that aren't model fields
+    of the same name, for ``queryset_plan()``.
+    """
+    expandable_fields = {}
+    field_columns = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        self.requested_fields = None if fields is None else by_first_step(fields)
+        self.expanded_fields = by_first_step(expand or ())
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for name, serializer_class in self.expandable_fields.items():
+            if name in self.expanded_fields:
+                fields[name] = serializer_class(
+                    read_only=True, fields=(self.requested_fields or {}).get(name),
+                    expand=self.expanded_fields[name],
+                )
+            else:
+                fields[name] = serializers.PrimaryKeyRelatedField(read_only=True)
+        if self.requested_fields is not None:
+            keep = {*self.requested_fields, self.Meta.model._meta.pk.name}
+            fields = {name: field for name, field in fields.items() if name in keep or field.write_only}
+        return fields
+
+    def queryset_plan(self, prefix=''):
+        """Return the relations to join and the columns to load to render these fields, as lookup paths."""
+        model = self.Meta.model
+        concrete = {field.name for field in model._meta.concrete_fields}
+        relations, columns = [], []
+        for field in self.fields.values():
+            if field.write_only:
+                continue
+            source = field.source.split('.')[0]
+            if isinstance(field, ExpandableFieldsMixin):
+                relations.append(prefix + source)
+                columns.append(prefix + source)
+                nested_relations, nested_columns = field.queryset_plan(f'{prefix}{source}__')
+                relations += nested_relations
+                columns += nested_columns
+            elif field.field_name in self.field_columns:
+                columns += [prefix + column for column in self.field_columns[field.field_name]]
+            elif source in concrete:
+                columns.append(prefix + source)
+            else:
+                # Whatever it reads, it is on this row
+                columns += [prefix + name for name in sorted(concrete)]
+        return relations, columns
+
+    @classmethod
+    def plan_queryset(cls, queryset, fields=None, expand=(), columns=()):
+        """Join and load only what rendering ``fields`` and ``expand`` needs from ``queryset``, plus ``columns``."""
+        relations, needed = _cached_plan(cls, None if fields is None else tuple(fields), tuple(expand))
+        queryset = queryset.select_related(None)
+        # select_related() without arguments would follow every relation
+        if relations:
+            queryset = queryset.select_related(*relations)
+        return queryset.only(*needed, *columns)
+
+
+class SparseFieldsetsMixin:
+    """
+    Honour ``?fields=`` and ``?expand=`` on a viewset's GET requests.
+
+    The paths reach the serializer, and list and retrieve querysets only join
+    the expanded relations and load the columns being rendered, plus the
+    pagination ordering and ``required_columns``, which permission checks read.
+    Other GET actions apply the same to their own querysets through
+    ``sparse_queryset()``.
+    """
+    sparse_actions = ('list', 'retrieve')
+    required_columns = ()
+
+    def fieldset_kwargs(self):
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return {}
+        params = self.request.query_params
+        fields = parse_paths(params.get(FIELDS_PARAM))
+        return {'fields': fields or None, 'expand': parse_paths(params.get(EXPAND_PARAM))}
+
+    def get_serializer(self, *args, **kwargs):
+        if issubclass(self.get_serializer_class(), ExpandableFieldsMixin):
+            kwargs = {**self.fieldset_kwargs(), **kwargs}
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action in self.sparse_actions:
+            queryset = self.sparse_queryset(queryset, *self.required_columns)
+        return queryset
+
+    def sparse_queryset(self, queryset, *columns):
+        """Narrow ``queryset`` to what the action's serializer renders for this request, plus ``columns``."""
+        serializer_class = self.get_serializer_class()
+        if not issubclass(serializer_class, ExpandableFieldsMixin):
+            return queryset
+        ordering = getattr(self.pagination_class, 'ordering', ())
+        ordering = [ordering] if isinstance(ordering, str) else ordering
+        concrete = {field.name for field in queryset.model._meta.concrete_fields}
+        # The cursor paginator reads the ordering fields off the page's last row
+        columns = [*(field.lstrip('-') for field in ordering if field.lstrip('-') in concrete), *columns]
+        return serializer_class.plan_queryset(queryset, **self.fieldset_kwargs(), columns=columns)
+
+
+# Building a serializer's fields costs about a millisecond, and clients repeat the same few fieldsets
+@lru_cache(maxsize=256)
+def _cached_plan(serializer_class, fields, expand):
+    relations, columns = serializer_class(fields=fields, expand=expand).queryset_plan()
+    return tuple(relations), tuple(columns)
@@ -0,0 +1,154 @@
+from datetime import timedelta
+
+from celery import signature
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, Min, Value, When
+from django.utils import timezone
+
+from libraryMS.conditional import bump_catalog_version
+from libraryMS.models import Book, BorrowingTransaction, Hold, Reservation
+
+# How long a hold waits in the queue before it is dropped as stale
+HOLD_PERIOD = timedelta(days=90)
+# How long a promoted holder has to pick the book up once it is back
+RESERVATION_GRACE = timedelta(days=10)
+
+
+def join_queue(book_id, borrower_id):
+    """
+    Queue a borrower for a book and return ``(hold, created)``.
+
+    Joining again keeps the original place, so clients retrying the request
+    never lose their turn nor take a second one.
+    """
+    with transaction.atomic():
+        # Concurrent joins of the same book queue up behind this lock and take consecutive positions
+        Book.objects.select_for_update().only('id').get(pk=book_id)
+        hold = Hold.objects.filter(book_id=book_id, borrower_id=borrower_id).first()
+        if hold is not None:
+            return hold, False
+        last = Hold.objects.filter(book_id=book_id).aggregate(last=Max('position'))['last']
+        hold = Hold.objects.create(
+            book_id=book_id, borrower_id=borrower_id, position=(last or 0) + 1,
+            expires_at=timezone.now() + HOLD_PERIOD
+        )
+        return hold, True
+
+
+def leave_queue(hold_id, borrower_id):
+    """Give up a borrower's hold, moving the holds behind it up. Returns whether the hold existed."""
+    book_id = Hold.objects.filter(pk=hold_id, borrower_id=borrower_id).values_list('book_id', flat=True).first()
+    if book_id is None:
+        return False
+    return bool(_remove(book_id, Hold.objects.filter(pk=hold_id)))
+
+
+def _remove(book_id, holds):
+    """Delete the ``holds`` of a book's queue and close the gaps they leave. Returns how many were deleted."""
+    with transaction.atomic():
+        # Positions only change under the book's lock, like joins
+        Book.objects.select_for_update().filter(pk=book_id).only('id').first()
+        removed = sorted(holds.filter(book_id=book_id).values_list('position', flat=True))
+        if removed:
+            Hold.objects.filter(book_id=book_id, position__in=removed).delete()
+            _close_gaps(book_id, removed)
+        return len(removed)
+
+
+def _close_gaps(book_id, removed):
+    """
+    Move the holds of a book's queue up past the ``removed`` positions, which must be sorted.
+
+    Positions are unique within a queue, so the holds behind are first moved
+    past its end, then back down by the number of removed positions ahead of
+    them. Neither statement ever has two holds share a position, whatever
+    order the database updates rows in.
+    """
+    behind = Hold.objects.filter(book_id=book_id, position__gt=removed[0])
+    last = behind.aggregate(last=Max('position'))['last']
+    if last is None:
+        return
+    behind.update(position=F('position') + last)
+    # The first matching When wins, so the furthest gap comes first
+    ahead = reversed(list(enumerate(removed, 1)))
+    shift = Case(
+        *(When(position__gt=last + position, then=Value(count)) for count, position in ahead),
+        output_field=IntegerField(),
+    )
+    Hold.objects.filter(book_id=book_id, position__gt=last).update(position=F('position') - last - shift)
+
+
+def promote(book_ids):
+    """
+    Reserve each of ``book_ids`` that has no reservation for the head of its queue.
+
+    A holder who already reserves another book keeps their place and the next
+    one is served, since a borrower holds a single reservation at a time. The
+    new reservation runs until ``RESERVATION_GRACE`` after the first copy is
+    due back, or after now if a copy is on the shelf, in which case the
+    holder is told right away. Returns the ids of the books promoted.
+    """
+    now = timezone.now()
+    promoted = []
+    if not book_ids:
+        return promoted
+    with transaction.atomic():
+        queued = Hold.objects.filter(book_id__in=book_ids, expires_at__gt=now).values('book_id')
+        books = list(
+            Book.objects.select_for_update().filter(pk__in=queued, reserved_by=None).only('id', 'available_copies')
+        )
+        if not books:
+            return promoted
+        # When the first copy of each title is due back
+        due_dates = dict(
+            BorrowingTransaction.objects.filter(book_id__in=[book.pk for book in books], is_returned=False)
+            .order_by().values('book_id').annotate(due=Min('due_date')).values_list('book_id', 'due')
+        )
+        for book in books:
+            # The head of the queue, found through the (book, position) index
+            hold = (
+                Hold.objects.filter(book_id=book.pk, expires_at__gt=now, borrower__reserved_book=None)
+                .order_by('position').only('id', 'borrower_id', 'position').first()
+            )
+            if hold is None:
+                continue
+            Reservation.objects.create(
+                borrower_id=hold.borrower_id, book_id=book.pk,
+                expiration_date=(now if book.available_copies else due_dates.get(book.pk, now)) + RESERVATION_GRACE
+            )
+            Book.objects.filter(pk=book.pk).update(reserved_by=hold.borrower_id, updated_at=now)
+            hold.delete()
+            _close_gaps(book.pk, [hold.position])
+            promoted.append(book.pk)
+
+        if promoted:
+            bump_catalog_version(promoted, availability=True)
+            on_shelf = [book.pk for book in books if book.pk in promoted and book.available_copies]
+            if on_shelf:
+                announce_available(on_shelf)
+    return promoted
+
+
+def promote_waiting():
+    """Promote every book with live holds but no reservation, e.g. after its queue's head was skipped."""
+    waiting = (
+        Book.objects.filter(reserved_by=None, holds__expires_at__gt=timezone.now())
+        .values_list('id', flat=True).distinct()
+    )
+    return promote(list(waiting))
+
+
+def expire_holds(now):
+    """Drop every hold that waited longer than ``HOLD_PERIOD``, closing the gaps it leaves queue by queue."""
+    expired = Hold.objects.filter(expires_at__lte=now)
+    book_ids = expired.order_by().values_list('book_id', flat=True).distinct()
+    return sum(_remove(book_id, expired) for book_id in list(book_ids))
+
+
+def announce_available(book_ids):
+    """Notify the reservers of books now on the shelf once the transaction commits."""
+    # Sent by name: the tasks module builds on this one. A lost message is caught by the
+    # daily reconciliation, so a broker outage must not fail the caller.
+    transaction.on_commit(
+        lambda: signature('libraryMS.tasks.notify_reservation_available', args=(book_ids,)).delay(), robust=True
+    )
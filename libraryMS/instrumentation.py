@@ -0,0 +1,277 @@
+import heapq
+import hmac
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+_current_profile = ContextVar('request_profile', default=None)
+
+
+def current_profile():
+    """The profile of the request being handled, or ``None`` when it isn't sampled."""
+    return _current_profile.get()
+
+
+class RequestProfile:
+    """Where one sampled request spent its time."""
+
+    def __init__(self, keep_slowest):
+        self.started = time.perf_counter()
+        self.view = 'unresolved'
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.render_seconds = 0.0
+        self.render_started = None
+        self.total_seconds = None
+        self.serializing = False
+        self.keep_slowest = keep_slowest
+        self.slowest = []  # min-heap of (seconds, sql)
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_seconds += elapsed
+            if len(self.slowest) < self.keep_slowest:
+                heapq.heappush(self.slowest, (elapsed, sql))
+            elif self.slowest and elapsed > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (elapsed, sql))
+
+    def slowest_queries(self):
+        return sorted(self.slowest, reverse=True)
+
+    def server_timing(self):
+        metrics = [f'db;dur={self.db_seconds * 1000:.2f};desc="{self.queries} queries"']
+        if self.slowest:
+            metrics.append(f'db-slowest;dur={max(self.slowest)[0] * 1000:.2f}')
+        metrics.append(f'serialize;dur={self.serialize_seconds * 1000:.2f}')
+        metrics.append(f'render;dur={self.render_seconds * 1000:.2f}')
+        metrics.append(f'total;dur={self.total_seconds * 1000:.2f}')
+        return ', '.join(metrics)
+
+
+class TimedSerializerMixin:
+    """
+    Add a serializer's representation time to the sampled request's profile.
+
+    Only the outermost serializer is timed, so nested serializers aren't counted twice.
+    """
+
+    def to_representation(self, instance):
+        profile = _current_profile.get()
+        if profile is None or profile.serializing:
+            return super().to_representation(instance)
+        profile.serializing = True
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            profile.serialize_seconds += time.perf_counter() - started
+            profile.serializing = False
+
+
+class Histogram:
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def expose(self, label_names):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, [list(counts), total]) for labels, (counts, total) in self._series.items())
+        for labels, (counts, total) in series:
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(label_names, labels))
+            cumulative = 0
+            for bound, count in zip([*self.buckets, '+Inf'], counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+LABEL_NAMES = ('view', 'method')
+HISTOGRAMS = {
+    'total': Histogram('libraryms_request_duration_seconds', "Time to handle a sampled request.", LATENCY_BUCKETS),
+    'db': Histogram('libraryms_request_db_seconds', "Time spent in SQL per sampled request.", LATENCY_BUCKETS),
+    'queries': Histogram('libraryms_request_queries', "SQL statements per sampled request.", QUERY_COUNT_BUCKETS),
+    'serialize': Histogram(
+        'libraryms_request_serialize_seconds', "Time spent in serializers per sampled request.", LATENCY_BUCKETS
+    ),
+    'render': Histogram(
+        'libraryms_request_render_seconds', "Time spent rendering the response per sampled request.", LATENCY_BUCKETS
+    ),
+}
+
+
+def record(profile, method):
+    labels = (profile.view, method)
+    HISTOGRAMS['total'].observe(labels, profile.total_seconds)
+    HISTOGRAMS['db'].observe(labels, profile.db_seconds)
+    HISTOGRAMS['queries'].observe(labels, profile.queries)
+    HISTOGRAMS['serialize'].observe(labels, profile.serialize_seconds)
+    HISTOGRAMS['render'].observe(labels, profile.render_seconds)
+
+
+def wrap_connections(stack, profile):
+    """Time the statements of every database connection of the calling thread until ``stack`` closes."""
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(profile.record_query))
+
+
+def view_label(request, view_func):
+    """Name a view the way the histograms report it, e.g. ``BookViewSet.borrow``."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return getattr(view_func, '__name__', type(view_func).__name__)
+    actions = getattr(view_func, 'actions', None) or {}
+    return f"{view_class.__name__}.{actions.get(request.method.lower(), request.method.lower())}"
+
+
+class InstrumentationMiddleware:
+    """
+    Profile a sample of requests: SQL count and time, slowest statements,
+    serializer and render time.
+
+    Sampled responses carry a ``Server-Timing`` header and feed the
+    per-view histograms served by ``metrics_view``. Requests that aren't
+    sampled only pay for one random draw. Streaming responses are never timed.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'INSTRUMENTATION_SAMPLE_RATE', 0.0)
+        self.keep_slowest = getattr(settings, 'INSTRUMENTATION_SLOWEST_QUERIES', 3)
+        self.slow_request_seconds = getattr(settings, 'INSTRUMENTATION_SLOW_REQUEST_MS', 500) / 1000
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self):
+        return self.sample_rate > 0 and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        profile = RequestProfile(self.keep_slowest)
+        token = _current_profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                wrap_connections(stack, profile)
+                response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        profile = RequestProfile(self.keep_slowest)
+        token = _current_profile.set(profile)
+        # Connections belong to threads. The async ORM, and sync views and middleware, run the
+        # request's queries in its thread-sensitive worker thread, so that's where they're wrapped
+        stack = ExitStack()
+        try:
+            await sync_to_async(wrap_connections)(stack, profile)
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            _current_profile.reset(token)
+        return self.finish(request, response, profile)
+
+    def finish(self, request, response, profile):
+        if response.streaming:
+            return response
+        if profile.render_started is not None and not profile.render_seconds:
+            profile.render_seconds = time.perf_counter() - profile.render_started
+        profile.total_seconds = time.perf_counter() - profile.started
+        response['Server-Timing'] = profile.server_timing()
+        record(profile, request.method)
+        if profile.total_seconds >= self.slow_request_seconds:
+            logger.warning(
+                "Slow request %s %s (%s): %.0f ms, %d queries; slowest: %s",
+                request.method, request.path, profile.view, profile.total_seconds * 1000, profile.queries,
+                "; ".join(f"{seconds * 1000:.1f} ms {sql}" for seconds, sql in profile.slowest_queries()),
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.view = view_label(request, view_func)
+
+    def process_template_response(self, request, response):
+        profile = _current_profile.get()
+        if profile is not None:
+            # Rendering runs after this hook returns; DRF responses are template responses
+            profile.render_started = time.perf_counter()
+
+            def rendered(response):
+                profile.render_seconds = time.perf_counter() - profile.render_started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+
+def metrics_view(request):
+    """
+    Serve the request histograms in the Prometheus text exposition format.
+
+    Scrapers authenticate with ``METRICS_TOKEN``; without one, the histograms
+    are only served under ``DEBUG``.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        allowed = hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    else:
+        allowed = settings.DEBUG
+    if not allowed:
+        return HttpResponseForbidden()
+    lines = []
+    for histogram in HISTOGRAMS.values():
+        lines.extend(histogram.expose(LABEL_NAMES))
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,125 @@
+import asyncio
+import io
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from django.core.management.base import BaseCommand
+
+from libraryMS.benchmarks import Fixtures
+from libraryMS.serializers import RoleTokenObtainPairSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Send the same read requests to the WSGI application (one sync worker by default) and to "
+        "the ASGI application on a single event loop with many requests in flight, then report "
+        "requests per second and latency for each endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Requests per endpoint and server.")
+        parser.add_argument('--concurrency', type=int, default=64,
+                            help="Requests in flight at once on the ASGI event loop.")
+        parser.add_argument('--wsgi-threads', type=int, default=1,
+                            help="Threads serving the WSGI application; 1 is one sync worker.")
+
+    def handle(self, *args, **options):
+        from lms.asgi import application as asgi_application
+        from lms.wsgi import application as wsgi_application
+
+        fixtures = Fixtures()
+        author = self.token(fixtures.author)
+        borrower = self.token(fixtures.borrower)
+        book = fixtures.author_book.pk
+        endpoints = [
+            ('books-list', '/libraryMS/books/', author),
+            ('books-detail', f'/libraryMS/books/{book}/', author),
+            ('books-reviews', f'/libraryMS/books/{book}/reviews/', author),
+            ('borrowings-current', '/libraryMS/borrowings/?filter=current', borrower),
+            ('notifications-list', '/libraryMS/notifications/', borrower),
+        ]
+
+        self.stdout.write(f"{'endpoint':<20} {'server':<5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for name, url, token in endpoints:
+            wsgi = self.run_wsgi(wsgi_application, url, token, options['requests'], options['wsgi_threads'])
+            asgi = asyncio.run(self.run_asgi(asgi_application, url, token, options['requests'],
+                                             options['concurrency']))
+            for server, (statuses, seconds, latencies) in (('wsgi', wsgi), ('asgi', asgi)):
+                if statuses != {200}:
+                    self.stderr.write(self.style.ERROR(f"{name} over {server} answered {sorted(statuses)}."))
+                    return
+                p50, p95 = (statistics.quantiles(latencies, n=100)[q] * 1000 for q in (49, 94))
+                self.stdout.write(
+                    f"{name:<20} {server:<5} {len(latencies) / seconds:>8.0f} {p50:>8.1f} {p95:>8.1f}"
+                )
+
+    @staticmethod
+    def token(account):
+        return str(RoleTokenObtainPairSerializer.get_token(account).access_token)
+
+    def run_wsgi(self, application, url, token, count, threads):
+        path, query = urlsplit(url).path, urlsplit(url).query
+
+        def call(_):
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+                'HTTP_AUTHORIZATION': f'Bearer {token}', 'wsgi.input': io.BytesIO(),
+            }
+            setup_testing_defaults(environ)
+            statuses = []
+            started = time.monotonic()
+            body = application(environ, lambda status, headers: statuses.append(int(status.split()[0])))
+            b''.join(body)
+            body.close()
+            return statuses[0], time.monotonic() - started
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(threads) as pool:
+            results = list(pool.map(call, range(count)))
+        return {status for status, _ in results}, time.monotonic() - started, [seconds for _, seconds in results]
+
+    async def run_asgi(self, application, url, token, count, concurrency):
+        path, query = urlsplit(url).path, urlsplit(url).query
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'headers': [(b'authorization', f'Bearer {token}'.encode())],
+            'server': ('localhost', 80),
+            'client': ('127.0.0.1', 0),
+        }
+        slots = asyncio.Semaphore(concurrency)
+
+        async def call():
+            statuses = []
+            requests = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+            answered = asyncio.Event()
+
+            async def receive():
+                if requests:
+                    return requests.pop()
+                await answered.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+                elif not message.get('more_body', False):
+                    answered.set()
+
+            async with slots:
+                started = time.monotonic()
+                await application(dict(scope), receive, send)
+                return statuses[0], time.monotonic() - started
+
+        started = time.monotonic()
+        results = await asyncio.gather(*(call() for _ in range(count)))
+        return {status for status, _ in results}, time.monotonic() - started, [seconds for _, seconds in results]
@@ -0,0 +1,73 @@
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+
+from libraryMS import circulation
+from libraryMS.models import Author, Borrower, Book, BorrowingTransaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure borrow/return throughput while concurrent clients hammer the same title. "
+        "Creates its own author, book and borrowers, and deletes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', default='1,2,4,8,16',
+                            help="Comma-separated numbers of concurrent clients to try.")
+        parser.add_argument('--seconds', type=float, default=5.0, help="Duration of each round.")
+
+    def handle(self, *args, **options):
+        client_counts = [int(count) for count in options['clients'].split(',')]
+        tag = uuid.uuid4().hex[:8]
+        author = Author.objects.create(username=f'bench-{tag}', date_of_birth='1970-01-01')
+        book = Book.objects.create(
+            title="Hot title", description="", author=author, ISBN=tag, category='fiction',
+            publication_date='2000-01-01'
+        )
+        borrowers = Borrower.objects.bulk_create(
+            Borrower(username=f'bench-{tag}-{i}') for i in range(max(client_counts))
+        )
+
+        try:
+            self.stdout.write(f"{'clients':>8} {'loans/s':>10} {'refused/s':>10} {'errors':>7}")
+            for count in client_counts:
+                totals = self.run_round(book.id, [b.id for b in borrowers[:count]], options['seconds'])
+                open_loans = BorrowingTransaction.objects.filter(book=book, is_returned=False).count()
+                if open_loans:
+                    self.stderr.write(self.style.ERROR(f"{open_loans} loans left open: the copy was lent twice"))
+                self.stdout.write(
+                    f"{count:>8} {totals['loans'] / options['seconds']:>10.1f} "
+                    f"{totals['refused'] / options['seconds']:>10.1f} {totals['errors']:>7}"
+                )
+        finally:
+            Borrower.objects.filter(pk__in=[b.id for b in borrowers]).delete()
+            author.delete()
+
+    def run_round(self, book_id, borrower_ids, seconds):
+        deadline = time.monotonic() + seconds
+        with ThreadPoolExecutor(max_workers=len(borrower_ids)) as pool:
+            results = pool.map(lambda borrower_id: self.client(book_id, borrower_id, deadline), borrower_ids)
+            return sum(results, Counter())
+
+    def client(self, book_id, borrower_id, deadline):
+        """Borrow and immediately return the book until the deadline, counting outcomes."""
+        counts = Counter()
+        try:
+            while time.monotonic() < deadline:
+                try:
+                    loan = circulation.borrow(book_id, borrower_id)
+                    circulation.return_book(loan)
+                    counts['loans'] += 1
+                except circulation.CirculationError:
+                    counts['refused'] += 1
+                except DatabaseError:
+                    counts['errors'] += 1
+        finally:
+            # Each thread opened its own connection
+            connection.close()
+        return counts
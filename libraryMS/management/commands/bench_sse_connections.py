@@ -0,0 +1,117 @@
+import asyncio
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.tokens import AccessToken
+
+from libraryMS.events import get_broker
+
+
+class Command(BaseCommand):
+    help = (
+        "Open many idle notification streams against the ASGI application on a single event loop, "
+        "then report memory per stream and the latency of pushing one event to every stream."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=2000, help="Number of concurrent streams.")
+        parser.add_argument('--first-borrower-id', type=int, default=1_000_000,
+                            help="Streams belong to consecutive borrower ids starting here.")
+
+    def handle(self, *args, **options):
+        from lms.asgi import application
+
+        broker = get_broker()
+        if broker is None:
+            self.stderr.write(self.style.ERROR("NOTIFICATION_EVENTS_URL is empty; streaming is disabled."))
+            return
+        asyncio.run(self.run(application, broker, options['connections'], options['first_borrower_id']))
+
+    async def run(self, application, broker, count, first_borrower_id):
+        borrower_ids = range(first_borrower_id, first_borrower_id + count)
+        streams = [Stream(application, borrower_id) for borrower_id in borrower_ids]
+
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        started = time.monotonic()
+        for stream in streams:
+            stream.open()
+        await asyncio.gather(*(stream.opened.wait() for stream in streams))
+        open_seconds = time.monotonic() - started
+        held = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+
+        refused = [stream for stream in streams if stream.status != 200]
+        if refused:
+            for stream in streams:
+                stream.disconnect.set()
+            await asyncio.gather(*(stream.task for stream in streams))
+            self.stderr.write(self.style.ERROR(f"{len(refused)} streams were refused (HTTP {refused[0].status})."))
+            return
+
+        started = time.monotonic()
+        for borrower_id in borrower_ids:
+            broker.publish(borrower_id, {'id': 0, 'kind': 'general', 'message': 'benchmark', 'read': False})
+        await asyncio.gather(*(stream.notified.wait() for stream in streams))
+        fan_out_seconds = time.monotonic() - started
+
+        for stream in streams:
+            stream.disconnect.set()
+        await asyncio.gather(*(stream.task for stream in streams))
+
+        self.stdout.write(f"streams held:        {count}")
+        self.stdout.write(f"time to open all:    {open_seconds:.2f}s")
+        self.stdout.write(f"memory per stream:   {held / count / 1024:.1f} KiB ({held / 2 ** 20:.1f} MiB total)")
+        self.stdout.write(f"fan-out to all:      {fan_out_seconds * 1000:.0f} ms")
+        self.stdout.write(f"subscribers left:    {broker.subscriber_count()}")
+
+
+class Stream:
+    """A minimal ASGI client holding one notification stream open."""
+
+    def __init__(self, application, borrower_id):
+        self.application = application
+        token = AccessToken()
+        token['user_id'] = token['role_id'] = borrower_id
+        token['role'] = 'borrower'
+        self.scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': '/libraryMS/notifications/stream/',
+            'raw_path': b'/libraryMS/notifications/stream/',
+            'query_string': f'access_token={token}'.encode(),
+            'headers': [],
+            'server': ('localhost', 80),
+            'client': ('127.0.0.1', 0),
+        }
+        self.opened = asyncio.Event()
+        self.notified = asyncio.Event()
+        self.disconnect = asyncio.Event()
+        self.request_sent = False
+        self.status = None
+        self.task = None
+
+    def open(self):
+        self.task = asyncio.create_task(self.application(self.scope, self.receive, self.send))
+
+    async def receive(self):
+        if not self.request_sent:
+            self.request_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+            if self.status != 200:
+                self.opened.set()
+            return
+        if b'event: unread' in message.get('body', b''):
+            self.opened.set()
+        if b'event: notification' in message.get('body', b''):
+            self.notified.set()
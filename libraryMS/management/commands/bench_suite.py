@@ -0,0 +1,59 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from libraryMS.benchmarks import compare, run_suite
+
+
+class Command(BaseCommand):
+    help = (
+        "Time every API route, Celery task, report type and response renderer against the current (seeded) database, "
+        "write the latency percentiles and query counts as JSON, and fail on regressions against a baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help="Timed calls per case, after one warm-up.")
+        parser.add_argument('--only', action='append', help="Run only cases whose name contains this; repeatable.")
+        parser.add_argument('--output', default='benchmarks/results.json', help="Where to write the results.")
+        parser.add_argument('--baseline', default='benchmarks/baseline.json', help="Results to compare against.")
+        parser.add_argument('--update-baseline', action='store_true', help="Store these results as the baseline.")
+        parser.add_argument('--latency-tolerance', type=float, default=0.25,
+                            help="Allowed relative p95 growth before a case counts as a regression.")
+        parser.add_argument('--latency-floor-ms', type=float, default=2.0,
+                            help="p95 growth below this many milliseconds is treated as noise.")
+        parser.add_argument('--query-tolerance', type=int, default=0, help="Allowed extra queries per case.")
+
+    def handle(self, *args, **options):
+        try:
+            results = run_suite(repeat=options['repeat'], only=options['only'], log=self.stdout.write)
+        except LookupError as error:
+            raise CommandError(error)
+        write_json(options['output'], results)
+        self.stdout.write(f"Results written to {options['output']}.")
+
+        baseline_path = Path(options['baseline'])
+        if options['update_baseline']:
+            write_json(baseline_path, results)
+            self.stdout.write(self.style.SUCCESS(f"Baseline updated: {baseline_path}."))
+            return
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(f"No baseline at {baseline_path}; nothing to compare."))
+            return
+
+        baseline = json.loads(baseline_path.read_text())
+        if baseline['meta']['rows'] != results['meta']['rows']:
+            self.stdout.write(self.style.WARNING("The baseline was recorded against a different data set."))
+        regressions = compare(
+            results, baseline, latency_tolerance=options['latency_tolerance'],
+            latency_floor_ms=options['latency_floor_ms'], query_tolerance=options['query_tolerance'],
+        )
+        if regressions:
+            raise CommandError("Regressions against the baseline:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+
+def write_json(path, document):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(document, indent=2, sort_keys=True) + '\n')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from libraryMS.cache import cache_stats, evict_all, reset_stats
+
+
+class Command(BaseCommand):
+    help = "Print the catalog page cache's hit, miss and eviction counters."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Zero the counters after printing them.")
+        parser.add_argument('--flush', action='store_true', help="Drop every cached catalog page.")
+
+    def handle(self, *args, **options):
+        for name, value in cache_stats().items():
+            self.stdout.write(f"{name + ':':<12}{value}")
+        if options['reset']:
+            reset_stats()
+        if options['flush']:
+            evict_all()
+            self.stdout.write(self.style.SUCCESS("Catalog page cache flushed."))
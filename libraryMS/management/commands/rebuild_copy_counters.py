@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from libraryMS.circulation import rebuild_copy_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored total and available copy counts of every book from its copies."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Books updated per statement.")
+
+    def handle(self, *args, **options):
+        updated = rebuild_copy_counters(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt copy counters for {updated} books."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from libraryMS.ratings import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored rating sum, count, histogram and average of every book from its reviews."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Books updated per statement.")
+
+    def handle(self, *args, **options):
+        updated = rebuild_counters(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating counters for {updated} books."))
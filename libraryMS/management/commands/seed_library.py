@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from libraryMS.benchmarks import SCALES, seed_library
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-insert a synthetic library for benchmarking: authors, books, borrowers, loans, "
+        "reservations, reviews and notifications. Meant for a dedicated database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='small', help="Row-count preset.")
+        for table in SCALES['small']:
+            parser.add_argument(f'--{table}', type=int, help=f"Override the preset's number of {table}.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per INSERT statement.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, for reproducible data.")
+
+    def handle(self, *args, **options):
+        scale = {
+            table: options[table] if options[table] is not None else count
+            for table, count in SCALES[options['scale']].items()
+        }
+        started = time.monotonic()
+        log = self.stdout.write if options['verbosity'] > 1 else lambda message: None
+        counts = seed_library(scale, batch_size=options['batch_size'], seed=options['seed'], log=log)
+        for table, count in counts.items():
+            self.stdout.write(f"{table + ':':<15}{count:>12,}")
+        self.stdout.write(self.style.SUCCESS(f"Seeded in {time.monotonic() - started:.1f}s."))
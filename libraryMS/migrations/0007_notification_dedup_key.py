@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-18 01:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libraryMS', '0006_remove_author_user_remove_borrower_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='dedup_key',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='kind',
+            field=models.CharField(choices=[('general', 'General'), ('due_soon', 'Due soon'), ('overdue', 'Overdue'), ('reservation_available', 'Reservation available'), ('reservation_expired', 'Reservation expired')], default='general', max_length=30),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.1.1 on 2026-10-18 01:50
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def count_ratings(apps, schema_editor):
+    Book = apps.get_model('libraryMS', 'Book')
+    Review = apps.get_model('libraryMS', 'Review')
+
+    def per_book(aggregate, **filters):
+        reviews = Review.objects.filter(book=OuterRef('pk'), **filters).values('book')
+        return Coalesce(Subquery(reviews.annotate(value=aggregate).values('value')), 0)
+
+    # Start the counters from the reviews already written, so the next one adjusts the real average
+    Book.objects.update(
+        rating_sum=per_book(Sum('rating')),
+        rating_count=per_book(Count('id')),
+        **{f'rating_{star}_count': per_book(Count('id'), rating=star) for star in range(1, 6)},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libraryMS', '0007_notification_dedup_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 5.1.1 on 2026-10-18 01:52
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+from libraryMS.migrations import _sqlite_fts as sqlite_fts
+
+
+POSTGRES_FORWARDS = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    '''
+    CREATE OR REPLACE FUNCTION "libraryMS_book_search_vector"() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(
+                (SELECT name FROM "libraryMS_author" WHERE id = NEW.author_id), '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    CREATE TRIGGER "libraryMS_book_search_vector_update"
+    BEFORE INSERT OR UPDATE OF title, description, author_id ON "libraryMS_book"
+    FOR EACH ROW EXECUTE FUNCTION "libraryMS_book_search_vector"()
+    ''',
+    # Renaming an author re-indexes their books through the trigger above
+    '''
+    CREATE OR REPLACE FUNCTION "libraryMS_author_search_vector"() RETURNS trigger AS $$
+    BEGIN
+        UPDATE "libraryMS_book" SET title = title WHERE author_id = NEW.id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    CREATE TRIGGER "libraryMS_author_search_vector_update"
+    AFTER UPDATE OF name ON "libraryMS_author"
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE FUNCTION "libraryMS_author_search_vector"()
+    ''',
+    'UPDATE "libraryMS_book" SET title = title',
+    'CREATE INDEX "libraryMS_book_search_vector_gin" ON "libraryMS_book" USING gin (search_vector)',
+    'CREATE INDEX "libraryMS_book_title_trgm" ON "libraryMS_book" USING gin (title gin_trgm_ops)',
+]
+
+POSTGRES_BACKWARDS = [
+    'DROP INDEX IF EXISTS "libraryMS_book_title_trgm"',
+    'DROP INDEX IF EXISTS "libraryMS_book_search_vector_gin"',
+    'DROP TRIGGER IF EXISTS "libraryMS_author_search_vector_update" ON "libraryMS_author"',
+    'DROP FUNCTION IF EXISTS "libraryMS_author_search_vector"()',
+    'DROP TRIGGER IF EXISTS "libraryMS_book_search_vector_update" ON "libraryMS_book"',
+    'DROP FUNCTION IF EXISTS "libraryMS_book_search_vector"()',
+]
+
+SQLITE_FORWARDS = [
+    '''
+    CREATE VIRTUAL TABLE "libraryMS_book_fts" USING fts5(
+        title, author_name, description, tokenize = 'porter unicode61'
+    )
+    ''',
+    *sqlite_fts.CREATE_TRIGGERS,
+    '''
+    INSERT INTO "libraryMS_book_fts" (rowid, title, author_name, description)
+    SELECT b.id, b.title, a.name, b.description
+    FROM "libraryMS_book" b JOIN "libraryMS_author" a ON a.id = b.author_id
+    ''',
+]
+
+SQLITE_BACKWARDS = [
+    *sqlite_fts.DROP_TRIGGERS,
+    'DROP TABLE IF EXISTS "libraryMS_book_fts"',
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libraryMS', '0008_book_rating_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(
+            run_for_vendor({'postgresql': POSTGRES_FORWARDS, 'sqlite': SQLITE_FORWARDS}),
+            run_for_vendor({'postgresql': POSTGRES_BACKWARDS, 'sqlite': SQLITE_BACKWARDS}),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-18 02:05
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_active_loans(apps, schema_editor):
+    Borrower = apps.get_model('libraryMS', 'Borrower')
+    BorrowingTransaction = apps.get_model('libraryMS', 'BorrowingTransaction')
+    open_loans = (
+        BorrowingTransaction.objects.filter(borrower=OuterRef('pk'), is_returned=False)
+        .values('borrower')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    Borrower.objects.update(active_loans=Coalesce(Subquery(open_loans), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libraryMS', '0009_book_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='borrower',
+            name='active_loans',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_active_loans, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.1 on 2026-10-18 02:05
+
+from django.db import migrations, models
+from django.utils import timezone
+
+from libraryMS.migrations._sqlite_fts import restore_triggers, suspend_triggers
+
+
+def create_catalog_version(apps, schema_editor):
+    CatalogVersion = apps.get_model('libraryMS', 'CatalogVersion')
+    CatalogVersion.objects.create(pk=1, version=0, changed_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libraryMS', '0010_borrower_active_loans'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('changed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(suspend_triggers, restore_triggers),
+        migrations.AddField(
+            model_name='book',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(restore_triggers, suspend_triggers),
+        migrations.RunPython(create_catalog_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.1 on 2026-10-18 02:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libraryMS', '0011_catalog_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='borrowingtransaction',
+            name='borrower',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='libraryMS.borrower'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='reservation',
+            name='book',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='libraryMS.book'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('borrowed_by__isnull', True), ('reserved_by__isnull', True)), fields=['id'], name='book_available_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowingtransaction',
+            index=models.Index(fields=['borrower', 'is_returned'], name='loan_borrower_returned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowingtransaction',
+            index=models.Index(condition=models.Q(('is_returned', False)), fields=['due_date'], name='loan_open_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'read', 'created_at'], name='notification_user_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['expiration_date'], name='reservation_expiration_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['book', 'expiration_date'], name='reservation_book_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.1 on 2026-10-18 02:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libraryMS', '0012_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_name', models.CharField(max_length=200)),
+                ('task_id', models.CharField(max_length=255, unique=True)),
+                ('status', models.CharField(choices=[('started', 'Started'), ('succeeded', 'Succeeded'), ('failed', 'Failed'), ('retried', 'Retried')], default='started', max_length=20)),
+                ('worker', models.CharField(blank=True, max_length=255)),
+                ('enqueued_at', models.DateTimeField(blank=True, null=True)),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('queue_lag', models.FloatField(blank=True, null=True)),
+                ('runtime', models.FloatField(blank=True, null=True)),
+                ('rows_scanned', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('rows_written', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('rows_deleted', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('chunks', models.PositiveIntegerField(blank=True, null=True)),
+                ('rows_per_sec', models.FloatField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['task_name', '-started_at'], name='taskrun_history_idx')],
+            },
+        ),
+    ]
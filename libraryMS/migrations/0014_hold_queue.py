@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-18 02:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libraryMS', '0013_task_runs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Hold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('book', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='libraryMS.book')),
+                ('borrower', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='libraryMS.borrower')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='hold_expiry_idx')],
+                'constraints': [models.UniqueConstraint(fields=('book', 'position'), name='hold_queue_position_uniq'), models.UniqueConstraint(fields=('book', 'borrower'), name='hold_one_per_borrower')],
+            },
+        ),
+    ]
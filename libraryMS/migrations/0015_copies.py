@@ -0,0 +1,92 @@
+# Generated by Django 5.1.1 on 2026-10-18 02:50
+
+import django.db.models.deletion
+from itertools import islice
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+from libraryMS.migrations._sqlite_fts import restore_triggers, suspend_triggers
+
+BATCH_SIZE = 5000
+
+
+def create_copies(apps, schema_editor):
+    Book = apps.get_model('libraryMS', 'Book')
+    Copy = apps.get_model('libraryMS', 'Copy')
+    BorrowingTransaction = apps.get_model('libraryMS', 'BorrowingTransaction')
+
+    # Every title so far was a single copy, on loan to Book.borrowed_by if that was set
+    rows = Book.objects.order_by('id').values_list('id', 'borrowed_by_id').iterator(chunk_size=BATCH_SIZE)
+    while batch := list(islice(rows, BATCH_SIZE)):
+        Copy.objects.bulk_create(
+            Copy(book_id=book_id, status='on_loan' if borrower_id else 'available', borrower_id=borrower_id)
+            for book_id, borrower_id in batch
+        )
+    Book.objects.filter(borrowed_by__isnull=False).update(available_copies=0)
+    BorrowingTransaction.objects.filter(is_returned=False).update(copy=Subquery(
+        Copy.objects.filter(book_id=OuterRef('book_id'), borrower_id=OuterRef('borrower_id')).values('id')[:1]
+    ))
+
+
+def restore_borrowed_by(apps, schema_editor):
+    Book = apps.get_model('libraryMS', 'Book')
+    Copy = apps.get_model('libraryMS', 'Copy')
+    # Lossy when a title has several copies out: the one-to-one keeps a single borrower
+    Book.objects.update(borrowed_by=Subquery(
+        Copy.objects.filter(book_id=OuterRef('id'), status='on_loan').order_by('id').values('borrower_id')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libraryMS', '0014_hold_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Copy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('available', 'Available'), ('on_loan', 'On loan')], default='available', max_length=20)),
+                ('acquired_at', models.DateTimeField(auto_now_add=True)),
+                ('book', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='copies', to='libraryMS.book')),
+                ('borrower', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='copies_on_loan', to='libraryMS.borrower')),
+            ],
+            options={
+                'verbose_name_plural': 'copies',
+                'indexes': [models.Index(fields=['book', 'status'], name='copy_book_status_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='borrowingtransaction',
+            name='copy',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='loans', to='libraryMS.copy'),
+        ),
+        migrations.RunPython(suspend_triggers, restore_triggers),
+        migrations.AddField(
+            model_name='book',
+            name='total_copies',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='available_copies',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.RunPython(create_copies, restore_borrowed_by),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='book_available_idx',
+        ),
+        migrations.RemoveField(
+            model_name='book',
+            name='borrowed_by',
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('available_copies__gt', 0), ('reserved_by__isnull', True)), fields=['id'], name='book_available_idx'),
+        ),
+        migrations.RunPython(restore_triggers, suspend_triggers),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def address_borrowers(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Borrower = apps.get_model('libraryMS', 'Borrower')
+    Notification = apps.get_model('libraryMS', 'Notification')
+
+    # Accounts live in their own tables: a notification's recipient is the borrower signed up under its user's username
+    username = User.objects.filter(pk=OuterRef(OuterRef('user_id'))).values('username')
+    borrower = Borrower.objects.filter(username=Subquery(username)).values('id')[:1]
+    Notification.objects.update(borrower_id=Subquery(borrower))
+    # Users who aren't borrowers have no inbox left to read them in
+    Notification.objects.filter(borrower_id=None).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libraryMS', '0015_copies'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='notification_user_unread_idx',
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='borrower',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='libraryMS.borrower'),
+        ),
+        migrations.RunPython(address_borrowers, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='notification',
+            name='borrower',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='libraryMS.borrower'),
+        ),
+        migrations.RemoveField(
+            model_name='notification',
+            name='user',
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['borrower', 'read', 'created_at'], name='notification_unread_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:40
+
+from django.db import migrations
+from django.db.models import Count, F, Max, OuterRef, Subquery
+
+
+def compact_positions(apps, schema_editor):
+    Hold = apps.get_model('libraryMS', 'Hold')
+    last = Hold.objects.aggregate(last=Max('position'))['last']
+    if last is None:
+        return
+
+    # Past the end of every queue first, so that no two holds of a book share a position while renumbering
+    Hold.objects.update(position=F('position') + last)
+    # Holds joined their queue in id order, under the book's lock
+    ahead = (
+        Hold.objects.filter(book_id=OuterRef('book_id'), id__lte=OuterRef('id'))
+        .order_by().values('book_id').annotate(count=Count('id')).values('count')
+    )
+    Hold.objects.update(position=Subquery(ahead))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libraryMS', '0016_notification_borrower'),
+    ]
+
+    operations = [
+        migrations.RunPython(compact_positions, migrations.RunPython.noop),
+    ]
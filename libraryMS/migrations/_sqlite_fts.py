@@ -0,0 +1,53 @@
+"""
+Triggers keeping the SQLite full-text side table in step with ``libraryMS_book``.
+
+SQLite alters a table by rebuilding it, which drops the triggers defined on it
+and breaks the ones that reference it. Migrations changing ``Book`` columns
+wrap the change in ``suspend_triggers`` / ``restore_triggers``.
+"""
+
+CREATE_TRIGGERS = [
+    '''
+    CREATE TRIGGER "libraryMS_book_fts_insert" AFTER INSERT ON "libraryMS_book" BEGIN
+        INSERT INTO "libraryMS_book_fts" (rowid, title, author_name, description)
+        VALUES (NEW.id, NEW.title, (SELECT name FROM "libraryMS_author" WHERE id = NEW.author_id), NEW.description);
+    END
+    ''',
+    '''
+    CREATE TRIGGER "libraryMS_book_fts_update" AFTER UPDATE OF title, description, author_id ON "libraryMS_book" BEGIN
+        DELETE FROM "libraryMS_book_fts" WHERE rowid = OLD.id;
+        INSERT INTO "libraryMS_book_fts" (rowid, title, author_name, description)
+        VALUES (NEW.id, NEW.title, (SELECT name FROM "libraryMS_author" WHERE id = NEW.author_id), NEW.description);
+    END
+    ''',
+    '''
+    CREATE TRIGGER "libraryMS_book_fts_delete" AFTER DELETE ON "libraryMS_book" BEGIN
+        DELETE FROM "libraryMS_book_fts" WHERE rowid = OLD.id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER "libraryMS_author_fts_update" AFTER UPDATE OF name ON "libraryMS_author" BEGIN
+        UPDATE "libraryMS_book_fts" SET author_name = NEW.name
+        WHERE rowid IN (SELECT id FROM "libraryMS_book" WHERE author_id = NEW.id);
+    END
+    ''',
+]
+
+DROP_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS "libraryMS_author_fts_update"',
+    'DROP TRIGGER IF EXISTS "libraryMS_book_fts_delete"',
+    'DROP TRIGGER IF EXISTS "libraryMS_book_fts_update"',
+    'DROP TRIGGER IF EXISTS "libraryMS_book_fts_insert"',
+]
+
+
+def _run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            for statement in statements:
+                schema_editor.execute(statement)
+    return run
+
+
+suspend_triggers = _run_on_sqlite(DROP_TRIGGERS)
+restore_triggers = _run_on_sqlite(CREATE_TRIGGERS)
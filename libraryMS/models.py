@@ -1,4 +1,5 @@
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
 from django.contrib.auth.models import AbstractUser
@@ -44,6 +45,8 @@ class Borrower(AbstractUser):
         verbose_name='user permissions'
     )
     registration_date = models.DateTimeField(auto_now_add=True)
+    # Open loans, maintained by libraryMS.circulation so the loan limit needs no COUNT
+    active_loans = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.username
@@ -64,36 +67,150 @@ class Book(models.Model):
     ISBN = models.CharField(max_length=13, unique=True)
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES, blank=False, null=False)
     publication_date = models.DateField()
+    # Derived from rating_sum / rating_count; maintained by libraryMS.ratings
     average_rating = models.FloatField(default=0)
-    borrowed_by = models.OneToOneField(Borrower, on_delete=models.SET_NULL, null=True, blank=True,
-                                       related_name='borrowed_book')
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    # Per-star histogram of review ratings
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
+    # Copies owned and copies on the shelf, maintained by libraryMS.circulation so that
+    # availability is read from the book row alone
+    total_copies = models.PositiveIntegerField(default=1, editable=False)
+    available_copies = models.PositiveIntegerField(default=1, editable=False)
     reserved_by = models.OneToOneField(Borrower, on_delete=models.SET_NULL, null=True, blank=True,
                                        related_name='reserved_book')
+    # Weighted title/author/description document, kept current by a database trigger on Postgres.
+    # Other backends index the same text in a full-text side table instead (see libraryMS.search).
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Queryset update() calls must set this explicitly; it backs the book's ETag and Last-Modified
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            # A new title arrives with all of its copies on the shelf
+            Copy.objects.bulk_create(Copy(book=self) for _ in range(self.total_copies))
+
+    @property
+    def rating_histogram(self):
+        return {star: getattr(self, f'rating_{star}_count') for star in range(1, 6)}
+
+    class Meta:
+        indexes = [
+            # Books on the shelf, in catalog order: the `available` filter pages through this
+            models.Index(
+                fields=['id'], name='book_available_idx',
+                condition=models.Q(available_copies__gt=0, reserved_by__isnull=True),
+            ),
+        ]
+
+
+class Copy(models.Model):
+    """One physical copy of a book."""
+    AVAILABLE = 'available'
+    ON_LOAN = 'on_loan'
+    STATUS_CHOICES = [
+        (AVAILABLE, 'Available'),
+        (ON_LOAN, 'On loan'),
+    ]
+
+    # Indexed by copy_book_status_idx, which leads with this column
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='copies', db_index=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=AVAILABLE)
+    borrower = models.ForeignKey(Borrower, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='copies_on_loan')
+    acquired_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'copies'
+        indexes = [
+            # The copies of a title on the shelf, to pick one to lend
+            models.Index(fields=['book', 'status'], name='copy_book_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Copy {self.pk} of {self.book.title}"
+
+
+class CatalogVersion(models.Model):
+    """Single-row counter bumped whenever any page of the book catalog may have changed."""
+    version = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Catalog version {self.version}"
+
 
 class BorrowingTransaction(models.Model):
-    borrower = models.ForeignKey(Borrower, on_delete=models.CASCADE)
+    # Indexed by loan_borrower_returned_idx, which leads with this column
+    borrower = models.ForeignKey(Borrower, on_delete=models.CASCADE, db_index=False)
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
+    copy = models.ForeignKey(Copy, on_delete=models.SET_NULL, null=True, blank=True, related_name='loans')
     borrowed_date = models.DateTimeField(auto_now_add=True)
     due_date = models.DateTimeField()
     is_returned = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # A borrower's loans, open or returned: borrowing history and the loan limit
+            models.Index(fields=['borrower', 'is_returned'], name='loan_borrower_returned_idx'),
+            # Open loans by due date, for reminders and reports; returned loans are the bulk and stay out
+            models.Index(fields=['due_date'], name='loan_open_due_idx', condition=models.Q(is_returned=False)),
+        ]
+
     def __str__(self):
         return f"{self.borrower.username} borrowed {self.book.title}"
 
 
 class Reservation(models.Model):
     borrower = models.ForeignKey(Borrower, on_delete=models.CASCADE)
-    book = models.ForeignKey(Book, on_delete=models.CASCADE)
+    # Indexed by reservation_book_expiry_idx, which leads with this column
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, db_index=False)
     expiration_date = models.DateTimeField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['expiration_date'], name='reservation_expiration_idx'),
+            models.Index(fields=['book', 'expiration_date'], name='reservation_book_expiry_idx'),
+        ]
+
     def __str__(self):
         return f"{self.borrower.username} reserved {self.book.title}"
 
 
+class Hold(models.Model):
+    """A patron's place in the queue for a book that someone else has reserved."""
+    # Indexed by hold_queue_position_uniq, which leads with this column
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='holds', db_index=False)
+    borrower = models.ForeignKey(Borrower, on_delete=models.CASCADE, related_name='holds')
+    # Place in the book's queue, 1 for the next in line: libraryMS.holds moves the holds behind up whenever one
+    # leaves, under the book's row lock. Only deleting an account drops holds without closing their gaps
+    position = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            # Also the index behind head-of-queue and place-in-queue lookups
+            models.UniqueConstraint(fields=['book', 'position'], name='hold_queue_position_uniq'),
+            models.UniqueConstraint(fields=['book', 'borrower'], name='hold_one_per_borrower'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='hold_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.borrower.username} is #{self.position} for {self.book.title}"
+
+
 class Review(models.Model):
     borrower = models.ForeignKey(Borrower, on_delete=models.CASCADE)
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
@@ -105,13 +222,31 @@ class Review(models.Model):
 
 
 class Notification(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    KIND_CHOICES = [
+        ('general', 'General'),
+        ('due_soon', 'Due soon'),
+        ('overdue', 'Overdue'),
+        ('reservation_available', 'Reservation available'),
+        ('reservation_expired', 'Reservation expired'),
+    ]
+
+    # Indexed by notification_unread_idx, which leads with this column
+    borrower = models.ForeignKey(Borrower, on_delete=models.CASCADE, related_name='notifications', db_index=False)
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES, default='general')
+    # kind:target:date-bucket, so re-running a task for the same bucket is a no-op
+    dedup_key = models.CharField(max_length=100, unique=True, null=True, blank=True, editable=False)
     message = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Unread counts and mark-all-read, newest first
+            models.Index(fields=['borrower', 'read', 'created_at'], name='notification_unread_idx'),
+        ]
+
     def __str__(self):
-        return f"Notification for {self.user.username} - {self.message[:20]}"
+        return f"Notification for {self.borrower.username} - {self.message[:20]}"
 
 
 class Report(models.Model):
@@ -131,3 +266,39 @@ class Report(models.Model):
 
     def __str__(self):
         return f"{self.report_type} - {self.status} - {self.created_at}"
+
+
+class TaskRun(models.Model):
+    """One execution of a Celery task, recorded by libraryMS.telemetry."""
+    STATUS_CHOICES = [
+        ('started', 'Started'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+        ('retried', 'Retried'),
+    ]
+
+    task_name = models.CharField(max_length=200)
+    task_id = models.CharField(max_length=255, unique=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='started')
+    worker = models.CharField(max_length=255, blank=True)
+    enqueued_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Seconds between publishing the task and a worker starting it
+    queue_lag = models.FloatField(null=True, blank=True)
+    runtime = models.FloatField(null=True, blank=True)
+    rows_scanned = models.PositiveBigIntegerField(null=True, blank=True)
+    rows_written = models.PositiveBigIntegerField(null=True, blank=True)
+    rows_deleted = models.PositiveBigIntegerField(null=True, blank=True)
+    chunks = models.PositiveIntegerField(null=True, blank=True)
+    rows_per_sec = models.FloatField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['task_name', '-started_at'], name='taskrun_history_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task_name} {self.status} at {self.started_at}"
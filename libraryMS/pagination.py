@@ -0,0 +1,127 @@
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Opaque cursor pagination over the primary key.
+
+    Every page is an indexed range scan from the previous cursor, with no OFFSET
+    and no COUNT(*), so scrolling deep costs the same as the first page.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-id'
+
+    # CursorPagination.paginate_queryset, split around its one query so the async views can await it
+
+    def paginate_queryset(self, queryset, request, view=None):
+        query = self.page_query(queryset, request, view)
+        return None if query is None else self.paginate_rows(list(query))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        query = self.page_query(queryset, request, view)
+        return None if query is None else self.paginate_rows([row async for row in query])
+
+    def page_query(self, queryset, request, view=None):
+        """Return the sliced queryset holding the requested page plus one row, or None when not paginating."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        # Cursor pagination always enforces an ordering
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        # A cursor with a fixed position filters by that
+        if current_position is not None:
+            queryset = queryset.filter(self.position_filter(current_position))
+
+        self._page_state = (offset, reverse, current_position)
+        # One extra row tells whether a page follows
+        return queryset[offset:offset + self.page_size + 1]
+
+    def position_filter(self, position):
+        """
+        Return the condition selecting the rows past ``position``, in the cursor's direction.
+
+        A position holds the value of every ordering column, comma-separated, so
+        an ordering over several columns is compared as a whole row and never
+        leaves ties for the offset to skip. Those columns must be numbers.
+        """
+        values = position.split(',')
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        condition, ties = Q(), {}
+        for order, value in zip(self.ordering, values):
+            order_attr = order.lstrip('-')
+            # (cursor reversed) XOR (queryset reversed)
+            lookup = 'lt' if self.cursor.reverse != order.startswith('-') else 'gt'
+            condition |= Q(**ties, **{f'{order_attr}__{lookup}': value})
+            ties[order_attr] = value
+        return condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        position_of = super()._get_position_from_instance
+        return ','.join(position_of(instance, [order]) for order in ordering)
+
+    def paginate_rows(self, results):
+        """Turn the rows fetched for ``page_query()`` into the page, and work out its neighbours."""
+        offset, reverse, current_position = self._page_state
+        self.page = list(results[:self.page_size])
+
+        # The position of the first row after the page
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            # The query ran in reverse order, so the page is flipped back
+            self.page = list(reversed(self.page))
+
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        # Page controls in the browsable API
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+
+class BookPagination(IdCursorPagination):
+    ordering = 'id'
+
+    def get_ordering(self, request, queryset, view):
+        # Search results are paged in relevance order, ties broken by id
+        if 'rank' in queryset.query.annotations:
+            return ('-rank', 'id')
+        return super().get_ordering(request, queryset, view)
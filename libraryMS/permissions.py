@@ -8,7 +8,7 @@ class IsAuthor(BasePermission):
 
     def has_object_permission(self, request, view, obj):
         # Ensure that authors can only manage their own books
-        return obj.author == request.user.author
+        return obj.author_id == request.user.author.pk
 
 
 # Each user can edit their own information
@@ -16,4 +16,5 @@ class IsOwnerOrReadOnly(BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method in SAFE_METHODS:
             return True
-        return obj == request.user  # Only the user can edit their own information
+        # Only the user can edit their own information; the request user exposes its account by role
+        return getattr(request.user, obj._meta.model_name, None) == obj
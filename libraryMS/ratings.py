@@ -0,0 +1,85 @@
+from django.db.models import Count, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.utils import timezone
+
+from libraryMS.conditional import bump_catalog_version
+from libraryMS.models import Book, Review
+
+STARS = range(1, 6)
+
+
+def apply_rating_change(book_id, added=None, removed=None):
+    """
+    Adjust a book's rating counters for one review write, in a single UPDATE.
+
+    Pass ``added`` for a new review, ``removed`` for a deleted one and both for
+    an edited rating. Must run in the same transaction as the review write.
+    """
+    sum_delta = (added or 0) - (removed or 0)
+    count_delta = (added is not None) - (removed is not None)
+    new_sum = F('rating_sum') + sum_delta
+    new_count = F('rating_count') + count_delta
+
+    updates = {
+        'updated_at': timezone.now(),
+        'rating_sum': new_sum,
+        'rating_count': new_count,
+        # Every assignment in an UPDATE sees the old row, so derive the average from the new values
+        'average_rating': Coalesce(
+            Cast(new_sum, FloatField()) / NullIf(new_count, 0), Value(0.0), output_field=FloatField()
+        ),
+    }
+    if added is not None:
+        updates[f'rating_{added}_count'] = F(f'rating_{added}_count') + 1
+    if removed is not None:
+        histogram_field = f'rating_{removed}_count'
+        # An edit that keeps the same rating leaves the histogram untouched
+        updates[histogram_field] = updates.get(histogram_field, F(histogram_field)) - 1
+
+    Book.objects.filter(pk=book_id).update(**updates)
+    bump_catalog_version([book_id])
+
+
+def rebuild_counters(batch_size=1000):
+    """
+    Recompute every book's rating counters from its reviews.
+
+    Books are processed in batches of ``batch_size``: one aggregate over the
+    batch's reviews and one bulk UPDATE per batch. Returns the number of books
+    updated.
+    """
+    fields = ['updated_at', 'average_rating', 'rating_sum', 'rating_count'] + [
+        f'rating_{star}_count' for star in STARS
+    ]
+    updated = 0
+    batch = []
+    for book in Book.objects.only('id').order_by('id').iterator(chunk_size=batch_size):
+        batch.append(book)
+        if len(batch) >= batch_size:
+            updated += _rebuild_batch(batch, fields)
+            batch = []
+    if batch:
+        updated += _rebuild_batch(batch, fields)
+    bump_catalog_version()
+    return updated
+
+
+def _rebuild_batch(books, fields):
+    totals = {
+        row['book']: row
+        for row in Review.objects.filter(book__in=[book.id for book in books]).values('book').annotate(
+            total=Sum('rating'),
+            count=Count('id'),
+            **{f'stars_{star}': Count('id', filter=Q(rating=star)) for star in STARS},
+        )
+    }
+    now = timezone.now()
+    for book in books:
+        book.updated_at = now
+        row = totals.get(book.id, {})
+        book.rating_sum = row.get('total') or 0
+        book.rating_count = row.get('count', 0)
+        book.average_rating = book.rating_sum / book.rating_count if book.rating_count else 0
+        for star in STARS:
+            setattr(book, f'rating_{star}_count', row.get(f'stars_{star}', 0))
+    return Book.objects.bulk_update(books, fields)
@@ -0,0 +1,187 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+logger = logging.getLogger(__name__)
+
+PIN_KEY_PREFIX = 'replica:pinned'
+
+# Whether reads in the current context may go to a replica; off unless a caller opts in
+_replica_reads = ContextVar('replica_reads', default=False)
+# alias -> (checked at, usable), per process
+_health = {}
+_health_lock = threading.Lock()
+
+
+def replica_aliases():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def account_key(user):
+    """Identify the account behind a request user; authors and borrowers have separate id spaces."""
+    for role in ('author', 'borrower'):
+        account = getattr(user, role, None)
+        if account is not None:
+            return f'{role}:{account.pk}'
+    return f'user:{user.pk}'
+
+
+@contextmanager
+def use_replica(enabled=True):
+    """Send the reads made in this block to a replica, or with ``enabled=False`` keep them on the primary."""
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def replica_lag(alias):
+    """Seconds the replica ``alias`` is behind its primary; 0 for backends without replication."""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    with connection.cursor() as cursor:
+        # An idle primary sends nothing to replay, so a replica that has replayed all it received is current
+        cursor.execute(
+            "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+            "THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+        )
+        return float(cursor.fetchone()[0] or 0)
+
+
+def is_usable(alias):
+    """
+    Whether the replica ``alias`` answers and is at most ``REPLICA_MAX_LAG_SECONDS`` behind.
+
+    The answer is kept for ``REPLICA_CHECK_SECONDS``, so a request pays for a
+    check only when the previous one has gone stale.
+    """
+    now = time.monotonic()
+    checked_at, usable = _health.get(alias, (None, False))
+    if checked_at is not None and now - checked_at < getattr(settings, 'REPLICA_CHECK_SECONDS', 5):
+        return usable
+    with _health_lock:
+        try:
+            lag = replica_lag(alias)
+        except DatabaseError:
+            logger.warning("Replica %s is unreachable; reading from the primary", alias, exc_info=True)
+            usable = False
+        else:
+            usable = lag <= getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 5)
+            if not usable:
+                logger.warning("Replica %s is %.1fs behind; reading from the primary", alias, lag)
+        _health[alias] = (now, usable)
+    return usable
+
+
+def reset_health():
+    _health.clear()
+
+
+def read_alias():
+    """A usable replica picked at random, or the primary when none is."""
+    usable = [alias for alias in replica_aliases() if is_usable(alias)]
+    return random.choice(usable) if usable else DEFAULT_DB_ALIAS
+
+
+def _pin_key(user):
+    return f'{PIN_KEY_PREFIX}:{account_key(user)}'
+
+
+def pin_cache():
+    return caches[getattr(settings, 'REPLICA_PIN_CACHE', 'default')]
+
+
+def check_pin_cache():
+    """
+    Refuse to run replicas with a pin cache that other processes can't see.
+
+    The request after a write may be served by any worker, so a pin kept in
+    one process's memory would send that request to a lagging replica.
+    """
+    if replica_aliases() and isinstance(pin_cache(), (LocMemCache, DummyCache)):
+        raise ImproperlyConfigured(
+            "DATABASE_REPLICAS needs REPLICA_PIN_CACHE to name a cache shared by every worker, not a local one."
+        )
+
+
+def pin_to_primary(user):
+    """Keep ``user``'s reads on the primary for ``REPLICA_STICKY_SECONDS``, so they see their own writes."""
+    if replica_aliases() and user is not None and user.is_authenticated:
+        pin_cache().set(_pin_key(user), 1, getattr(settings, 'REPLICA_STICKY_SECONDS', 10))
+
+
+def is_pinned(user):
+    return user is not None and user.is_authenticated and pin_cache().get(_pin_key(user)) is not None
+
+
+async def ais_pinned(user):
+    return user is not None and user.is_authenticated and await pin_cache().aget(_pin_key(user)) is not None
+
+
+class PrimaryReplicaRouter:
+    """
+    Send writes to the primary and, where the caller allows it, reads to a replica.
+
+    Reads only leave the primary inside ``use_replica()`` (see
+    ``ReplicaReadsMixin``), and never from within a transaction on the
+    primary, whose reads must see its own uncommitted writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema from the primary
+        return db not in replica_aliases()
+
+
+class ReplicaReadsMixin:
+    """
+    Serve safe-method requests from a replica.
+
+    A user who wrote through the API stays on the primary for
+    ``REPLICA_STICKY_SECONDS`` afterwards, so they read their own writes even
+    while the replicas catch up.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Authenticated by now; permission checks above have already read from the primary
+        if self.may_read_replica(request) and not self.is_pinned(request):
+            self._replica_token = _replica_reads.set(True)
+
+    def may_read_replica(self, request):
+        return request.method in SAFE_METHODS and bool(replica_aliases())
+
+    def is_pinned(self, request):
+        return is_pinned(request.user)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = self.__dict__.pop('_replica_token', None)
+        if token is not None:
+            _replica_reads.reset(token)
+        elif request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(getattr(request, 'user', None))
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,105 @@
+import django_filters
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connections
+from django.db.models import BigIntegerField, F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Round
+from rest_framework.filters import BaseFilterBackend
+
+from libraryMS.models import Book
+
+# Minimum trigram similarity for a title to match a misspelled query on Postgres
+TRIGRAM_THRESHOLD = 0.3
+
+# Relative bm25 weights of the FTS5 columns: title, author_name, description
+FTS5_WEIGHTS = (10.0, 5.0, 1.0)
+
+# Ranks are whole multiples of 1/RANK_SCALE: a float rank could come back from a page cursor, or from
+# ranking the same row again, a rounding error away from the one a page was cut at
+RANK_SCALE = 10 ** 6
+
+
+class BookFilter(django_filters.FilterSet):
+    available = django_filters.BooleanFilter(method='filter_available')
+
+    class Meta:
+        model = Book
+        fields = ['author', 'category', 'available']
+
+    def filter_available(self, queryset, name, value):
+        # Only books with a copy on the shelf and no reservation, read from the book row alone
+        available = Q(available_copies__gt=0, reserved_by__isnull=True)
+        return queryset.filter(available if value else ~available)
+
+
+class CatalogSearchFilter(BaseFilterBackend):
+    """
+    Ranked full-text search over book titles, author names and descriptions.
+
+    Matching books are annotated with an integer ``rank`` and ordered best
+    match first, ties broken by id.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        terms = request.query_params.get(self.search_param, '').strip()
+        if not terms:
+            return queryset
+        return search_books(queryset, terms)
+
+
+def search_books(queryset, terms):
+    """Restrict a Book queryset to matches for ``terms``, using the best index the backend offers."""
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        return _search_postgres(queryset, terms)
+    if vendor == 'sqlite':
+        return _search_sqlite(queryset, terms)
+    return _search_fallback(queryset, terms)
+
+
+def _search_postgres(queryset, terms):
+    query = SearchQuery(terms, config='english', search_type='websearch')
+    return (
+        queryset
+        .annotate(similarity=TrigramSimilarity('title', terms))
+        # Both predicates are served by GIN indexes: tsvector match, or trigram match for typos.
+        # The % operator behind trigram_similar is what the index answers, at pg_trgm's own
+        # threshold (0.3 by default); the similarity bound rechecks its rows at ours
+        .filter(Q(search_vector=query) | Q(title__trigram_similar=terms, similarity__gt=TRIGRAM_THRESHOLD))
+        .annotate(rank=_scaled(SearchRank(F('search_vector'), query) + F('similarity')))
+        .order_by('-rank', 'id')
+    )
+
+
+def _search_sqlite(queryset, terms):
+    # Quote every token so user input can't inject FTS5 syntax, and prefix-match each one
+    match = ' '.join('"{}"*'.format(token.replace('"', '""')) for token in terms.split())
+    weights = ', '.join(str(weight) for weight in FTS5_WEIGHTS)
+    table = Book._meta.db_table
+    return (
+        queryset
+        .filter(id__in=RawSQL(
+            f'SELECT rowid FROM "{table}_fts" WHERE "{table}_fts" MATCH %s', [match]
+        ))
+        .annotate(rank=_scaled(RawSQL(
+            # bm25() is lower for better matches
+            f'SELECT -bm25("{table}_fts", {weights}) FROM "{table}_fts" '
+            f'WHERE "{table}_fts" MATCH %s AND rowid = "{table}"."id"',
+            [match], output_field=FloatField(),
+        )))
+        .order_by('-rank', 'id')
+    )
+
+
+def _search_fallback(queryset, terms):
+    return (
+        queryset
+        .filter(Q(title__icontains=terms) | Q(author__name__icontains=terms) | Q(description__icontains=terms))
+        .annotate(rank=Value(0, output_field=BigIntegerField()))
+        .order_by('id')
+    )
+
+
+def _scaled(rank):
+    return Cast(Round(rank * RANK_SCALE), BigIntegerField())
@@ -1,7 +1,11 @@
 
 
 from rest_framework import serializers
-from libraryMS.models import Author, Borrower, Book, BorrowingTransaction, Reservation, Review, Notification
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from libraryMS.circulation import MAX_BATCH_SIZE, MAX_COPIES_ADDED
+from libraryMS.fieldsets import ExpandableFieldsMixin
+from libraryMS.instrumentation import TimedSerializerMixin
+from libraryMS.models import Author, Borrower, Book, BorrowingTransaction, Reservation, Hold, Review, Notification
 
 
 # Sign up Serializer
@@ -45,8 +49,22 @@ class SignUpSerializer(serializers.Serializer):
             return user
 
 
+# Login Serializer
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Issue tokens carrying the account's role and id, so requests resolve the user without a query."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        role = user._meta.model_name
+        if role in ('author', 'borrower'):
+            token['role'] = role
+            token['role_id'] = user.pk
+        return token
+
+
 # Author Serializer
-class AuthorSerializer(serializers.ModelSerializer):
+class AuthorSerializer(ExpandableFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Author
@@ -54,7 +72,7 @@ class AuthorSerializer(serializers.ModelSerializer):
 
 
 # Borrower Serializer
-class BorrowerSerializer(serializers.ModelSerializer):
+class BorrowerSerializer(ExpandableFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Borrower
@@ -62,58 +80,98 @@ class BorrowerSerializer(serializers.ModelSerializer):
 
 
 # Book Serializer
-class BookSerializer(serializers.ModelSerializer):
-    author = AuthorSerializer(read_only=True)  # Nested serializer for author details
-    borrowed_by = BorrowerSerializer(read_only=True)  # Nested serializer for borrower details
-    reserved_by = BorrowerSerializer(read_only=True)  # Nested serializer for reservation details
+class BookSerializer(ExpandableFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {'author': AuthorSerializer, 'reserved_by': BorrowerSerializer}
+    field_columns = {'rating_histogram': [f'rating_{star}_count' for star in range(1, 6)]}
+    # Star keys as strings, so JSON and MessagePack clients receive the same document
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
 
     class Meta:
         model = Book
         fields = [
             'id', 'title', 'description', 'author', 'ISBN', 'category',
-            'publication_date', 'average_rating', 'borrowed_by', 'reserved_by'
+            'publication_date', 'average_rating', 'rating_count', 'rating_histogram',
+            'total_copies', 'available_copies', 'reserved_by'
         ]
+        read_only_fields = ['average_rating', 'rating_count', 'rating_histogram']
 
     def update(self, instance, validated_data):
-        # Allow updating fields other than borrowed_by, reserved_by, and average_rating
+        # Allow updating fields other than the copy counters, reserved_by, and average_rating
+        changed = []
         for attr, value in validated_data.items():
-            if attr not in ['borrowed_by', 'reserved_by', 'average_rating']:
+            if attr not in ['total_copies', 'available_copies', 'reserved_by', 'average_rating']:
                 setattr(instance, attr, value)
-        instance.save()
+                changed.append(attr)
+        # Write only those columns: the instance's counters may be stale by now
+        instance.save(update_fields=[*changed, 'updated_at'])
         return instance
 
 
 # Borrowing Transaction Serializer
-class BorrowingTransactionSerializer(serializers.ModelSerializer):
-    borrower = BorrowerSerializer(read_only=True)  # Nested serializer for borrower
-    book = BookSerializer(read_only=True)  # Nested serializer for book details
+class BorrowingTransactionSerializer(ExpandableFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {'borrower': BorrowerSerializer, 'book': BookSerializer}
 
     class Meta:
         model = BorrowingTransaction
         fields = ['id', 'borrower', 'book', 'borrowed_date', 'due_date', 'is_returned']
 
 
+# Circulation Batch Serializers
+class CirculationOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=['borrow', 'return', 'extend'])
+    book = serializers.IntegerField(required=False)  # Book to borrow
+    loan = serializers.IntegerField(required=False)  # Borrowing transaction to return or extend
+
+    def validate(self, attrs):
+        target = 'book' if attrs['op'] == 'borrow' else 'loan'
+        if target not in attrs:
+            raise serializers.ValidationError({target: f"This field is required to {attrs['op']}."})
+        return attrs
+
+
+class CirculationBatchSerializer(serializers.Serializer):
+    operations = CirculationOperationSerializer(many=True, allow_empty=False, max_length=MAX_BATCH_SIZE)
+
+
+class AddCopiesSerializer(serializers.Serializer):
+    count = serializers.IntegerField(min_value=1, max_value=MAX_COPIES_ADDED)
+
+
 # Reservation Serializer
-class ReservationSerializer(serializers.ModelSerializer):
-    borrower = BorrowerSerializer(read_only=True)  # Nested serializer for borrower
-    book = BookSerializer(read_only=True)  # Nested serializer for book
+class ReservationSerializer(ExpandableFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {'borrower': BorrowerSerializer, 'book': BookSerializer}
 
     class Meta:
         model = Reservation
         fields = ['id', 'borrower', 'book', 'expiration_date']
 
 
+# Hold Serializer
+class HoldSerializer(ExpandableFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {'book': BookSerializer}
+    queue_position = serializers.IntegerField(source='position', read_only=True)  # 1 for the next borrower in line
+
+    class Meta:
+        model = Hold
+        fields = ['id', 'book', 'queue_position', 'created_at', 'expires_at']
+
+
 # Review Serializer
-class ReviewSerializer(serializers.ModelSerializer):
-    borrower = BorrowerSerializer(read_only=True)  # Nested serializer for borrower
-    book = BookSerializer(read_only=True)  # Nested serializer for book details
+class ReviewSerializer(ExpandableFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {'borrower': BorrowerSerializer, 'book': BookSerializer}
+    book_id = serializers.PrimaryKeyRelatedField(queryset=Book.objects.all(), source='book', write_only=True)
 
     class Meta:
         model = Review
-        fields = ['id', 'borrower', 'book', 'review_message', 'rating']
+        fields = ['id', 'borrower', 'book', 'book_id', 'review_message', 'rating']
+
+    def update(self, instance, validated_data):
+        # A review stays attached to the book it was written for
+        validated_data.pop('book', None)
+        return super().update(instance, validated_data)
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(ExpandableFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Notification
-        fields = ['id', 'message', 'created_at', 'read']
+        fields = ['id', 'kind', 'message', 'created_at', 'read']
@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from libraryMS.events import get_broker
+from libraryMS.models import Notification
+
+# Idle streams send a comment this often so proxies don't drop the connection
+KEEPALIVE_SECONDS = 15
+
+
+async def notification_stream(request):
+    """
+    Server-sent events stream of the borrower's new notifications and unread count.
+
+    Sends ``notification`` events as notifications are created, ``read``
+    events as they are marked read, and an ``unread`` count after each burst.
+
+    Meant to be served by the ASGI application: each open stream is a
+    suspended coroutine rather than a blocked worker thread. Browsers'
+    EventSource can't set headers, so the access token may also be passed
+    as the ``access_token`` query parameter.
+    """
+    user = authenticate_stream(request)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided or are invalid."}, status=401)
+    if not hasattr(user, 'borrower'):
+        return JsonResponse({"detail": "Only borrowers receive notifications."}, status=403)
+
+    broker = get_broker()
+    if broker is None:
+        return JsonResponse({"detail": "Notification streaming is disabled."}, status=503)
+
+    response = StreamingHttpResponse(stream_events(broker, user.borrower.pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def authenticate_stream(request):
+    """Resolve the token user from the Authorization header or query string, without a query."""
+    authentication = JWTStatelessUserAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else request.GET.get('access_token')
+    if not raw_token:
+        return None
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except InvalidToken:
+        return None
+
+
+async def stream_events(broker, borrower_id):
+    # Subscribe before counting, so nothing created in between is missed
+    async with broker.subscribe(borrower_id) as queue:
+        yield format_event('unread', {'unread': await count_unread(borrower_id)})
+        while True:
+            try:
+                events = [await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)]
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+
+            # A bulk run delivers bursts; answer the whole burst with one count
+            while not queue.empty():
+                events.append(queue.get_nowait())
+            for event in events:
+                # Other streams of the same borrower receive this very dict, so it is left as is
+                data = {key: value for key, value in event.items() if key != 'event'}
+                yield format_event(event.get('event', 'notification'), data)
+            yield format_event('unread', {'unread': await count_unread(borrower_id)})
+
+
+async def count_unread(borrower_id):
+    return await Notification.objects.filter(borrower_id=borrower_id, read=False).acount()
+
+
+def format_event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
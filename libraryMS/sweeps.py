@@ -0,0 +1,234 @@
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
+
+from libraryMS.conditional import bump_catalog_version
+from libraryMS.holds import promote
+from libraryMS.models import Book, BorrowingTransaction, Notification, Reservation
+from libraryMS.notifications import DEFAULT_CHUNK_SIZE, bulk_notify, dedup_key
+from libraryMS.routers import read_alias
+
+# Fields of the per-shard stats that add up across shards
+SUMMED_STATS = ('rows_scanned', 'rows_written', 'rows_deleted', 'chunks')
+# Returns announce themselves (see tasks.notify_reservation_available); the daily pass
+# only reconciles books freed this recently, in case an announcement was lost
+RECONCILE_WINDOW = timedelta(days=2)
+
+
+def expired_reservation_notification(reservation):
+    return Notification(
+        borrower_id=reservation.borrower_id,
+        kind='reservation_expired',
+        dedup_key=dedup_key('reservation_expired', reservation.id, reservation.expiration_date.date()),
+        message=f"Attention: Your reservation for {reservation.book.title} has expired."
+    )
+
+
+def available_reservation_notification(reservation):
+    return Notification(
+        borrower_id=reservation.borrower_id,
+        kind='reservation_available',
+        # Once per reservation, whether the return announced it or the daily pass caught it
+        dedup_key=dedup_key('reservation_available', reservation.id, reservation.expiration_date.date()),
+        message=f"Good news! The book '{reservation.book.title}' you reserved is now available. Please borrow it before {reservation.expiration_date}."
+    )
+
+
+def due_soon_notification(transaction):
+    return Notification(
+        borrower_id=transaction.borrower_id,
+        kind='due_soon',
+        # One reminder per loan and due date; extending the loan earns a new one
+        dedup_key=dedup_key('due_soon', transaction.id, transaction.due_date.date()),
+        message=f"Reminder: Your borrowed book '{transaction.book.title}' is due on {transaction.due_date}."
+    )
+
+
+def overdue_notification(transaction):
+    return Notification(
+        borrower_id=transaction.borrower_id,
+        kind='overdue',
+        # One notice per loan and due date, however many days the sweep finds it overdue;
+        # a loan extended and overdue again earns a new one
+        dedup_key=dedup_key('overdue', transaction.id, transaction.due_date.date()),
+        message=f"Attention: Your borrowed book '{transaction.book.title}' is overdue, please return it."
+    )
+
+
+def reminder_cutoff(now):
+    return now + timedelta(days=3)  # Notify 3 days before the due date
+
+
+def expired_reservations(now):
+    queryset = (
+        Reservation.objects.filter(expiration_date__lt=now)
+        .select_related('book')
+        .only('id', 'borrower_id', 'expiration_date', 'book__title')
+    )
+    return queryset, expired_reservation_notification
+
+
+def delete_expired_reservations(now, id_range):
+    expired = _in_range(Reservation.objects.filter(expiration_date__lt=now), id_range)
+    with transaction.atomic():
+        book_ids = list(expired.values_list('book_id', flat=True))
+        if not book_ids:
+            return 0
+        # Drop every expired reservation of the range in a single statement
+        deleted, _ = expired.delete()
+        # Free the books they held and hand each to the next patron in its queue
+        freed = list(
+            Book.objects.filter(pk__in=book_ids).exclude(
+                pk__in=Reservation.objects.filter(book_id__in=book_ids).values('book_id')
+            ).values_list('id', flat=True)
+        )
+        Book.objects.filter(pk__in=freed).update(reserved_by=None, updated_at=now)
+        if freed:
+            bump_catalog_version(freed, availability=True)
+        promote(book_ids)
+    return deleted
+
+
+def available_reservations(now):
+    queryset = (
+        Reservation.objects.filter(recently_freed(now), expiration_date__gt=now)
+        .select_related('book')
+        .only('id', 'borrower_id', 'expiration_date', 'book__title')
+    )
+    return queryset, available_reservation_notification
+
+
+def recently_freed(now):
+    return Q(book__available_copies__gt=0, book__updated_at__gte=now - RECONCILE_WINDOW)
+
+
+def loans_due_soon(now):
+    queryset = (
+        BorrowingTransaction.objects.filter(due_date__lte=reminder_cutoff(now), is_returned=False)
+        .select_related('book')
+        .only('id', 'borrower_id', 'due_date', 'book__title')
+    )
+    return queryset, due_soon_notification
+
+
+def overdue_loans(now):
+    queryset = (
+        BorrowingTransaction.objects.filter(due_date__lte=now, is_returned=False)
+        .select_related('book')
+        .only('id', 'borrower_id', 'due_date', 'book__title')
+    )
+    return queryset, overdue_notification
+
+
+def open_loans(now):
+    """Open loans due within the reminder window; the overdue ones are a subset of them."""
+    queryset = (
+        BorrowingTransaction.objects.filter(due_date__lte=reminder_cutoff(now), is_returned=False)
+        .select_related('book')
+        .only('id', 'borrower_id', 'due_date', 'book__title')
+    )
+
+    def build(transaction):
+        notifications = [due_soon_notification(transaction)]
+        if transaction.due_date <= now:
+            notifications.append(overdue_notification(transaction))
+        return notifications
+
+    return queryset, build
+
+
+def live_reservations(now):
+    """Reservations that have expired, or whose book was freed lately and is free to pick up."""
+    queryset = (
+        Reservation.objects.filter(
+            Q(expiration_date__lt=now) | recently_freed(now) & Q(expiration_date__gt=now)
+        )
+        .select_related('book')
+        .only('id', 'borrower_id', 'expiration_date', 'book__title')
+    )
+
+    def build(reservation):
+        if reservation.expiration_date < now:
+            return expired_reservation_notification(reservation)
+        return available_reservation_notification(reservation)
+
+    return queryset, build
+
+
+# Sweep name -> (rows and notification builder as of `now`, optional cleanup of a range after notifying)
+SWEEPS = {
+    'cancel_expired_reservations': (expired_reservations, delete_expired_reservations),
+    'send_reservation_available_notifications': (available_reservations, None),
+    'send_due_date_notifications': (loans_due_soon, None),
+    'send_overdue_notifications': (overdue_loans, None),
+    # The daily pass: every check above, over each table once
+    'circulation_loans': (open_loans, None),
+    'circulation_reservations': (live_reservations, delete_expired_reservations),
+}
+# Sweeps that may scan a replica: they only create deduplicated notices, so a replica a few
+# seconds behind costs at most a late or needless notice. The others delete what they read.
+REPLICA_SWEEPS = frozenset({'send_reservation_available_notifications'})
+
+
+def _select(name, now):
+    queryset, build = SWEEPS[name][0](now)
+    if name in REPLICA_SWEEPS:
+        queryset = queryset.using(read_alias())
+    return queryset, build
+
+
+def _in_range(queryset, id_range):
+    if id_range is None:
+        return queryset
+    id_from, id_to = id_range
+    return queryset.filter(pk__gte=id_from, pk__lt=id_to)
+
+
+def run_sweep(name, now, chunk_size=DEFAULT_CHUNK_SIZE, id_range=None):
+    """
+    Run sweep ``name`` as of ``now`` over the rows whose id is in ``[id_from, id_to)``, or all of them.
+
+    Every shard of a run gets the same ``now``, so they agree on the cutoff and
+    on the date buckets of the notifications' dedup keys.
+    """
+    queryset, build = _select(name, now)
+    cleanup = SWEEPS[name][1]
+    stats = bulk_notify(_in_range(queryset, id_range), build, name, chunk_size)
+    if cleanup is not None:
+        stats['rows_deleted'] = cleanup(now, id_range)
+    return stats
+
+
+def plan_shards(name, now, rows_per_shard=None, max_shards=None):
+    """
+    Split the rows sweep ``name`` would visit into contiguous id ranges ``[id_from, id_to)``.
+
+    The number of shards grows with the number of matching rows, one per
+    ``rows_per_shard`` up to ``max_shards``; a single aggregate query sizes it.
+    """
+    rows_per_shard = rows_per_shard or getattr(settings, 'SWEEP_ROWS_PER_SHARD', 20_000)
+    max_shards = max_shards or getattr(settings, 'SWEEP_MAX_SHARDS', 32)
+    queryset, _ = _select(name, now)
+    bounds = queryset.order_by().aggregate(first=Min('id'), last=Max('id'), rows=Count('id'))
+    if not bounds['rows']:
+        return []
+
+    count = min(max(math.ceil(bounds['rows'] / rows_per_shard), 1), max_shards)
+    span = bounds['last'] + 1 - bounds['first']
+    edges = [bounds['first'] + span * i // count for i in range(count)] + [bounds['last'] + 1]
+    return [[low, high] for low, high in zip(edges, edges[1:]) if high > low]
+
+
+def combine_stats(name, results, previous=None):
+    """Add up the stats of successful shards onto those of previous attempts."""
+    totals = dict(previous or {'task': name, 'shards': 0, **{field: 0 for field in SUMMED_STATS}})
+    for result in results:
+        if 'error' in result:
+            continue
+        totals['shards'] += 1
+        for field in SUMMED_STATS:
+            totals[field] += result.get(field) or 0
+    return totals
@@ -1,75 +1,141 @@
+import logging
 import os
 
-from celery import shared_task
+from celery import chord, shared_task
 from django.conf import settings
 from django.db.models import Count, Q, F
 
-from libraryMS.models import Notification, Book, Report
+from libraryMS.models import Book, Report
 from django.utils import timezone
-from .models import BorrowingTransaction, Reservation
+from django.utils.dateparse import parse_datetime
+from .models import BorrowingTransaction
+from .holds import expire_holds, promote_waiting
+from .notifications import DEFAULT_CHUNK_SIZE, bulk_notify
+from .routers import use_replica
+from .sweeps import SUMMED_STATS, available_reservations, combine_stats, plan_shards, run_sweep
 from .utils import generate_pdf_report
 
+logger = logging.getLogger(__name__)
+
+
+def sweep(name, chunk_size, now=None):
+    """
+    Run sweep ``name`` inline when it fits in one shard, otherwise fan it out.
+
+    Large sweeps are split into id ranges run as a chord of ``sweep_shard``
+    tasks, so every idle worker takes a share; ``finish_sweep`` adds up
+    their stats once all of them are done.
+    """
+    now = now or timezone.now()
+    shards = plan_shards(name, now)
+    if len(shards) <= 1:
+        return run_sweep(name, now, chunk_size)
+    dispatch_shards(name, now.isoformat(), shards, chunk_size)
+    return {'task': name, 'dispatched': True, 'shards': len(shards)}
+
+
+def dispatch_shards(name, now, shards, chunk_size, attempt=1, previous=None):
+    return chord(sweep_shard.s(name, now, shard, chunk_size) for shard in shards)(
+        finish_sweep.s(name, now, chunk_size, attempt, previous)
+    )
+
 
 @shared_task
-def cancel_expired_reservations():
-    """Cancel reservations where the expiration date has passed."""
+def sweep_shard(name, now, id_range, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Run one id range of sweep ``name``."""
+    try:
+        stats = run_sweep(name, parse_datetime(now), chunk_size, id_range)
+    except Exception as exc:
+        # A raising header task would fail the whole chord; report it so only this range is retried
+        logger.exception("%s: shard %s failed", name, id_range)
+        return {'shard': id_range, 'error': f"{type(exc).__name__}: {exc}"}
+    return {**stats, 'shard': id_range}
+
+
+@shared_task
+def finish_sweep(results, name, now, chunk_size=DEFAULT_CHUNK_SIZE, attempt=1, previous=None):
+    """Add up the shards of a sweep and dispatch the failed ones again, up to ``SWEEP_MAX_ATTEMPTS`` times."""
+    totals = combine_stats(name, results, previous)
+    failed = [result['shard'] for result in results if 'error' in result]
+    if failed and attempt < getattr(settings, 'SWEEP_MAX_ATTEMPTS', 3):
+        logger.warning("%s: retrying %d failed shards (attempt %d)", name, len(failed), attempt + 1)
+        dispatch_shards(name, now, failed, chunk_size, attempt + 1, totals)
+        return {**totals, 'retrying': failed}
+
+    # Wall time of the whole sweep, from its planning to its last shard
+    elapsed = (timezone.now() - parse_datetime(now)).total_seconds()
+    totals['failed_shards'] = failed
+    totals['seconds'] = round(elapsed, 3)
+    totals['rows_per_sec'] = round(totals['rows_scanned'] / elapsed, 1) if elapsed > 0 else 0.0
+    if failed:
+        logger.error("%s: gave up on shards %s after %d attempts", name, failed, attempt)
+    return totals
+
+
+@shared_task
+def daily_circulation_sweep(chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Run every daily circulation check in one pass over open loans and one over live reservations.
+
+    Each loan is classified as due soon and possibly overdue, each reservation
+    as expired or available, and the notifications of both passes are written
+    in bulk. The dedup keys are those of the individual tasks, so mixing them
+    on the same day never notifies twice.
+    """
     now = timezone.now()
-    expired_reservations = Reservation.objects.filter(expiration_date__lt=now)
+    parts = [sweep(name, chunk_size, now) for name in ('circulation_loans', 'circulation_reservations')]
+    parts.append(expire_stale_holds())
+    return {
+        'task': 'daily_circulation_sweep',
+        **{field: sum(part.get(field) or 0 for part in parts) for field in SUMMED_STATS},
+        'sweeps': parts,
+    }
+
 
-    for reservation in expired_reservations:
-        Notification.objects.create(
-            user=reservation.borrower,
-            message=f"Attention: Your reservation for {reservation.book.title} has expired."
-        )
-        reservation.delete()
+@shared_task
+def notify_reservation_available(book_ids):
+    """Tell the holders of live reservations on ``book_ids`` that their book has just been returned."""
+    queryset, build = available_reservations(timezone.now())
+    return bulk_notify(queryset.filter(book_id__in=book_ids), build, 'notify_reservation_available')
 
 
 @shared_task
-def send_reservation_available_notifications():
-    """Create in-app notifications for borrowers when a reserved book becomes available."""
-    available_reservations = Reservation.objects.filter(book__borrowed_by=None, expiration_date__gt=timezone.now())
+def expire_stale_holds():
+    """Drop the holds that waited too long, and serve the queues of books left without a reservation."""
+    return {
+        'task': 'expire_stale_holds',
+        'rows_deleted': expire_holds(timezone.now()),
+        'rows_written': len(promote_waiting()),
+    }
+
 
-    for reservation in available_reservations:
-        borrower = reservation.borrower
-        book = reservation.book
-        # Create an in-app notification for the borrower
-        Notification.objects.create(
-            user=borrower,
-            message=f"Good news! The book '{book.title}' you reserved is now available. Please borrow it before {reservation.expiration_date}."
-        )
+@shared_task
+def cancel_expired_reservations(chunk_size=DEFAULT_CHUNK_SIZE):
+    """Cancel reservations where the expiration date has passed."""
+    return sweep('cancel_expired_reservations', chunk_size)
 
 
 @shared_task
-def send_due_date_notifications():
-    """Create in-app notifications for borrowers when the book's due date is approaching."""
-    now = timezone.now()
-    reminder_date = now + timezone.timedelta(days=3)  # Notify 3 days before the due date
-    approaching_due_books = BorrowingTransaction.objects.filter(due_date__lte=reminder_date, is_returned=False)
+def send_reservation_available_notifications(chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Create in-app notifications for borrowers when a reserved book becomes available.
 
-    for transaction in approaching_due_books:
-        borrower = transaction.borrower
-        book = transaction.book
-        # Create an in-app notification for the borrower
-        Notification.objects.create(
-            user=borrower,
-            message=f"Reminder: Your borrowed book '{book.title}' is due on {transaction.due_date}."
-        )
+    Returns already notify the reservers as they commit; this catches the
+    announcements that were lost, among the books freed in the last few days.
+    """
+    return sweep('send_reservation_available_notifications', chunk_size)
 
 
 @shared_task
-def send_overdue_notifications():
-    """Create in-app notifications for borrowers when the book's overdue."""
-    reminder_date = timezone.now()
-    overdue_books = BorrowingTransaction.objects.filter(due_date__lte=reminder_date, is_returned=False)
+def send_due_date_notifications(chunk_size=DEFAULT_CHUNK_SIZE):
+    """Create in-app notifications for borrowers when the book's due date is approaching."""
+    return sweep('send_due_date_notifications', chunk_size)
 
-    for transaction in overdue_books:
-        borrower = transaction.borrower
-        book = transaction.book
-        # Create an in-app notification for the borrower
-        Notification.objects.create(
-            user=borrower,
-            message=f"Attention: Your borrowed book '{book.title}' is overdue, please return it."
-        )
+
+@shared_task
+def send_overdue_notifications(chunk_size=DEFAULT_CHUNK_SIZE):
+    """Create in-app notifications for borrowers when the book's overdue, once per loan and due date."""
+    return sweep('send_overdue_notifications', chunk_size)
 
 
 @shared_task
@@ -81,75 +147,77 @@ def generate_report(report_id):
         # Fetch the data based on report_type
         report_data = []
 
-        if report_type == "most_borrowed_books":
-            # Fetch the top 10 most borrowed books in the last month
-            last_month = timezone.now() - timezone.timedelta(days=30)
-            most_borrowed_books = (
-                Book.objects.filter(borrowingtransaction__borrowed_date__gte=last_month)
-                .annotate(borrow_count=Count('borrowingtransaction'))
-                .order_by('-borrow_count')[:10]
-            )
-            report_data.append("Most Borrowed Books (Last Month):")
-            for book in most_borrowed_books:
-                report_data.append(f"{book.title} - Borrowed {book.borrow_count} times")
-
-        elif report_type == "borrowers_with_overdue_books":
-            # Fetch all borrowers who have overdue books
-            overdue_borrowings = BorrowingTransaction.objects.filter(
-                is_returned=False,
-                due_date__lt=timezone.now()
-            ).select_related('book', 'borrower')
-
-            report_data.append("Borrowers with Overdue Books:")
-            for borrowing in overdue_borrowings:
-                overdue_days = (timezone.now() - borrowing.due_date).days
-                report_data.append(
-                    f"Borrower: {borrowing.borrower.username}, Book: {borrowing.book.title}, Overdue by {overdue_days} days"
+        # The report reads a snapshot; a replica a few seconds behind serves it as well as the primary
+        with use_replica():
+            if report_type == "most_borrowed_books":
+                # Fetch the top 10 most borrowed books in the last month
+                last_month = timezone.now() - timezone.timedelta(days=30)
+                most_borrowed_books = (
+                    Book.objects.filter(borrowingtransaction__borrowed_date__gte=last_month)
+                    .annotate(borrow_count=Count('borrowingtransaction'))
+                    .order_by('-borrow_count')[:10]
                 )
-
-        elif report_type == "books_currently_checked_out":
-            # Fetch all books currently checked out
-            checked_out_books = BorrowingTransaction.objects.filter(
-                is_returned=False
-            ).select_related('book', 'borrower')
-
-            report_data.append("Books Currently Checked Out:")
-            for borrowing in checked_out_books:
-                report_data.append(
-                    f"Book: {borrowing.book.title}, Borrower: {borrowing.borrower.username}, Due Date: {borrowing.due_date}"
+                report_data.append("Most Borrowed Books (Last Month):")
+                for book in most_borrowed_books:
+                    report_data.append(f"{book.title} - Borrowed {book.borrow_count} times")
+
+            elif report_type == "borrowers_with_overdue_books":
+                # Fetch all borrowers who have overdue books
+                overdue_borrowings = BorrowingTransaction.objects.filter(
+                    is_returned=False,
+                    due_date__lt=timezone.now()
+                ).select_related('book', 'borrower')
+
+                report_data.append("Borrowers with Overdue Books:")
+                for borrowing in overdue_borrowings:
+                    overdue_days = (timezone.now() - borrowing.due_date).days
+                    report_data.append(
+                        f"Borrower: {borrowing.borrower.username}, Book: {borrowing.book.title}, Overdue by {overdue_days} days"
+                    )
+
+            elif report_type == "books_currently_checked_out":
+                # Fetch all books currently checked out
+                checked_out_books = BorrowingTransaction.objects.filter(
+                    is_returned=False
+                ).select_related('book', 'borrower')
+
+                report_data.append("Books Currently Checked Out:")
+                for borrowing in checked_out_books:
+                    report_data.append(
+                        f"Book: {borrowing.book.title}, Borrower: {borrowing.borrower.username}, Due Date: {borrowing.due_date}"
+                    )
+
+            elif report_type == "books_in_high_demand":
+                # Fetch books that have been frequently reserved or borrowed immediately after becoming available
+                high_demand_books = (
+                    Book.objects.filter(
+                        Q(borrowingtransaction__is_returned=True) | Q(reservation__isnull=False)
+                    )
+                    .annotate(
+                        reservation_count=Count('reservation'),
+                        borrow_count=Count('borrowingtransaction')
+                    )
+                    .filter(reservation_count__gt=0)  # Filtering to those with at least 1 reservation
+                    .order_by('-reservation_count', '-borrow_count')[:10]
                 )
-
-        elif report_type == "books_in_high_demand":
-            # Fetch books that have been frequently reserved or borrowed immediately after becoming available
-            high_demand_books = (
-                Book.objects.filter(
-                    Q(borrowingtransaction__is_returned=True) | Q(reservation__isnull=False)
+                report_data.append("Books in High Demand:")
+                for book in high_demand_books:
+                    report_data.append(
+                        f"{book.title} - Reserved {book.reservation_count} times, Borrowed {book.borrow_count} times"
+                    )
+
+            elif report_type == "borrowing_trends":
+                # Fetch borrowing trends (books borrowed per month)
+                borrowing_trends = (
+                    BorrowingTransaction.objects
+                    .annotate(month=F('borrowed_date__month'))
+                    .values('month')
+                    .annotate(count=Count('id'))
+                    .order_by('month')
                 )
-                .annotate(
-                    reservation_count=Count('reservation'),
-                    borrow_count=Count('borrowingtransaction')
-                )
-                .filter(reservation_count__gt=0)  # Filtering to those with at least 1 reservation
-                .order_by('-reservation_count', '-borrow_count')[:10]
-            )
-            report_data.append("Books in High Demand:")
-            for book in high_demand_books:
-                report_data.append(
-                    f"{book.title} - Reserved {book.reservation_count} times, Borrowed {book.borrow_count} times"
-                )
-
-        elif report_type == "borrowing_trends":
-            # Fetch borrowing trends (books borrowed per month)
-            borrowing_trends = (
-                BorrowingTransaction.objects
-                .annotate(month=F('borrowed_date__month'))
-                .values('month')
-                .annotate(count=Count('id'))
-                .order_by('month')
-            )
-            report_data.append("Borrowing Trends (Books Borrowed Per Month):")
-            for trend in borrowing_trends:
-                report_data.append(f"Month: {trend['month']} - {trend['count']} books borrowed")
+                report_data.append("Borrowing Trends (Books Borrowed Per Month):")
+                for trend in borrowing_trends:
+                    report_data.append(f"Month: {trend['month']} - {trend['count']} books borrowed")
 
         # Generate the PDF report and save it to the file system
         pdf_file_path = os.path.join(settings.MEDIA_ROOT, f'reports/report_{report_id}.pdf')
@@ -159,6 +227,7 @@ def generate_report(report_id):
         report_instance.file = f'reports/report_{report_id}.pdf'
         report_instance.status = "completed"
         report_instance.save()
+        return {'task': 'generate_report', 'report_type': report_type, 'rows_written': len(report_data)}
 
     except Exception as e:
         report_instance.status = "failed"
@@ -0,0 +1,94 @@
+import logging
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from celery.signals import before_task_publish, task_failure, task_postrun, task_prerun, task_retry
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+from libraryMS.models import TaskRun
+
+logger = logging.getLogger(__name__)
+
+# Message header carrying the publish time, as a Unix timestamp
+ENQUEUED_HEADER = 'enqueued_at'
+# Fields of a task's returned stats dict that are copied onto its TaskRun
+STAT_FIELDS = ('rows_scanned', 'rows_written', 'rows_deleted', 'chunks', 'rows_per_sec')
+STATES = {'SUCCESS': 'succeeded', 'FAILURE': 'failed', 'RETRY': 'retried'}
+
+# task_id -> (TaskRun id, monotonic start) for the tasks running in this worker process
+_running = {}
+
+
+def is_tracked(task_name):
+    prefixes = getattr(settings, 'TASK_TELEMETRY_PREFIXES', ('libraryMS.tasks.',))
+    return bool(task_name) and task_name.startswith(tuple(prefixes))
+
+
+@before_task_publish.connect
+def stamp_enqueue_time(sender=None, headers=None, **kwargs):
+    if headers is not None and is_tracked(sender):
+        headers[ENQUEUED_HEADER] = time.time()
+
+
+@task_prerun.connect
+def record_start(task_id=None, task=None, **kwargs):
+    if not is_tracked(task.name):
+        return
+    now = timezone.now()
+    enqueued = getattr(task.request, ENQUEUED_HEADER, None)
+    enqueued_at = datetime.fromtimestamp(enqueued, tz=dt_timezone.utc) if enqueued else None
+    try:
+        run, _ = TaskRun.objects.update_or_create(task_id=task_id, defaults={
+            'task_name': task.name,
+            'status': 'started',
+            'worker': task.request.hostname or '',
+            'enqueued_at': enqueued_at,
+            'started_at': now,
+            'queue_lag': (now - enqueued_at).total_seconds() if enqueued_at else None,
+        })
+    except DatabaseError:
+        # Telemetry must never stop the task itself
+        logger.exception("Could not record the start of task %s", task_id)
+        return
+    _running[task_id] = (run.pk, time.monotonic())
+
+
+@task_postrun.connect
+def record_finish(task_id=None, task=None, retval=None, state=None, **kwargs):
+    started = _running.pop(task_id, None)
+    if started is None:
+        return
+    run_id, started_monotonic = started
+    updates = {
+        'status': STATES.get(state, 'succeeded' if state is None else state.lower()),
+        'finished_at': timezone.now(),
+        'runtime': time.monotonic() - started_monotonic,
+    }
+    if isinstance(retval, dict):
+        updates.update({field: retval[field] for field in STAT_FIELDS if retval.get(field) is not None})
+    try:
+        TaskRun.objects.filter(pk=run_id).update(**updates)
+    except DatabaseError:
+        logger.exception("Could not record the end of task %s", task_id)
+
+
+@task_failure.connect
+def record_failure(task_id=None, exception=None, **kwargs):
+    if task_id not in _running:
+        return
+    try:
+        TaskRun.objects.filter(task_id=task_id).update(error=f"{type(exception).__name__}: {exception}")
+    except DatabaseError:
+        logger.exception("Could not record the failure of task %s", task_id)
+
+
+@task_retry.connect
+def record_retry(request=None, reason=None, **kwargs):
+    if request is None or request.id not in _running:
+        return
+    try:
+        TaskRun.objects.filter(task_id=request.id).update(error=f"Retrying: {reason}")
+    except DatabaseError:
+        logger.exception("Could not record the retry of task %s", request.id)
@@ -0,0 +1,132 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from libraryMS import cache, circulation
+from libraryMS.async_views import AsyncBookViewSet
+from libraryMS.models import Author, Borrower, Book, Notification, Review
+from libraryMS.serializers import RoleTokenObtainPairSerializer
+
+
+def bearer(account):
+    return {'Authorization': f'Bearer {RoleTokenObtainPairSerializer.get_token(account).access_token}'}
+
+
+@pytest.mark.django_db
+class TestAsyncReads:
+
+    @pytest.fixture(autouse=True)
+    def library(self):
+        self.author = Author.objects.create_user(username="author1", date_of_birth="1990-01-01")
+        self.borrower = Borrower.objects.create_user(username="borrower1")
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}", description="", author=self.author, ISBN=f"{i:013d}",
+                category="fiction", publication_date="2000-01-01"
+            )
+            for i in range(3)
+        ]
+        circulation.borrow(self.books[0].id, self.borrower.id)
+        Review.objects.create(borrower=self.borrower, book=self.books[0], review_message="Great", rating=5)
+        for i in range(3):
+            Notification.objects.create(borrower=self.borrower, message=f"Notice {i}")
+
+    def sync_get(self, account, path, **headers):
+        return APIClient().get(path, headers={**bearer(account), **headers})
+
+    def async_get(self, account, path, **headers):
+        return async_to_sync(AsyncClient().get)(path, headers={**bearer(account), **headers})
+
+    @pytest.mark.parametrize('role, path', [
+        ('author', '/libraryMS/books/?page_size=2'),
+        ('author', '/libraryMS/books/?search=book&available=true'),
+        ('author', '/libraryMS/books/{book}/'),
+        ('author', '/libraryMS/books/{book}/reviews/'),
+        ('borrower', '/libraryMS/borrowings/?filter=current'),
+        # Deferred columns would be loaded on the event loop and fail there
+        ('borrower', '/libraryMS/borrowings/?filter=current&expand=book.author&fields=due_date,book.title,book.author'),
+        ('borrower', '/libraryMS/notifications/?page_size=2'),
+        # Same refusals: books are for authors only, and an unknown book is a 404
+        ('borrower', '/libraryMS/books/'),
+        ('author', '/libraryMS/books/0/'),
+    ])
+    def test_async_views_answer_like_the_sync_ones(self, role, path, settings):
+        account = getattr(self, role)
+        path = path.format(book=self.books[0].id)
+        expected = self.sync_get(account, path)
+
+        settings.ROOT_URLCONF = 'lms.asgi_urls'
+        response = self.async_get(account, path)
+
+        assert response.status_code == expected.status_code
+        assert response.json() == expected.json()
+
+    def test_inboxes_are_the_borrowers_own(self):
+        # Authors and borrowers are numbered separately, so these two share an id
+        assert self.author.id == self.borrower.id
+
+        assert len(self.sync_get(self.borrower, '/libraryMS/notifications/').json()['results']) == 3
+        assert self.sync_get(self.author, '/libraryMS/notifications/').json()['results'] == []
+
+    def test_books_are_served_by_the_async_view(self, settings):
+        settings.ROOT_URLCONF = 'lms.asgi_urls'
+
+        response = self.async_get(self.author, '/libraryMS/books/')
+
+        assert response.resolver_match.func.cls is AsyncBookViewSet
+
+    def test_cursors_page_through_the_same_rows(self, settings):
+        settings.ROOT_URLCONF = 'lms.asgi_urls'
+        titles = []
+        path = '/libraryMS/books/?page_size=1'
+        while path:
+            page = self.async_get(self.author, path).json()
+            titles += [book['title'] for book in page['results']]
+            path = page['next']
+
+        assert titles == ["Book 0", "Book 1", "Book 2"]
+
+    def test_notifications_sent_together_are_paged_once_each(self, settings):
+        Notification.objects.update(created_at=timezone.now())
+        settings.ROOT_URLCONF = 'lms.asgi_urls'
+        messages = []
+        path = '/libraryMS/notifications/?page_size=1'
+        while path:
+            page = self.async_get(self.borrower, path).json()
+            messages += [notification['message'] for notification in page['results']]
+            path = page['next']
+
+        assert messages == ["Notice 2", "Notice 1", "Notice 0"]
+
+    def test_list_is_cached_and_revalidated(self, settings):
+        settings.ROOT_URLCONF = 'lms.asgi_urls'
+
+        first = self.async_get(self.author, '/libraryMS/books/')
+        second = self.async_get(self.author, '/libraryMS/books/')
+        revalidated = self.async_get(self.author, '/libraryMS/books/', **{'If-None-Match': first['ETag']})
+
+        assert (first['X-Cache'], second['X-Cache']) == ('MISS', 'HIT')
+        assert revalidated.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_list_reaches_the_cache_without_blocking(self, settings, monkeypatch):
+        settings.ROOT_URLCONF = 'lms.asgi_urls'
+        for name in ('current_generation', 'store_page', '_count'):
+            monkeypatch.setattr(cache, name, lambda *args: pytest.fail("blocking cache call"))
+
+        first = self.async_get(self.author, '/libraryMS/books/')
+        second = self.async_get(self.author, '/libraryMS/books/')
+
+        assert (first['X-Cache'], second['X-Cache']) == ('MISS', 'HIT')
+        assert second.json() == first.json()
+
+    def test_writes_on_async_routes_use_the_regular_views(self, settings):
+        settings.ROOT_URLCONF = 'lms.asgi_urls'
+
+        response = async_to_sync(AsyncClient().post)(
+            '/libraryMS/notifications/mark_all_as_read/', headers=bearer(self.borrower)
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert not Notification.objects.filter(read=False).exists()
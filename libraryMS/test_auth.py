@@ -2,6 +2,8 @@ import pytest
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+from libraryMS.authentication import CustomModelBackend
 from libraryMS.models import Author, Borrower
 
 
@@ -104,3 +106,55 @@ class TestAuthentication:
         refresh_response = self.client.post(refresh_url, {"refresh": refresh_token})
         assert refresh_response.status_code == status.HTTP_200_OK
         assert 'access' in refresh_response.data
+
+    def test_token_carries_role_claims(self):
+        borrower = Borrower.objects.create_user(
+            username="borrower1", email="borrower1@test.com", password="testpass123"
+        )
+        response = self.client.post(reverse('token_obtain_pair'), {
+            "username": "borrower1",
+            "password": "testpass123"
+        })
+        token = AccessToken(response.data['access'])
+        assert token['role'] == 'borrower'
+        assert token['role_id'] == borrower.id
+
+    def test_login_resolves_role_in_one_query(self, django_assert_num_queries):
+        Borrower.objects.create_user(username="user1", email="borrower1@test.com", password="borrowerpass")
+        Author.objects.create_user(
+            username="user1", email="author1@test.com", password="authorpass", date_of_birth="1990-01-01"
+        )
+        backend = CustomModelBackend()
+
+        with django_assert_num_queries(1):
+            user = backend.authenticate(None, username="user1", password="borrowerpass")
+        assert isinstance(user, Borrower)
+        assert isinstance(backend.authenticate(None, username="user1", password="authorpass"), Author)
+        assert backend.authenticate(None, username="user1", password="wrong") is None
+
+    def test_authenticated_requests_need_no_user_lookup(self, django_assert_num_queries):
+        Borrower.objects.create_user(username="borrower1", email="borrower1@test.com", password="testpass123")
+        login_response = self.client.post(reverse('token_obtain_pair'), {
+            "username": "borrower1",
+            "password": "testpass123"
+        })
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {login_response.data['access']}")
+
+        # The only query is the borrower's loan list itself
+        with django_assert_num_queries(1):
+            response = self.client.get('/libraryMS/borrowings/')
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_token_user_only_has_its_own_role(self):
+        Borrower.objects.create_user(username="borrower1", email="borrower1@test.com", password="testpass123")
+        login_response = self.client.post(reverse('token_obtain_pair'), {
+            "username": "borrower1",
+            "password": "testpass123"
+        })
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {login_response.data['access']}")
+
+        # Borrowers browse the catalog, but managing books is for authors only
+        response = self.client.get('/libraryMS/books/')
+        assert response.status_code == status.HTTP_200_OK
+        response = self.client.post('/libraryMS/books/', {"title": "Dune"})
+        assert response.status_code == status.HTTP_403_FORBIDDEN
@@ -0,0 +1,34 @@
+import copy
+import pytest
+from libraryMS.benchmarks import SCALES, compare, run_suite, seed_library
+from libraryMS.urls import router
+
+
+@pytest.mark.django_db
+class TestBenchmarkSuite:
+
+    def test_suite_covers_every_route_task_and_report(self):
+        seed_library(SCALES['tiny'])
+        results = run_suite(repeat=1)
+        cases = results['cases']
+
+        for prefix, viewset, basename in router.registry:
+            assert any(name.startswith(f'{prefix}-') for name in cases), prefix
+        assert sum(name.startswith('task-') for name in cases) == 5
+        assert sum(name.startswith('report-') for name in cases) == 5
+        assert all(case['status'] != 500 for case in cases.values()), cases
+        assert all(case['status'] == 'completed' for name, case in cases.items() if name.startswith('report-'))
+        assert results['meta']['rows']['books'] == SCALES['tiny']['books']
+
+    def test_compare_flags_extra_queries_and_slower_p95(self):
+        baseline = {'cases': {
+            'books-list-page': {'status': 200, 'queries': 2, 'p95_ms': 10.0},
+            'reviews-list': {'status': 200, 'queries': 1, 'p95_ms': 10.0},
+        }}
+        results = copy.deepcopy(baseline)
+        results['cases']['books-list-page']['queries'] = 3
+        results['cases']['reviews-list']['p95_ms'] = 11.0
+        assert compare(results, baseline) == ["books-list-page: 2 -> 3 queries"]
+
+        results['cases']['reviews-list']['p95_ms'] = 20.0
+        assert compare(results, baseline)[1] == "reviews-list: p95 10.00 -> 20.00 ms"
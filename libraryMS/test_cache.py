@@ -0,0 +1,92 @@
+import pytest
+from rest_framework.test import APIClient
+from rest_framework import status
+from libraryMS import circulation
+from libraryMS.cache import cache_stats
+from libraryMS.models import Author, Borrower, Book
+from libraryMS.serializers import RoleTokenObtainPairSerializer
+
+
+@pytest.mark.django_db
+class TestCatalogPageCache:
+
+    def setup_method(self):
+        self.author = Author.objects.create_user(
+            username="author1", password="testpass123", date_of_birth="1990-01-01"
+        )
+        self.borrower = Borrower.objects.create_user(username="borrower1", password="testpass123")
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}", description="", author=self.author, ISBN=f"{i:013d}",
+                category="fiction", publication_date="2000-01-01"
+            )
+            for i in range(4)
+        ]
+        self.client = APIClient()
+        token = RoleTokenObtainPairSerializer.get_token(self.author).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def get(self, path):
+        response = self.client.get(path)
+        assert response.status_code == status.HTTP_200_OK
+        return response
+
+    def test_repeated_page_is_served_from_cache(self, django_assert_max_num_queries):
+        first = self.get('/libraryMS/books/?page_size=2')
+        assert first['X-Cache'] == 'MISS'
+
+        # Only the catalog version lookup behind the ETag
+        with django_assert_max_num_queries(1):
+            second = self.get('/libraryMS/books/?page_size=2')
+        assert second['X-Cache'] == 'HIT'
+        assert second.data == first.data
+        assert cache_stats()['hits'] == 1
+        assert cache_stats()['misses'] == 1
+
+    def test_borrow_evicts_only_pages_showing_the_book(self, django_capture_on_commit_callbacks):
+        first_page = self.get('/libraryMS/books/?page_size=2')
+        second_page = self.get(first_page.data['next'])
+        available = self.get('/libraryMS/books/?available=true')
+
+        with django_capture_on_commit_callbacks(execute=True):
+            circulation.borrow(self.books[0].id, self.borrower.id)
+
+        refreshed = self.get('/libraryMS/books/?page_size=2')
+        assert refreshed['X-Cache'] == 'MISS'
+        assert refreshed.data['results'][0]['available_copies'] == 0
+        assert self.get(first_page.data['next'])['X-Cache'] == 'HIT'
+        assert second_page.data == self.get(first_page.data['next']).data
+
+        refreshed = self.get('/libraryMS/books/?available=true')
+        assert refreshed['X-Cache'] == 'MISS'
+        assert len(refreshed.data['results']) == len(available.data['results']) - 1
+
+    def test_new_book_evicts_every_page(self, django_capture_on_commit_callbacks):
+        self.get('/libraryMS/books/?category=fiction')
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = self.client.post('/libraryMS/books/', {
+                'title': "New", 'description': "Fresh arrival", 'ISBN': "9999999999999",
+                'category': "fiction", 'publication_date': "2024-01-01"
+            })
+        assert response.status_code == status.HTTP_201_CREATED
+
+        refreshed = self.get('/libraryMS/books/?category=fiction')
+        assert refreshed['X-Cache'] == 'MISS'
+        assert len(refreshed.data['results']) == 5
+
+    def test_borrowers_share_the_catalog_pages(self):
+        readers = []
+        for borrower in (self.borrower, Borrower.objects.create_user(username="borrower2")):
+            client = APIClient()
+            token = RoleTokenObtainPairSerializer.get_token(borrower).access_token
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            readers.append(client)
+
+        first = readers[0].get('/libraryMS/books/')
+        second = readers[1].get('/libraryMS/books/')
+
+        assert (first['X-Cache'], second['X-Cache']) == ('MISS', 'HIT')
+        assert second.data == first.data
+        # The author's own list is a page of its own
+        assert self.get('/libraryMS/books/')['X-Cache'] == 'MISS'
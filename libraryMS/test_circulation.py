@@ -0,0 +1,299 @@
+import pytest
+from datetime import timedelta
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from lms.celery import app as celery_app
+from libraryMS import circulation
+from libraryMS.models import Author, Borrower, Book, BorrowingTransaction, Copy, Notification, Reservation
+from libraryMS.serializers import BookSerializer, RoleTokenObtainPairSerializer
+from libraryMS.tasks import send_reservation_available_notifications
+
+
+@pytest.mark.django_db
+class TestCirculation:
+
+    def setup_method(self):
+        self.author = Author.objects.create_user(
+            username="author1", password="testpass123", date_of_birth="1990-01-01"
+        )
+        self.borrower = Borrower.objects.create_user(username="borrower1", password="testpass123")
+        self.other = Borrower.objects.create_user(username="borrower2", password="testpass123")
+        self.book = Book.objects.create(
+            title="Dune", description="", author=self.author, ISBN="0000000000001",
+            category="fiction", publication_date="1965-08-01"
+        )
+
+    def client_for(self, account):
+        client = APIClient()
+        token = RoleTokenObtainPairSerializer.get_token(account).access_token
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client
+
+    def test_borrowers_browse_the_catalog_that_authors_manage(self):
+        other_author = Author.objects.create_user(username="author2", date_of_birth="1990-01-01")
+        other_book = Book.objects.create(
+            title="Emma", description="", author=other_author, ISBN="0000000000002",
+            category="fiction", publication_date="1815-12-23"
+        )
+        borrower, author = self.client_for(self.borrower), self.client_for(self.author)
+
+        titles = [book['title'] for book in borrower.get('/libraryMS/books/').data['results']]
+        assert titles == ["Dune", "Emma"]
+        assert borrower.get(f'/libraryMS/books/{other_book.id}/').status_code == status.HTTP_200_OK
+        assert borrower.post(f'/libraryMS/books/{other_book.id}/borrow/').status_code == status.HTTP_200_OK
+        response = borrower.patch(f'/libraryMS/books/{self.book.id}/', {"title": "Dune Messiah"})
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+        # Authors only see, and edit, their own books
+        assert [book['title'] for book in author.get('/libraryMS/books/').data['results']] == ["Dune"]
+        response = author.patch(f'/libraryMS/books/{self.book.id}/', {"title": "Dune Messiah"})
+        assert response.status_code == status.HTTP_200_OK
+        assert author.post(f'/libraryMS/books/{self.book.id}/borrow/').status_code == status.HTTP_403_FORBIDDEN
+
+    def test_borrow_and_return_through_the_api(self, django_assert_max_num_queries):
+        client = self.client_for(self.borrower)
+
+        # Claim a copy off the counter, claim loan slot, pick and lend the copy, clear reservation,
+        # insert loan, plus the savepoint pair
+        with django_assert_max_num_queries(8):
+            response = client.post(f'/libraryMS/books/{self.book.id}/borrow/')
+        assert response.status_code == status.HTTP_200_OK
+        self.book.refresh_from_db()
+        self.borrower.refresh_from_db()
+        assert self.book.available_copies == 0
+        assert self.book.copies.get().borrower == self.borrower
+        assert self.borrower.active_loans == 1
+
+        loan = BorrowingTransaction.objects.get()
+        response = client.post(f'/libraryMS/borrowings/{loan.id}/return_book/')
+        assert response.status_code == status.HTTP_200_OK
+        self.book.refresh_from_db()
+        self.borrower.refresh_from_db()
+        assert self.book.available_copies == 1
+        assert self.borrower.active_loans == 0
+
+        response = client.post(f'/libraryMS/borrowings/{loan.id}/return_book/')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_only_one_borrower_wins_a_copy(self):
+        circulation.borrow(self.book.id, self.borrower.id)
+
+        with pytest.raises(circulation.CirculationError, match="borrowed by someone else"):
+            circulation.borrow(self.book.id, self.other.id)
+        assert BorrowingTransaction.objects.count() == 1
+        self.other.refresh_from_db()
+        assert self.other.active_loans == 0
+
+    def test_loans_are_only_written_through_circulation(self):
+        client = self.client_for(self.borrower)
+        loan = circulation.borrow(self.book.id, self.borrower.id)
+
+        response = client.patch(f'/libraryMS/borrowings/{loan.id}/', {'is_returned': True}, format='json')
+        assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+        assert client.delete(f'/libraryMS/borrowings/{loan.id}/').status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+
+        loan.refresh_from_db()
+        self.book.refresh_from_db()
+        assert not loan.is_returned
+        assert self.book.available_copies == 0
+        assert self.book.copies.get().status == Copy.ON_LOAN
+
+    def test_loans_cannot_be_posted_without_a_copy(self):
+        response = self.client_for(self.borrower).post('/libraryMS/borrowings/', {
+            'book': self.book.id, 'borrower': self.borrower.id, 'due_date': timezone.now().isoformat(),
+        }, format='json')
+
+        assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+        assert not BorrowingTransaction.objects.exists()
+        self.book.refresh_from_db()
+        assert self.book.available_copies == self.book.copies.filter(status=Copy.AVAILABLE).count() == 1
+
+    def test_each_copy_goes_to_one_borrower(self):
+        response = self.client_for(self.author).post(f'/libraryMS/books/{self.book.id}/copies/', {'count': 2})
+        assert response.data == {'total_copies': 3, 'available_copies': 3}
+
+        loans = [circulation.borrow(self.book.id, borrower.id) for borrower in (self.borrower, self.other)]
+        # A borrower is no longer limited to one book by the book row
+        other_book = Book.objects.create(
+            title="Emma", description="", author=self.author, ISBN="0000000000002",
+            category="fiction", publication_date="1815-12-23"
+        )
+        circulation.borrow(other_book.id, self.borrower.id)
+
+        assert len({loan.copy_id for loan in loans}) == 2
+        self.book.refresh_from_db()
+        assert self.book.available_copies == 1
+        circulation.return_book(loans[0])
+        self.book.refresh_from_db()
+        assert self.book.available_copies == 2
+        assert self.book.copies.filter(status=Copy.ON_LOAN).get().borrower == self.other
+
+    def test_rebuild_command_recomputes_copy_counters(self):
+        circulation.add_copies(self.book.id, 2)
+        circulation.borrow(self.book.id, self.borrower.id)
+        Book.objects.update(total_copies=0, available_copies=7)
+
+        call_command('rebuild_copy_counters', stdout=None)
+
+        self.book.refresh_from_db()
+        assert (self.book.total_copies, self.book.available_copies) == (3, 2)
+
+    def test_writes_through_a_stale_book_keep_its_counters(self):
+        stale = Book.objects.get(pk=self.book.pk)
+        circulation.borrow(self.book.id, self.borrower.id)
+
+        serializer = BookSerializer(stale, data={'title': "Dune Messiah"}, partial=True)
+        assert serializer.is_valid(), serializer.errors
+        serializer.save()
+        response = self.client_for(self.other).post(f'/libraryMS/reservations/{self.book.id}/reserve_book/')
+        assert response.status_code == status.HTTP_201_CREATED
+
+        self.book.refresh_from_db()
+        assert (self.book.title, self.book.available_copies) == ("Dune Messiah", 0)
+        assert self.book.reserved_by == self.other
+
+    def test_reservation_keeps_only_the_last_copy(self):
+        circulation.add_copies(self.book.id, 1)
+        Book.objects.filter(pk=self.book.pk).update(reserved_by=self.borrower)
+
+        circulation.borrow(self.book.id, self.other.id)
+
+        with pytest.raises(circulation.CirculationError, match="reserved by someone else"):
+            circulation.borrow(self.book.id, Borrower.objects.create_user(username="borrower3").id)
+        circulation.borrow(self.book.id, self.borrower.id)
+
+    def test_reservation_holder_may_borrow_and_fulfils_reservation(self):
+        self.book.reserved_by = self.borrower
+        self.book.save()
+        Reservation.objects.create(
+            borrower=self.borrower, book=self.book, expiration_date=timezone.now() + timedelta(days=1)
+        )
+
+        with pytest.raises(circulation.CirculationError, match="reserved by someone else"):
+            circulation.borrow(self.book.id, self.other.id)
+        circulation.borrow(self.book.id, self.borrower.id)
+
+        self.book.refresh_from_db()
+        assert self.book.reserved_by is None
+        assert not Reservation.objects.exists()
+
+    def test_loan_limit_is_enforced_from_the_counter(self):
+        Borrower.objects.filter(pk=self.borrower.pk).update(active_loans=circulation.MAX_ACTIVE_LOANS)
+
+        with pytest.raises(circulation.CirculationError, match="more than 5 books"):
+            circulation.borrow(self.book.id, self.borrower.id)
+
+        # The refused loan rolled back the claim on the book
+        self.book.refresh_from_db()
+        assert self.book.available_copies == 1
+
+    def test_unknown_book(self):
+        with pytest.raises(Book.DoesNotExist):
+            circulation.borrow(self.book.id + 1, self.borrower.id)
+
+    def test_batch_applies_returns_before_borrows(self, django_assert_max_num_queries):
+        client = self.client_for(self.borrower)
+        shelf = Book.objects.create(
+            title="Emma", description="", author=self.author, ISBN="0000000000002",
+            category="fiction", publication_date="1815-12-23"
+        )
+        loan = circulation.borrow(shelf.id, self.borrower.id)
+        Borrower.objects.filter(pk=self.borrower.pk).update(active_loans=circulation.MAX_ACTIVE_LOANS)
+
+        with django_assert_max_num_queries(15):
+            response = client.post('/libraryMS/borrowings/batch/', {"operations": [
+                {"op": "borrow", "book": self.book.id},
+                {"op": "extend", "loan": loan.id},
+                {"op": "return", "loan": loan.id},
+                {"op": "borrow", "book": self.book.id + 100},
+            ]}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        results = response.data['results']
+        assert [result['status'] for result in results] == ['ok', 'error', 'ok', 'error']
+        assert results[3]['detail'] == "Book not found."
+        new_loan = BorrowingTransaction.objects.get(pk=results[0]['loan'])
+        assert new_loan.book == self.book and not new_loan.is_returned
+        loan.refresh_from_db()
+        assert loan.is_returned
+        self.borrower.refresh_from_db()
+        assert self.borrower.active_loans == circulation.MAX_ACTIVE_LOANS
+
+    def test_batch_enforces_the_loan_limit_and_ownership(self):
+        client = self.client_for(self.borrower)
+        others_loan = circulation.borrow(self.book.id, self.other.id)
+        Borrower.objects.filter(pk=self.borrower.pk).update(active_loans=circulation.MAX_ACTIVE_LOANS)
+        shelf = Book.objects.create(
+            title="Emma", description="", author=self.author, ISBN="0000000000002",
+            category="fiction", publication_date="1815-12-23"
+        )
+
+        response = client.post('/libraryMS/borrowings/batch/', {"operations": [
+            {"op": "return", "loan": others_loan.id},
+            {"op": "borrow", "book": shelf.id},
+        ]}, format='json')
+
+        results = response.data['results']
+        assert results[0]['detail'] == "You can only return books you have borrowed."
+        assert results[1]['detail'] == "You cannot borrow more than 5 books at a time."
+        others_loan.refresh_from_db()
+        assert not others_loan.is_returned
+
+    def test_batch_only_lends_copies_on_the_shelf(self):
+        # The counter still offers the only copy, which is already out
+        Copy.objects.filter(book=self.book).update(status=Copy.ON_LOAN, borrower=self.other)
+        shelf = Book.objects.create(
+            title="Emma", description="", author=self.author, ISBN="0000000000002",
+            category="fiction", publication_date="1815-12-23"
+        )
+
+        response = self.client_for(self.borrower).post('/libraryMS/borrowings/batch/', {"operations": [
+            {"op": "borrow", "book": self.book.id},
+            {"op": "borrow", "book": shelf.id},
+        ]}, format='json')
+
+        results = response.data['results']
+        assert results[0] == {"op": "borrow", "book": self.book.id, "status": "error",
+                              "detail": "No copy of this book is on the shelf."}
+        assert results[1]['status'] == 'ok'
+        assert list(BorrowingTransaction.objects.values_list('book', 'copy__book')) == [(shelf.id, shelf.id)]
+        self.book.refresh_from_db()
+        self.borrower.refresh_from_db()
+        assert self.book.available_copies == 1
+        assert self.borrower.active_loans == 1
+
+    def test_batch_rejects_malformed_operations(self):
+        response = self.client_for(self.borrower).post(
+            '/libraryMS/borrowings/batch/', {"operations": [{"op": "return"}]}, format='json'
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_return_notifies_the_reserver_once_committed(self, monkeypatch, django_capture_on_commit_callbacks):
+        monkeypatch.setattr(celery_app.conf, 'task_always_eager', True)
+        loan = circulation.borrow(self.book.id, self.borrower.id)
+        Reservation.objects.create(
+            borrower=self.other, book=self.book, expiration_date=timezone.now() + timedelta(days=10)
+        )
+
+        with django_capture_on_commit_callbacks() as callbacks:
+            circulation.return_book(loan)
+            assert not Notification.objects.exists()
+        for callback in callbacks:
+            callback()
+
+        notification = Notification.objects.get()
+        assert notification.borrower_id == self.other.id
+        assert notification.kind == 'reservation_available'
+        # The daily reconciliation sees the book too, but its dedup key matches the announcement's
+        send_reservation_available_notifications()
+        assert Notification.objects.count() == 1
+
+    def test_reconciliation_skips_books_freed_long_ago(self):
+        Reservation.objects.create(
+            borrower=self.other, book=self.book, expiration_date=timezone.now() + timedelta(days=10)
+        )
+        Book.objects.filter(pk=self.book.pk).update(updated_at=timezone.now() - timedelta(days=5))
+
+        assert send_reservation_available_notifications()['rows_scanned'] == 0
@@ -0,0 +1,56 @@
+import pytest
+from rest_framework.test import APIClient
+from rest_framework import status
+from libraryMS import circulation
+from libraryMS.models import Author, Borrower, Book
+from libraryMS.serializers import RoleTokenObtainPairSerializer
+
+
+@pytest.mark.django_db
+class TestConditionalGet:
+
+    def setup_method(self):
+        self.author = Author.objects.create_user(
+            username="author1", password="testpass123", date_of_birth="1990-01-01"
+        )
+        self.borrower = Borrower.objects.create_user(username="borrower1", password="testpass123")
+        self.book = Book.objects.create(
+            title="Dune", description="", author=self.author, ISBN="0000000000001",
+            category="fiction", publication_date="1965-08-01"
+        )
+        self.client = APIClient()
+        token = RoleTokenObtainPairSerializer.get_token(self.borrower).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_unchanged_list_is_answered_with_304(self, django_assert_max_num_queries):
+        response = self.client.get('/libraryMS/books/')
+        assert response.status_code == status.HTTP_200_OK
+        etag = response['ETag']
+
+        with django_assert_max_num_queries(1):
+            response = self.client.get('/libraryMS/books/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response['ETag'] == etag
+
+        # Another query string is another representation
+        response = self.client.get('/libraryMS/books/?category=fiction', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_borrowing_changes_list_and_detail_etags(self, django_capture_on_commit_callbacks):
+        list_etag = self.client.get('/libraryMS/books/')['ETag']
+        detail = self.client.get(f'/libraryMS/books/{self.book.id}/')
+        assert 'Last-Modified' in detail
+
+        with django_capture_on_commit_callbacks(execute=True):
+            circulation.borrow(self.book.id, self.borrower.id)
+
+        response = self.client.get('/libraryMS/books/', HTTP_IF_NONE_MATCH=list_etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != list_etag
+        response = self.client.get(f'/libraryMS/books/{self.book.id}/', HTTP_IF_NONE_MATCH=detail['ETag'])
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['available_copies'] == 0
+
+    def test_missing_book_still_404s(self):
+        response = self.client.get('/libraryMS/books/999/')
+        assert response.status_code == status.HTTP_404_NOT_FOUND
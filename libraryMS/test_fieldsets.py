@@ -0,0 +1,97 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+from libraryMS import circulation
+from libraryMS.models import Author, Borrower, Book, Notification
+from libraryMS.serializers import RoleTokenObtainPairSerializer
+
+
+@pytest.mark.django_db
+class TestSparseFieldsets:
+
+    def setup_method(self):
+        self.author = Author.objects.create_user(
+            username="author1", date_of_birth="1990-01-01", biography="A long life story"
+        )
+        self.borrower = Borrower.objects.create_user(username="borrower1")
+        self.book = Book.objects.create(
+            title="Dune", description="Spice", author=self.author, ISBN="0000000000001",
+            category="fiction", publication_date="1965-08-01"
+        )
+        circulation.borrow(self.book.id, self.borrower.id)
+        self.client = APIClient()
+        token = RoleTokenObtainPairSerializer.get_token(self.borrower).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def get(self, path):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(path)
+        assert response.status_code == status.HTTP_200_OK
+        return response.data, [query['sql'] for query in captured]
+
+    def test_relations_are_ids_unless_expanded(self):
+        data, queries = self.get('/libraryMS/borrowings/')
+        loan = data['results'][0]
+        assert (loan['book'], loan['borrower']) == (self.book.id, self.borrower.id)
+        assert len(queries) == 1 and 'libraryMS_book' not in queries[0]
+
+        data, queries = self.get('/libraryMS/borrowings/?expand=book.author')
+        book = data['results'][0]['book']
+        assert book['title'] == "Dune"
+        assert book['author']['biography'] == "A long life story"
+        assert book['reserved_by'] is None
+        assert data['results'][0]['borrower'] == self.borrower.id
+        assert len(queries) == 1
+
+    def test_only_the_requested_fields_are_rendered_and_loaded(self):
+        data, queries = self.get(
+            '/libraryMS/borrowings/?fields=due_date,book.title,book.author.name&expand=book.author'
+        )
+
+        # The primary key always comes along
+        assert data['results'][0] == {
+            'id': data['results'][0]['id'],
+            'due_date': data['results'][0]['due_date'],
+            'book': {'id': self.book.id, 'title': "Dune", 'author': {'id': self.author.id, 'name': ""}},
+        }
+        assert len(queries) == 1
+        for column in ('is_returned', 'description', 'biography'):
+            assert f'"{column}"' not in queries[0]
+
+    def test_ordering_columns_are_loaded_for_the_cursor(self):
+        Notification.objects.bulk_create(Notification(borrower=self.borrower, message=f"Notice {i}") for i in range(3))
+
+        data, queries = self.get('/libraryMS/notifications/?fields=message&page_size=2')
+
+        assert [set(row) for row in data['results']] == [{'id', 'message'}] * 2
+        assert data['next'] is not None
+        assert len(queries) == 1
+
+    def test_book_actions_take_the_same_parameters(self):
+        self.client.post('/libraryMS/reviews/', {
+            'book_id': self.book.id, 'review_message': "Great", 'rating': 5,
+        }, format='json')
+
+        detail, queries = self.get(f'/libraryMS/books/{self.book.id}/?fields=title,author&expand=author')
+        assert set(detail) == {'id', 'title', 'author'}
+        assert len(queries) == 2
+        reviews, _ = self.get(f'/libraryMS/books/{self.book.id}/reviews/?fields=rating,book')
+        assert reviews['results'] == [{'id': reviews['results'][0]['id'], 'rating': 5, 'book': self.book.id}]
+
+    def test_each_fieldset_has_its_own_etag(self):
+        full = self.client.get(f'/libraryMS/books/{self.book.id}/')
+        sparse = self.client.get(f'/libraryMS/books/{self.book.id}/?fields=title', HTTP_IF_NONE_MATCH=full['ETag'])
+
+        assert sparse.status_code == status.HTTP_200_OK
+        assert sparse.data == {'id': self.book.id, 'title': "Dune"}
+
+    def test_writes_accept_and_return_every_field(self):
+        response = self.client.post('/libraryMS/reviews/?fields=rating', {
+            'book_id': self.book.id, 'review_message': "Great", 'rating': 5,
+        }, format='json')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['review_message'] == "Great"
+        assert response.data['book'] == self.book.id
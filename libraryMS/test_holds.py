@@ -0,0 +1,165 @@
+import pytest
+from datetime import timedelta
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from libraryMS import circulation, holds
+from libraryMS.models import Author, Borrower, Book, Hold, Reservation
+from libraryMS.tasks import cancel_expired_reservations, expire_stale_holds
+from libraryMS.serializers import RoleTokenObtainPairSerializer
+
+
+@pytest.mark.django_db
+class TestHoldQueue:
+
+    def setup_method(self):
+        self.author = Author.objects.create_user(
+            username="author1", password="testpass123", date_of_birth="1990-01-01"
+        )
+        self.reader = Borrower.objects.create_user(username="reader", password="testpass123")
+        self.patrons = [Borrower.objects.create_user(username=f"patron{i}", password="testpass123") for i in range(3)]
+        self.book = Book.objects.create(
+            title="Dune", description="", author=self.author, ISBN="0000000000001",
+            category="fiction", publication_date="1965-08-01"
+        )
+        self.loan = circulation.borrow(self.book.id, self.reader.id)
+        self.clients = {}
+
+    def client_for(self, borrower):
+        if borrower.pk not in self.clients:
+            client = APIClient()
+            token = RoleTokenObtainPairSerializer.get_token(borrower).access_token
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            self.clients[borrower.pk] = client
+        return self.clients[borrower.pk]
+
+    def reserve(self, borrower):
+        return self.client_for(borrower).post(f'/libraryMS/reservations/{self.book.id}/reserve_book/')
+
+    def test_later_patrons_join_the_queue_in_order(self):
+        assert self.reserve(self.patrons[0]).status_code == status.HTTP_201_CREATED
+
+        first = self.reserve(self.patrons[1])
+        second = self.reserve(self.patrons[2])
+
+        assert first.status_code == second.status_code == status.HTTP_201_CREATED
+        assert (first.data['position'], second.data['position']) == (1, 2)
+        self.book.refresh_from_db()
+        assert self.book.reserved_by == self.patrons[0]
+
+    def test_retrying_keeps_the_original_place(self):
+        self.reserve(self.patrons[0])
+        self.reserve(self.patrons[1])
+
+        retry = self.reserve(self.patrons[1])
+
+        assert retry.status_code == status.HTTP_200_OK
+        assert retry.data['position'] == 1
+        assert Hold.objects.count() == 1
+
+    def test_reserver_and_borrower_cannot_queue_for_their_own_book(self):
+        self.reserve(self.patrons[0])
+
+        assert self.reserve(self.patrons[0]).status_code == status.HTTP_400_BAD_REQUEST
+        assert self.reserve(self.reader).status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_listing_and_leaving_holds(self):
+        for patron in self.patrons:
+            self.reserve(patron)
+        client = self.client_for(self.patrons[2])
+
+        response = client.get('/libraryMS/reservations/holds/')
+        assert [hold['queue_position'] for hold in response.data['results']] == [2]
+
+        left = Hold.objects.get(borrower=self.patrons[1])
+        self.client_for(self.patrons[1]).delete(f'/libraryMS/reservations/holds/{left.pk}/')
+        response = client.get('/libraryMS/reservations/holds/')
+        assert [hold['queue_position'] for hold in response.data['results']] == [1]
+
+        hold_id = response.data['results'][0]['id']
+        assert self.client_for(self.patrons[0]).delete(f'/libraryMS/reservations/holds/{hold_id}/').status_code == 404
+
+    def test_cancelling_promotes_the_head_of_the_queue(self):
+        for patron in self.patrons:
+            self.reserve(patron)
+        reservation = Reservation.objects.get(borrower=self.patrons[0])
+
+        response = self.client_for(self.patrons[0]).post(f'/libraryMS/reservations/{reservation.pk}/cancel/')
+
+        assert response.status_code == status.HTTP_200_OK
+        self.book.refresh_from_db()
+        assert self.book.reserved_by == self.patrons[1]
+        promoted = Reservation.objects.get()
+        assert promoted.borrower == self.patrons[1]
+        assert promoted.expiration_date == self.loan.due_date + holds.RESERVATION_GRACE
+        assert list(Hold.objects.values_list('borrower', flat=True)) == [self.patrons[2].pk]
+        assert Hold.objects.get().position == 1
+
+    def test_fulfilling_a_reservation_promotes_the_next_patron(self):
+        self.reserve(self.patrons[0])
+        self.reserve(self.patrons[1])
+        circulation.return_book(self.loan)
+
+        loan = circulation.borrow(self.book.id, self.patrons[0].id)
+
+        self.book.refresh_from_db()
+        assert self.book.copies.get().borrower == self.patrons[0]
+        assert self.book.reserved_by == self.patrons[1]
+        assert Reservation.objects.get().expiration_date == loan.due_date + holds.RESERVATION_GRACE
+        assert not Hold.objects.exists()
+
+    def test_patron_holding_another_reservation_keeps_their_place(self):
+        other_book = Book.objects.create(
+            title="Emma", description="", author=self.author, ISBN="0000000000002",
+            category="fiction", publication_date="1815-12-23"
+        )
+        circulation.borrow(other_book.id, self.patrons[2].id)
+        self.client_for(self.patrons[1]).post(f'/libraryMS/reservations/{other_book.id}/reserve_book/')
+        for patron in self.patrons:
+            self.reserve(patron)
+        reservation = Reservation.objects.get(borrower=self.patrons[0])
+
+        self.client_for(self.patrons[0]).post(f'/libraryMS/reservations/{reservation.pk}/cancel/')
+
+        self.book.refresh_from_db()
+        assert self.book.reserved_by == self.patrons[2]
+        assert Hold.objects.get().borrower == self.patrons[1]
+
+    def test_expired_reservation_frees_the_book_for_the_queue(self):
+        self.reserve(self.patrons[0])
+        self.reserve(self.patrons[1])
+        Reservation.objects.update(expiration_date=timezone.now() - timedelta(days=1))
+
+        stats = cancel_expired_reservations()
+
+        assert stats['rows_deleted'] == 1
+        self.book.refresh_from_db()
+        assert self.book.reserved_by == self.patrons[1]
+        assert Reservation.objects.get().borrower == self.patrons[1]
+
+    def test_positions_stay_dense_as_holds_leave(self):
+        patrons = self.patrons + [Borrower.objects.create_user(username=f"patron{i}") for i in range(3, 8)]
+        for patron in patrons:
+            self.reserve(patron)
+        Hold.objects.filter(borrower__in=[patrons[2], patrons[4]]).update(expires_at=timezone.now() - timedelta(days=1))
+
+        holds.leave_queue(Hold.objects.get(borrower=patrons[6]).pk, patrons[6].pk)
+        expire_stale_holds()
+        Reservation.objects.get(borrower=patrons[0]).delete()
+        Book.objects.filter(pk=self.book.pk).update(reserved_by=None)
+        holds.promote([self.book.pk])
+
+        queue = Hold.objects.order_by('position').values_list('borrower', 'position')
+        assert list(queue) == [(patrons[3].pk, 1), (patrons[5].pk, 2), (patrons[7].pk, 3)]
+        assert self.reserve(patrons[0]).data['position'] == 4
+
+    def test_stale_holds_are_dropped_in_bulk(self):
+        self.reserve(self.patrons[0])
+        self.reserve(self.patrons[1])
+        self.reserve(self.patrons[2])
+        Hold.objects.filter(borrower=self.patrons[1]).update(expires_at=timezone.now() - timedelta(days=1))
+
+        stats = expire_stale_holds()
+
+        assert stats['rows_deleted'] == 1
+        assert list(Hold.objects.values_list('borrower', flat=True)) == [self.patrons[2].pk]
@@ -0,0 +1,115 @@
+import re
+import pytest
+from datetime import timedelta
+from django.db import connection
+from django.utils import timezone
+from libraryMS.models import Author, Borrower, Book, BorrowingTransaction, Notification, Reservation
+from libraryMS.search import BookFilter
+
+# Rows per table: enough that the planner prices a full scan above an index lookup
+SCALE = 3000
+BORROWERS = 30
+
+
+def query_plan(queryset):
+    return queryset.explain()
+
+
+def sequential_scans(plan):
+    """Return the tables a plan reads in full, on SQLite or Postgres."""
+    if connection.vendor == 'postgresql':
+        return re.findall(r'Seq Scan on "?(\w+)"?', plan)
+    # SQLite says "SCAN table" for a full scan and "SCAN table USING INDEX" to walk an index in order
+    return [
+        match.group(1) for match in re.finditer(r'\bSCAN (\w+)( USING (COVERING )?INDEX)?', plan)
+        if not match.group(2)
+    ]
+
+
+@pytest.mark.django_db
+class TestQueryPlans:
+
+    @pytest.fixture(autouse=True)
+    def seed(self):
+        now = timezone.now()
+        author = Author.objects.create_user(username="author1", date_of_birth="1990-01-01")
+        self.borrowers = [Borrower.objects.create_user(username=f"borrower{i}") for i in range(BORROWERS)]
+        # Returned loans and read notifications dominate their tables, and most titles are out
+        self.books = Book.objects.bulk_create(
+            Book(
+                title=f"Book {i}", description="", author=author, ISBN=f"{i:013d}", category="fiction",
+                publication_date="2000-01-01", available_copies=int(i % 10 == 0)
+            )
+            for i in range(SCALE)
+        )
+        BorrowingTransaction.objects.bulk_create(
+            BorrowingTransaction(
+                borrower=self.borrowers[i % BORROWERS], book=self.books[i],
+                due_date=now + timedelta(days=i % 60 - 30), is_returned=bool(i % 20)
+            )
+            for i in range(SCALE)
+        )
+        Reservation.objects.bulk_create(
+            Reservation(
+                borrower=self.borrowers[i % BORROWERS], book=self.books[i],
+                expiration_date=now + timedelta(days=i % 365 + 1)
+            )
+            for i in range(SCALE)
+        )
+        Notification.objects.bulk_create(
+            Notification(borrower=borrower, message="", read=i % 10 != 0)
+            for borrower in self.borrowers for i in range(SCALE // BORROWERS)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.now = now
+
+    def assert_indexed(self, queryset, index_name):
+        plan = query_plan(queryset)
+        assert not sequential_scans(plan), plan
+        assert index_name in plan, plan
+
+    def test_borrower_loans(self):
+        self.assert_indexed(
+            BorrowingTransaction.objects.filter(borrower=self.borrowers[0], is_returned=False),
+            'loan_borrower_returned_idx',
+        )
+
+    def test_open_loans_due_by(self):
+        self.assert_indexed(
+            BorrowingTransaction.objects.filter(due_date__lte=self.now + timedelta(days=3), is_returned=False),
+            'loan_open_due_idx',
+        )
+
+    def test_expired_reservations(self):
+        self.assert_indexed(
+            Reservation.objects.filter(expiration_date__lt=self.now), 'reservation_expiration_idx'
+        )
+
+    def test_active_reservation_for_book(self):
+        self.assert_indexed(
+            Reservation.objects.filter(book=self.books[0], expiration_date__gt=self.now),
+            'reservation_book_expiry_idx',
+        )
+
+    def test_unread_notifications(self):
+        # A plan over an empty table proves nothing
+        assert Notification.objects.count() == SCALE
+        self.assert_indexed(
+            Notification.objects.filter(borrower=self.borrowers[0], read=False),
+            'notification_unread_idx',
+        )
+        # Newest first, read off the index in order
+        self.assert_indexed(
+            Notification.objects.filter(borrower=self.borrowers[0], read=False).order_by('-created_at')[:10],
+            'notification_unread_idx',
+        )
+
+    def test_available_books_page(self):
+        queryset = BookFilter({'available': 'true'}, queryset=Book.objects.all()).qs.order_by('id')[:10]
+        plan = query_plan(queryset)
+        # SQLite prices `reserved_by IS NULL` on the one-to-one's unique index as a single row and
+        # searches that instead of book_available_idx; either way the table is never read in full
+        assert not sequential_scans(plan), plan
+        if connection.vendor == 'postgresql':
+            assert 'book_available_idx' in plan, plan
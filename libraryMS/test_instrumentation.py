@@ -0,0 +1,90 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient, override_settings
+from rest_framework.test import APIClient
+from rest_framework import status
+from libraryMS.async_views import AsyncBookViewSet
+from libraryMS.instrumentation import HISTOGRAMS
+from libraryMS.models import Author, Borrower, Book
+from libraryMS.serializers import RoleTokenObtainPairSerializer
+
+
+@pytest.mark.django_db
+class TestInstrumentation:
+
+    def setup_method(self):
+        for histogram in HISTOGRAMS.values():
+            histogram.clear()
+        self.author = Author.objects.create_user(
+            username="author1", password="testpass123", date_of_birth="1990-01-01"
+        )
+        self.borrower = Borrower.objects.create_user(username="borrower1", password="testpass123")
+        self.book = Book.objects.create(
+            title="Dune", description="", author=self.author, ISBN="0000000000001",
+            category="fiction", publication_date="1965-08-01"
+        )
+
+    def client(self):
+        client = APIClient()
+        token = RoleTokenObtainPairSerializer.get_token(self.borrower).access_token
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client
+
+    def metrics(self):
+        with override_settings(METRICS_TOKEN='secret'):
+            return APIClient().get('/metrics', HTTP_AUTHORIZATION='Bearer secret').content.decode()
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1.0)
+    def test_sampled_requests_carry_server_timing_and_feed_histograms(self):
+        client = self.client()
+        response = client.get('/libraryMS/books/')
+        assert response.status_code == status.HTTP_200_OK
+        timing = response['Server-Timing']
+        assert 'db;dur=' in timing and '2 queries' in timing
+        for metric in ('serialize;dur=', 'render;dur=', 'total;dur='):
+            assert metric in timing
+
+        response = client.post(f'/libraryMS/books/{self.book.id}/borrow/')
+        assert response.status_code == status.HTTP_200_OK
+
+        metrics = self.metrics()
+        assert 'libraryms_request_duration_seconds_count{view="BookViewSet.list",method="GET"} 1' in metrics
+        assert 'libraryms_request_queries_count{view="BookViewSet.borrow",method="POST"} 1' in metrics
+        assert 'libraryms_request_queries_bucket{view="BookViewSet.list",method="GET",le="2"} 1' in metrics
+        assert 'libraryms_request_queries_bucket{view="BookViewSet.list",method="GET",le="1"} 0' in metrics
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1.0, ROOT_URLCONF='lms.asgi_urls')
+    def test_async_requests_profile_their_queries_too(self):
+        token = RoleTokenObtainPairSerializer.get_token(self.author).access_token
+        headers = {'Authorization': f'Bearer {token}'}
+
+        response = async_to_sync(AsyncClient().get)('/libraryMS/books/', headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.resolver_match.func.cls is AsyncBookViewSet
+        assert '2 queries' in response['Server-Timing']
+        # Views without a coroutine handler run in a worker thread, and are profiled there
+        response = async_to_sync(AsyncClient().get)('/libraryMS/reviews/', headers=headers)
+        assert '1 queries' in response['Server-Timing']
+
+        metrics = self.metrics()
+        assert 'libraryms_request_queries_bucket{view="AsyncBookViewSet.list",method="GET",le="1"} 0' in metrics
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_left_alone(self):
+        client = self.client()
+        response = client.get('/libraryMS/books/')
+        assert response.status_code == status.HTTP_200_OK
+        assert 'Server-Timing' not in response
+        assert 'view=' not in self.metrics()
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_require_the_token(self):
+        client = APIClient()
+        assert client.get('/metrics').status_code == status.HTTP_403_FORBIDDEN
+        assert client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code == status.HTTP_200_OK
+
+    def test_metrics_are_closed_without_a_token_outside_debug(self):
+        with override_settings(METRICS_TOKEN='', DEBUG=False):
+            assert APIClient().get('/metrics').status_code == status.HTTP_403_FORBIDDEN
+        with override_settings(METRICS_TOKEN='', DEBUG=True):
+            assert APIClient().get('/metrics').status_code == status.HTTP_200_OK
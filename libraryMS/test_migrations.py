@@ -0,0 +1,94 @@
+import pytest
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.utils import timezone
+
+
+def migrate(target):
+    """Migrate libraryMS to ``target`` and return the historical models at that point."""
+    executor = MigrationExecutor(connection)
+    executor.migrate([('libraryMS', target)])
+    executor.loader.build_graph()
+    return executor.loader.project_state([('libraryMS', target)]).apps
+
+
+@pytest.mark.django_db(transaction=True)
+class TestDataMigrations:
+
+    @pytest.fixture(autouse=True)
+    def back_to_latest(self):
+        latest = MigrationExecutor(connection).loader.graph.leaf_nodes('libraryMS')[0][1]
+        yield
+        migrate(latest)
+
+    def test_notifications_follow_their_users_to_borrowers(self):
+        apps = migrate('0015_copies')
+        User = apps.get_model('auth', 'User')
+        Borrower = apps.get_model('libraryMS', 'Borrower')
+        Notification = apps.get_model('libraryMS', 'Notification')
+        # Account ids don't line up across the tables
+        Borrower.objects.create(username="padding")
+        reader = Borrower.objects.create(username="reader")
+        User.objects.create(username="admin")
+        staff = User.objects.create(username="staff")
+        user = User.objects.create(username="reader")
+        assert user.id != reader.id and staff.id == reader.id
+        Notification.objects.create(user=user, message="Yours")
+        Notification.objects.create(user=staff, message="Nobody's")
+
+        apps = migrate('0016_notification_borrower')
+
+        Notification = apps.get_model('libraryMS', 'Notification')
+        assert list(Notification.objects.values_list('borrower_id', 'message')) == [(reader.id, "Yours")]
+
+    def test_rating_counters_start_from_the_existing_reviews(self):
+        apps = migrate('0007_notification_dedup_key')
+        Author = apps.get_model('libraryMS', 'Author')
+        Borrower = apps.get_model('libraryMS', 'Borrower')
+        Book = apps.get_model('libraryMS', 'Book')
+        Review = apps.get_model('libraryMS', 'Review')
+        author = Author.objects.create(username="author1", date_of_birth="1990-01-01")
+        borrower = Borrower.objects.create(username="borrower1")
+        reviewed, unreviewed = [
+            Book.objects.create(
+                title=f"Book {i}", description="", author=author, ISBN=f"{i:013d}",
+                category="fiction", publication_date="2000-01-01", average_rating=4.5 if i == 0 else 0
+            )
+            for i in range(2)
+        ]
+        for rating in (5, 4):
+            Review.objects.create(borrower=borrower, book=reviewed, review_message="", rating=rating)
+
+        apps = migrate('0008_book_rating_counters')
+
+        Book = apps.get_model('libraryMS', 'Book')
+        counters = ['rating_sum', 'rating_count', 'rating_4_count', 'rating_5_count', 'average_rating']
+        assert list(Book.objects.order_by('id').values_list(*counters)) == [(9, 2, 1, 1, 4.5), (0, 0, 0, 0, 0)]
+
+    def test_hold_queues_are_renumbered_from_one(self):
+        apps = migrate('0016_notification_borrower')
+        Author = apps.get_model('libraryMS', 'Author')
+        Borrower = apps.get_model('libraryMS', 'Borrower')
+        Book = apps.get_model('libraryMS', 'Book')
+        Hold = apps.get_model('libraryMS', 'Hold')
+        author = Author.objects.create(username="author1", date_of_birth="1990-01-01")
+        books = [
+            Book.objects.create(
+                title=f"Book {i}", description="", author=author, ISBN=f"{i:013d}",
+                category="fiction", publication_date="2000-01-01"
+            )
+            for i in range(2)
+        ]
+        expires_at = timezone.now()
+        # Ticket numbers left with gaps by holds that were promoted or cancelled
+        for book, positions in zip(books, [(3, 4, 9), (2,)]):
+            for position in positions:
+                borrower = Borrower.objects.create(username=f"patron{book.id}-{position}")
+                Hold.objects.create(book=book, borrower=borrower, position=position, expires_at=expires_at)
+
+        apps = migrate('0017_dense_hold_positions')
+
+        Hold = apps.get_model('libraryMS', 'Hold')
+        assert list(Hold.objects.order_by('id').values_list('book_id', 'position')) == [
+            (books[0].id, 1), (books[0].id, 2), (books[0].id, 3), (books[1].id, 1),
+        ]
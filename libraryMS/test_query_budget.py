@@ -0,0 +1,61 @@
+import pytest
+from datetime import timedelta
+from django.utils import timezone
+from rest_framework.test import APIClient
+from libraryMS.models import Author, Borrower, Book, BorrowingTransaction, Reservation, Review
+from libraryMS.serializers import RoleTokenObtainPairSerializer
+
+# Maximum number of SQL queries a list endpoint may issue, whatever its page size
+QUERY_BUDGETS = {
+    # The catalog version lookup behind the ETag, then the page
+    '/libraryMS/books/?page_size=100': 2,
+    '/libraryMS/borrowings/': 1,
+    '/libraryMS/reservations/': 1,
+    '/libraryMS/reviews/': 1,
+    '/libraryMS/reviews/book/{book}/': 1,
+    '/libraryMS/books/{book}/reviews/': 2,
+    # Expanded relations are joined into the page query
+    '/libraryMS/books/?expand=author,reserved_by': 2,
+    '/libraryMS/borrowings/?expand=borrower,book.author,book.reserved_by': 1,
+    '/libraryMS/reservations/?expand=borrower,book.author,book.reserved_by': 1,
+    '/libraryMS/reviews/?expand=borrower,book.author,book.reserved_by': 1,
+}
+
+
+@pytest.mark.django_db
+class TestListQueryBudget:
+
+    def setup_method(self):
+        self.client = APIClient()
+        self.author = Author.objects.create_user(
+            username="author1", password="testpass123", date_of_birth="1990-01-01"
+        )
+        self.borrower = Borrower.objects.create_user(username="borrower1", password="testpass123")
+        self.books = []
+
+        token = RoleTokenObtainPairSerializer.get_token(self.borrower).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def seed(self, count):
+        """Add ``count`` books, each borrowed, reserved, lent to and reviewed by the test borrower."""
+        now = timezone.now()
+        for _ in range(count):
+            i = len(self.books)
+            reserved_by = Borrower.objects.create_user(username=f"reserver{i}")
+            book = Book.objects.create(
+                title=f"Book {i}", description="", author=self.author, ISBN=f"{i:013d}",
+                category="fiction", publication_date="2000-01-01",
+                available_copies=0, reserved_by=reserved_by
+            )
+            BorrowingTransaction.objects.create(borrower=self.borrower, book=book, due_date=now)
+            Reservation.objects.create(borrower=self.borrower, book=book, expiration_date=now + timedelta(days=1))
+            Review.objects.create(borrower=self.borrower, book=book, review_message="", rating=4)
+            self.books.append(book)
+
+    @pytest.mark.parametrize('url', QUERY_BUDGETS)
+    def test_query_count_stays_flat_as_page_grows(self, url, django_assert_max_num_queries):
+        for rows in (1, 15):
+            self.seed(rows)
+            with django_assert_max_num_queries(QUERY_BUDGETS[url]):
+                response = self.client.get(url.format(book=self.books[0].id))
+            assert response.status_code == 200
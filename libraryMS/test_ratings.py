@@ -0,0 +1,81 @@
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from libraryMS.models import Author, Borrower, Book, BorrowingTransaction, Review
+from libraryMS.ratings import apply_rating_change
+from libraryMS.views import ReviewViewSet
+from libraryMS.serializers import RoleTokenObtainPairSerializer
+
+
+@pytest.mark.django_db
+class TestRatingCounters:
+
+    def setup_method(self):
+        self.client = APIClient()
+        author = Author.objects.create_user(username="author1", password="testpass123", date_of_birth="1990-01-01")
+        self.borrower = Borrower.objects.create_user(username="borrower1", password="testpass123")
+        self.book = Book.objects.create(
+            title="Dune", description="", author=author, ISBN="0000000000001",
+            category="fiction", publication_date="1965-08-01"
+        )
+        BorrowingTransaction.objects.create(borrower=self.borrower, book=self.book, due_date=timezone.now())
+
+        token = RoleTokenObtainPairSerializer.get_token(self.borrower).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def review(self, rating):
+        response = self.client.post('/libraryMS/reviews/', {
+            "book_id": self.book.id, "review_message": "Spice.", "rating": rating
+        })
+        assert response.status_code == status.HTTP_201_CREATED
+        return response.data['id']
+
+    def test_counters_follow_review_writes(self):
+        first = self.review(5)
+        self.review(2)
+        self.book.refresh_from_db()
+        assert (self.book.rating_sum, self.book.rating_count, self.book.average_rating) == (7, 2, 3.5)
+        assert self.book.rating_histogram == {1: 0, 2: 1, 3: 0, 4: 0, 5: 1}
+
+        self.client.patch(f'/libraryMS/reviews/{first}/', {"rating": 3})
+        self.book.refresh_from_db()
+        assert (self.book.rating_sum, self.book.rating_count, self.book.average_rating) == (5, 2, 2.5)
+        assert self.book.rating_histogram == {1: 0, 2: 1, 3: 1, 4: 0, 5: 0}
+
+        self.client.delete(f'/libraryMS/reviews/{first}/')
+        self.book.refresh_from_db()
+        assert (self.book.rating_sum, self.book.rating_count, self.book.average_rating) == (2, 1, 2.0)
+
+    def test_writes_count_the_rating_they_replace(self, monkeypatch):
+        first = self.review(5)
+        get_object = ReviewViewSet.get_object
+
+        def stale_object(view):
+            review = get_object(view)
+            # Another edit commits after this request read the review
+            Review.objects.filter(pk=first).update(rating=review.rating - 1)
+            apply_rating_change(self.book.id, added=review.rating - 1, removed=review.rating)
+            return review
+
+        monkeypatch.setattr(ReviewViewSet, 'get_object', stale_object)
+        self.client.patch(f'/libraryMS/reviews/{first}/', {"rating": 3})
+        self.book.refresh_from_db()
+        assert (self.book.rating_sum, self.book.rating_count) == (3, 1)
+        assert self.book.rating_histogram == {1: 0, 2: 0, 3: 1, 4: 0, 5: 0}
+
+        self.client.delete(f'/libraryMS/reviews/{first}/')
+        self.book.refresh_from_db()
+        assert (self.book.rating_sum, self.book.rating_count) == (0, 0)
+        assert self.book.rating_histogram == {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
+
+    def test_rebuild_command_recomputes_counters(self):
+        for rating in (4, 4, 1):
+            Review.objects.create(borrower=self.borrower, book=self.book, review_message="", rating=rating)
+
+        call_command('rebuild_rating_counters', stdout=None)
+
+        self.book.refresh_from_db()
+        assert (self.book.rating_sum, self.book.rating_count, self.book.average_rating) == (9, 3, 3.0)
+        assert self.book.rating_histogram == {1: 1, 2: 0, 3: 0, 4: 2, 5: 0}
@@ -0,0 +1,95 @@
+import datetime
+import decimal
+import uuid
+
+import msgpack
+import pytest
+from django.utils.translation import gettext_lazy
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from libraryMS import circulation, renderers
+from libraryMS.models import Author, Borrower, Book
+from libraryMS.renderers import FastJSONRenderer
+from libraryMS.serializers import RoleTokenObtainPairSerializer
+
+PAYLOAD = {
+    'id': 7,
+    'title': "Le Petit Prince   \U0001f4da",
+    'average_rating': decimal.Decimal('4.25'),
+    'created_at': datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+    'publication_date': datetime.date(1943, 4, 6),
+    'token': uuid.UUID(int=1),
+    'detail': gettext_lazy("Not found."),
+    'tags': ('classic', None, True, 1.5),
+    'author': {'name': "Antoine", 'reserved_by': None},
+}
+
+
+class TestFastJSONRenderer:
+
+    @pytest.mark.parametrize('data, media_type', [
+        (PAYLOAD, 'application/json'),
+        ([PAYLOAD] * 3, 'application/json'),
+        # Left to the stdlib renderer
+        ({1: 'non-string key'}, 'application/json'),
+        ({'big': 2 ** 70}, 'application/json'),
+        (PAYLOAD, 'application/json; indent=4'),
+        (None, 'application/json'),
+    ])
+    def test_output_matches_the_stdlib_renderer(self, data, media_type):
+        assert FastJSONRenderer().render(data, media_type) == JSONRenderer().render(data, media_type)
+
+    def test_falls_back_without_orjson(self, monkeypatch):
+        monkeypatch.setattr(renderers, 'orjson', None)
+
+        assert FastJSONRenderer().render(PAYLOAD) == JSONRenderer().render(PAYLOAD)
+
+
+@pytest.mark.django_db
+class TestNegotiation:
+
+    def setup_method(self):
+        self.author = Author.objects.create_user(username="author1", date_of_birth="1990-01-01")
+        self.borrower = Borrower.objects.create_user(username="borrower1")
+        self.book = Book.objects.create(
+            title="Dune", description="", author=self.author, ISBN="0000000000001",
+            category="fiction", publication_date="1965-08-01"
+        )
+        circulation.borrow(self.book.id, self.borrower.id)
+        self.client = APIClient()
+        token = RoleTokenObtainPairSerializer.get_token(self.borrower).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_json_unless_msgpack_is_asked_for(self):
+        as_json = self.client.get('/libraryMS/books/')
+        as_msgpack = self.client.get('/libraryMS/books/', HTTP_ACCEPT='application/msgpack')
+
+        assert as_json['Content-Type'] == 'application/json'
+        assert as_msgpack['Content-Type'] == 'application/msgpack'
+        assert msgpack.unpackb(as_msgpack.content) == as_json.json()
+        assert list(as_json.json()['results'][0]['rating_histogram']) == ['1', '2', '3', '4', '5']
+
+    def test_formats_are_validated_separately(self):
+        as_json = self.client.get(f'/libraryMS/books/{self.book.id}/')
+        as_msgpack = self.client.get(
+            f'/libraryMS/books/{self.book.id}/', HTTP_ACCEPT='application/msgpack', HTTP_IF_NONE_MATCH=as_json['ETag']
+        )
+
+        assert as_msgpack.status_code == status.HTTP_200_OK
+        assert as_msgpack['ETag'] != as_json['ETag']
+        assert 'Accept' in as_json['Vary']
+
+    def test_msgpack_request_bodies_are_parsed(self):
+        response = self.client.post('/libraryMS/reviews/', {
+            'book_id': self.book.id, 'review_message': "Again", 'rating': 2,
+        }, format='msgpack')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['rating'] == 2
+
+    @pytest.mark.parametrize('content_type', ['application/json', 'application/msgpack'])
+    def test_malformed_bodies_are_rejected(self, content_type):
+        response = self.client.post('/libraryMS/reviews/', b'\xc1{', content_type=content_type)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,134 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, router, transaction
+from django.utils import timezone
+from rest_framework import status, viewsets
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+from libraryMS import routers, sweeps
+from libraryMS.async_views import AsyncReadMixin
+from libraryMS.models import Book, Borrower
+
+
+class ProbeViewSet(routers.ReplicaReadsMixin, viewsets.ViewSet):
+    """Reports the database its reads would use."""
+
+    def list(self, request):
+        return Response({'db': Book.objects.all().db})
+
+    def create(self, request):
+        if request.data.get('fail'):
+            return Response({'db': Book.objects.all().db}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'db': Book.objects.all().db}, status=status.HTTP_201_CREATED)
+
+
+class AsyncProbeViewSet(AsyncReadMixin, ProbeViewSet):
+
+    async def list(self, request):
+        return Response({'db': Book.objects.all().db})
+
+
+class TestReplicaRouting:
+
+    @pytest.fixture(autouse=True)
+    def replica(self, settings, monkeypatch):
+        settings.DATABASE_REPLICAS = ['replica_0']
+        self.lag = 0.0
+        monkeypatch.setattr(routers, 'replica_lag', lambda alias: self.lag)
+        routers.reset_health()
+        yield
+        routers.reset_health()
+
+    def call(self, method, user_id=7, viewset=ProbeViewSet, **data):
+        user = User(id=user_id, username=f"reader{user_id}")
+        user.borrower = Borrower(pk=user_id)
+        request = getattr(APIRequestFactory(), method)('/probe/', data, format='json')
+        force_authenticate(request, user=user)
+        view = viewset.as_view({'get': 'list', 'post': 'create'})
+        if viewset is AsyncProbeViewSet:
+            view = async_to_sync(view)
+        return view(request).data['db']
+
+    def test_reads_stay_on_the_primary_unless_allowed(self):
+        assert Book.objects.all().db == 'default'
+        with routers.use_replica():
+            assert Book.objects.all().db == 'replica_0'
+            with routers.use_replica(False):
+                assert Book.objects.all().db == 'default'
+            assert router.db_for_write(Book) == 'default'
+        assert Book.objects.all().db == 'default'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_transactions_read_their_own_writes(self):
+        with routers.use_replica():
+            with transaction.atomic():
+                assert Book.objects.all().db == 'default'
+
+    def test_safe_requests_read_from_a_replica_until_the_user_writes(self):
+        assert self.call('get') == 'replica_0'
+
+        assert self.call('post') == 'default'
+
+        assert self.call('get') == 'default'
+        # Other users are not held back by someone else's write
+        assert self.call('get', user_id=8) == 'replica_0'
+
+    def test_async_views_look_the_pin_up_without_blocking(self, monkeypatch):
+        self.call('post')
+        monkeypatch.setattr(routers, 'is_pinned', lambda user: pytest.fail("blocking cache read"))
+
+        assert self.call('get', viewset=AsyncProbeViewSet) == 'default'
+        assert self.call('get', user_id=8, viewset=AsyncProbeViewSet) == 'replica_0'
+
+    def test_refused_writes_do_not_pin_the_user(self):
+        self.call('post', fail=True)
+
+        assert self.call('get') == 'replica_0'
+
+    def test_pins_must_be_shared_between_workers(self, settings):
+        with pytest.raises(ImproperlyConfigured):
+            routers.check_pin_cache()
+
+        settings.CACHES = {
+            **settings.CACHES,
+            'pins': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'replica_pins'},
+        }
+        settings.REPLICA_PIN_CACHE = 'pins'
+        routers.check_pin_cache()
+        assert routers.pin_cache() is caches['pins']
+
+        settings.DATABASE_REPLICAS = []
+        settings.REPLICA_PIN_CACHE = 'default'
+        routers.check_pin_cache()
+
+    def test_lagging_or_unreachable_replicas_are_skipped(self, settings, monkeypatch):
+        self.lag = settings.REPLICA_MAX_LAG_SECONDS + 1
+        assert self.call('get') == 'default'
+
+        def unreachable(alias):
+            raise DatabaseError("connection refused")
+        routers.reset_health()
+        monkeypatch.setattr(routers, 'replica_lag', unreachable)
+        assert self.call('get') == 'default'
+
+    def test_health_checks_are_reused_for_a_while(self, settings, monkeypatch):
+        checks = []
+        monkeypatch.setattr(routers, 'replica_lag', lambda alias: checks.append(alias) or 0.0)
+
+        for _ in range(3):
+            self.call('get')
+        assert checks == ['replica_0']
+
+        settings.REPLICA_CHECK_SECONDS = 0
+        self.call('get')
+        assert len(checks) == 2
+
+    def test_only_the_reconciliation_sweep_scans_a_replica(self):
+        now = timezone.now()
+
+        assert sweeps._select('send_reservation_available_notifications', now)[0].db == 'replica_0'
+        assert sweeps._select('cancel_expired_reservations', now)[0].db == 'default'
+        assert sweeps._select('circulation_reservations', now)[0].db == 'default'
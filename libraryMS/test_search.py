@@ -0,0 +1,93 @@
+import pytest
+from rest_framework.pagination import Cursor
+from rest_framework.test import APIClient
+from libraryMS import circulation
+from libraryMS.models import Author, Borrower, Book
+from libraryMS.pagination import BookPagination
+from libraryMS.serializers import RoleTokenObtainPairSerializer
+
+
+@pytest.mark.django_db
+class TestCatalogSearch:
+
+    def setup_method(self):
+        self.client = APIClient()
+        self.author = Author.objects.create_user(
+            username="fherbert", password="testpass123", name="Frank Herbert", date_of_birth="1920-10-08"
+        )
+        self.dune = self.book("Dune", "Spice, sandworms and politics on Arrakis.", "fiction")
+        self.messiah = self.book("Dune Messiah", "Paul rules the known universe.", "fiction")
+        self.dragon = self.book("The Dragon in the Sea", "A submarine thriller mentioning dune buggies.", "mystery")
+
+        # Searching the catalog is for borrowers
+        self.reader = Borrower.objects.create_user(username="reader")
+        token = RoleTokenObtainPairSerializer.get_token(self.reader).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def book(self, title, description, category):
+        return Book.objects.create(
+            title=title, description=description, author=self.author, ISBN=str(Book.objects.count()).zfill(13),
+            category=category, publication_date="1965-08-01"
+        )
+
+    def search(self, query):
+        response = self.client.get('/libraryMS/books/', query)
+        assert response.status_code == 200
+        return [book['title'] for book in response.data['results']]
+
+    def test_title_matches_rank_above_description_matches(self):
+        assert self.search({'search': 'dune'}) == ["Dune", "Dune Messiah", "The Dragon in the Sea"]
+
+    def test_search_covers_author_name_and_prefixes(self):
+        assert len(self.search({'search': 'herbert'})) == 3
+        assert self.search({'search': 'sandw'}) == ["Dune"]
+
+    def test_search_input_cannot_inject_query_syntax(self):
+        assert self.search({'search': 'dune" OR "*'}) == []
+
+    def test_search_combines_with_category_and_availability(self):
+        circulation.borrow(self.dune.id, self.reader.id)
+
+        assert self.search({'search': 'dune', 'category': 'mystery'}) == ["The Dragon in the Sea"]
+        assert self.search({'search': 'dune', 'available': 'true'}) == ["Dune Messiah", "The Dragon in the Sea"]
+        assert self.search({'search': 'dune', 'available': 'false'}) == ["Dune"]
+
+    def test_index_follows_title_and_author_changes(self):
+        self.messiah.title = "Children of Dune"
+        self.messiah.save()
+        self.author.name = "Brian Herbert"
+        self.author.save()
+
+        assert self.search({'search': 'children'}) == ["Children of Dune"]
+        assert len(self.search({'search': 'brian'})) == 3
+
+    def test_ranked_results_page_with_cursors(self):
+        titles = []
+        url = '/libraryMS/books/?search=dune&page_size=1'
+        while url:
+            response = self.client.get(url)
+            titles += [book['title'] for book in response.data['results']]
+            url = response.data['next']
+        assert titles == ["Dune", "Dune Messiah", "The Dragon in the Sea"]
+
+    def test_equally_ranked_results_page_by_id_both_ways(self):
+        reprints = [self.book("Dune", "Spice, sandworms and politics on Arrakis.", "fiction") for _ in range(4)]
+        expected = [self.dune.id] + [book.id for book in reprints]
+
+        ids, url = [], '/libraryMS/books/?search=sandworms&page_size=2'
+        while url:
+            response = self.client.get(url)
+            ids += [book['id'] for book in response.data['results']]
+            last, url = response, response.data['next']
+        assert ids == expected
+
+        # Back from the last page, over the same rows
+        response = self.client.get(last.data['previous'])
+        assert [book['id'] for book in response.data['results']] == expected[2:4]
+
+    def test_cursors_must_hold_the_whole_position(self):
+        paginator = BookPagination()
+        paginator.base_url = 'http://testserver/libraryMS/books/?search=dune'
+        # A rank with no id to break its ties
+        url = paginator.encode_cursor(Cursor(offset=0, reverse=False, position='2000000'))
+        assert self.client.get(url).status_code == 404
@@ -0,0 +1,115 @@
+import asyncio
+import threading
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory
+from django.urls import resolve
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from libraryMS.events import InProcessBroker, read_event
+from libraryMS.models import Borrower, Notification
+from libraryMS.serializers import RoleTokenObtainPairSerializer
+from libraryMS.streams import notification_stream, stream_events
+
+
+class TestInProcessBroker:
+
+    def test_publish_from_another_thread_reaches_subscriber(self):
+        broker = InProcessBroker()
+
+        async def listen():
+            async with broker.subscribe(7) as queue:
+                publisher = threading.Thread(target=broker.publish, args=(7, {'message': 'hello'}))
+                publisher.start()
+                event = await asyncio.wait_for(queue.get(), 1)
+                publisher.join()
+                return event
+
+        assert async_to_sync(listen)() == {'message': 'hello'}
+        assert broker.subscriber_count() == 0
+
+
+@pytest.mark.django_db
+class TestNotificationStream:
+
+    @pytest.fixture(autouse=True)
+    def events_on(self, settings):
+        settings.NOTIFICATION_EVENTS_URL = 'memory://'
+
+    def test_stream_sends_unread_count_then_new_notifications(self):
+        borrower = Borrower.objects.create_user(username="borrower1")
+        Notification.objects.create(borrower=borrower, message="old")
+        broker = InProcessBroker()
+
+        async def read_stream():
+            events = stream_events(broker, borrower.id)
+            first = await events.__anext__()
+            broker.publish(borrower.id, {'message': 'new'})
+            second = await events.__anext__()
+            third = await events.__anext__()
+            broker.publish(borrower.id, read_event(None))
+            fourth = await events.__anext__()
+            await events.aclose()
+            return first, second, third, fourth
+
+        first, second, third, fourth = async_to_sync(read_stream)()
+        assert first == 'event: unread\ndata: {"unread": 1}\n\n'
+        assert second == 'event: notification\ndata: {"message": "new"}\n\n'
+        assert third.startswith('event: unread')
+        assert fourth == 'event: read\ndata: {"ids": null}\n\n'
+        assert broker.subscriber_count() == 0
+
+    def test_stream_requires_a_valid_token(self):
+        factory = RequestFactory()
+        response = async_to_sync(notification_stream)(factory.get('/libraryMS/notifications/stream/'))
+        assert response.status_code == 401
+
+        token = AccessToken()
+        token['user_id'] = token['role_id'] = 1
+        token['role'] = 'author'
+        request = factory.get('/libraryMS/notifications/stream/', {'access_token': str(token)})
+        response = async_to_sync(notification_stream)(request)
+        assert response.status_code == 403
+
+        token['role'] = 'borrower'
+        request = factory.get('/libraryMS/notifications/stream/', {'access_token': str(token)})
+        response = async_to_sync(notification_stream)(request)
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'text/event-stream'
+
+    def test_streaming_is_off_by_default(self, settings):
+        settings.NOTIFICATION_EVENTS_URL = ''
+        token = AccessToken()
+        token['user_id'] = token['role_id'] = 1
+        token['role'] = 'borrower'
+        request = RequestFactory().get('/libraryMS/notifications/stream/', {'access_token': str(token)})
+
+        assert async_to_sync(notification_stream)(request).status_code == 503
+
+    def test_stream_is_only_routed_by_the_asgi_application(self, settings):
+        assert resolve('/libraryMS/notifications/stream/').func is not notification_stream
+
+        settings.ROOT_URLCONF = 'lms.asgi_urls'
+        assert resolve('/libraryMS/notifications/stream/').func is notification_stream
+
+    def test_marking_read_is_published(self, monkeypatch, django_capture_on_commit_callbacks):
+        published = []
+        monkeypatch.setattr(InProcessBroker, 'publish', lambda self, *args: published.append(args))
+        borrower = Borrower.objects.create_user(username="borrower1")
+        first, _ = Notification.objects.bulk_create(
+            Notification(borrower=borrower, message=f"Notice {i}") for i in range(2)
+        )
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RoleTokenObtainPairSerializer.get_token(borrower).access_token}')
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post(f'/libraryMS/notifications/{first.id}/mark_as_read/')
+            assert response.status_code == status.HTTP_200_OK
+            response = client.post('/libraryMS/notifications/mark_all_as_read/')
+            assert response.status_code == status.HTTP_200_OK
+            # Nothing left to read, nothing to tell
+            client.post('/libraryMS/notifications/mark_all_as_read/')
+
+        assert published == [(borrower.id, read_event([first.id])), (borrower.id, read_event(None))]
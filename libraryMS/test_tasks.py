@@ -0,0 +1,261 @@
+import pytest
+from datetime import timedelta
+from django.utils import timezone
+from lms.celery import app as celery_app
+from libraryMS import tasks
+from libraryMS.conditional import catalog_version
+from libraryMS.models import Author, Borrower, Book, BorrowingTransaction, Reservation, Notification
+from libraryMS.notifications import DEFAULT_CHUNK_SIZE
+from libraryMS.tasks import (
+    cancel_expired_reservations,
+    daily_circulation_sweep,
+    send_due_date_notifications,
+    send_overdue_notifications,
+    send_reservation_available_notifications,
+)
+from libraryMS.sweeps import plan_shards, run_sweep
+
+
+@pytest.mark.django_db
+class TestNotificationTasks:
+
+    def setup_method(self):
+        self.author = Author.objects.create_user(
+            username="author1", password="testpass123", date_of_birth="1990-01-01"
+        )
+        self.borrowers = []
+        for i in range(3):
+            borrower = Borrower.objects.create_user(username=f"borrower{i}", password="testpass123")
+            self.borrowers.append(borrower)
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}", description="", author=self.author, ISBN=f"{i:013d}",
+                category="fiction", publication_date="2000-01-01"
+            )
+            for i in range(6)
+        ]
+
+    def borrow(self, borrower, book, due_in_days):
+        return BorrowingTransaction.objects.create(
+            borrower=borrower, book=book, due_date=timezone.now() + timedelta(days=due_in_days)
+        )
+
+    def test_due_date_notifications_are_written_in_chunks(self, django_assert_max_num_queries):
+        for i, book in enumerate(self.books):
+            self.borrow(self.borrowers[i % 3], book, due_in_days=1)
+        self.borrow(self.borrowers[0], self.books[0], due_in_days=20)
+
+        # One read and one bulk insert per chunk, regardless of the number of loans
+        with django_assert_max_num_queries(8):
+            stats = send_due_date_notifications(chunk_size=2)
+
+        assert stats['rows_scanned'] == 6
+        assert stats['rows_written'] == 6
+        assert stats['chunks'] == 3
+        assert Notification.objects.filter(message__contains="is due on").count() == 6
+
+    def test_overdue_notifications(self):
+        self.borrow(self.borrowers[0], self.books[0], due_in_days=-2)
+        self.borrow(self.borrowers[1], self.books[1], due_in_days=5)
+
+        stats = send_overdue_notifications()
+
+        assert stats['rows_written'] == 1
+        notification = Notification.objects.get()
+        assert notification.borrower_id == self.borrowers[0].id
+        assert "'Book 0' is overdue" in notification.message
+
+    def test_reservation_available_notifications(self):
+        Reservation.objects.create(
+            borrower=self.borrowers[0], book=self.books[0], expiration_date=timezone.now() + timedelta(days=3)
+        )
+
+        stats = send_reservation_available_notifications()
+
+        assert stats['rows_written'] == 1
+        assert Notification.objects.get().borrower_id == self.borrowers[0].id
+
+    def test_cancel_expired_reservations_deletes_in_bulk(self):
+        now = timezone.now()
+        for i, book in enumerate(self.books[:4]):
+            Reservation.objects.create(
+                borrower=self.borrowers[i % 3], book=book, expiration_date=now - timedelta(days=1)
+            )
+        live = Reservation.objects.create(
+            borrower=self.borrowers[0], book=self.books[5], expiration_date=now + timedelta(days=1)
+        )
+
+        stats = cancel_expired_reservations()
+
+        assert stats['rows_written'] == 4
+        assert stats['rows_deleted'] == 4
+        assert list(Reservation.objects.all()) == [live]
+
+    def test_freeing_expired_reservations_bumps_the_catalog(self, django_capture_on_commit_callbacks):
+        book = self.books[0]
+        Reservation.objects.create(
+            borrower=self.borrowers[0], book=book, expiration_date=timezone.now() - timedelta(days=1)
+        )
+        Book.objects.filter(pk=book.pk).update(reserved_by=self.borrowers[0])
+        version, _ = catalog_version()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            cancel_expired_reservations()
+
+        book.refresh_from_db()
+        assert book.reserved_by is None
+        assert catalog_version()[0] == version + 1
+
+    def test_rerunning_reminders_is_a_no_op(self):
+        self.borrow(self.borrowers[0], self.books[0], due_in_days=-1)
+        self.borrow(self.borrowers[1], self.books[1], due_in_days=2)
+
+        for _ in range(3):
+            send_due_date_notifications()
+            send_overdue_notifications()
+
+        assert Notification.objects.filter(kind='due_soon').count() == 2
+        assert Notification.objects.filter(kind='overdue').count() == 1
+
+    def test_overdue_loans_are_flagged_once_per_due_date(self):
+        loan = self.borrow(self.borrowers[0], self.books[0], due_in_days=-1)
+
+        # Later daily runs, the loan still out
+        for days in range(3):
+            tasks.sweep('send_overdue_notifications', DEFAULT_CHUNK_SIZE, now=timezone.now() + timedelta(days=days))
+        assert Notification.objects.filter(kind='overdue').count() == 1
+
+        # Renewed, and overdue again
+        loan.due_date = timezone.now() + timedelta(days=1)
+        loan.save()
+        tasks.sweep('send_overdue_notifications', DEFAULT_CHUNK_SIZE, now=timezone.now() + timedelta(days=2))
+        assert Notification.objects.filter(kind='overdue').count() == 2
+
+    def test_shard_plan_grows_with_rows_and_covers_every_id(self):
+        loans = [self.borrow(self.borrowers[i % 3], book, due_in_days=1) for i, book in enumerate(self.books)]
+        now = timezone.now()
+
+        assert plan_shards('send_due_date_notifications', now, rows_per_shard=10) == [[loans[0].id, loans[-1].id + 1]]
+        shards = plan_shards('send_due_date_notifications', now, rows_per_shard=2)
+        assert len(shards) == 3
+        assert shards[0][0] == loans[0].id and shards[-1][1] == loans[-1].id + 1
+        assert all(left[1] == right[0] for left, right in zip(shards, shards[1:]))
+        assert len(plan_shards('send_due_date_notifications', now, rows_per_shard=1, max_shards=4)) == 4
+        assert plan_shards('send_overdue_notifications', now) == []
+
+    def test_large_sweep_runs_as_shards(self, settings, monkeypatch):
+        settings.SWEEP_ROWS_PER_SHARD = 2
+        monkeypatch.setattr(celery_app.conf, 'task_always_eager', True)
+        for i, book in enumerate(self.books):
+            self.borrow(self.borrowers[i % 3], book, due_in_days=-1)
+        finished = []
+        monkeypatch.setattr(tasks.finish_sweep, 'run', wrap(tasks.finish_sweep.run, finished.append))
+
+        summary = send_overdue_notifications()
+
+        assert summary == {'task': 'send_overdue_notifications', 'dispatched': True, 'shards': 3}
+        totals = finished[0]
+        assert totals['shards'] == 3
+        assert totals['rows_scanned'] == totals['rows_written'] == 6
+        assert totals['failed_shards'] == []
+        assert Notification.objects.filter(kind='overdue').count() == 6
+
+    def test_only_failed_shards_are_retried(self, settings, monkeypatch):
+        settings.SWEEP_ROWS_PER_SHARD = 2
+        monkeypatch.setattr(celery_app.conf, 'task_always_eager', True)
+        loans = [self.borrow(self.borrowers[i % 3], book, due_in_days=-1) for i, book in enumerate(self.books)]
+        shards = plan_shards('send_overdue_notifications', timezone.now())
+        runs = []
+
+        def flaky(name, now, chunk_size, id_range):
+            runs.append(id_range)
+            if id_range == shards[1] and runs.count(id_range) == 1:
+                raise RuntimeError("connection lost")
+            return run_sweep(name, now, chunk_size, id_range)
+
+        monkeypatch.setattr(tasks, 'run_sweep', flaky)
+        finished = []
+        monkeypatch.setattr(tasks.finish_sweep, 'run', wrap(tasks.finish_sweep.run, finished.append))
+
+        send_overdue_notifications()
+
+        assert runs == [*shards, shards[1]]
+        # Eager chords run the retry's callback inside the first one, so it finishes first
+        retry, first = finished
+        assert first['retrying'] == [shards[1]]
+        assert retry['shards'] == 3 and retry['rows_written'] == len(loans)
+        assert retry['failed_shards'] == []
+        assert Notification.objects.filter(kind='overdue').count() == len(loans)
+
+    def test_shard_that_keeps_failing_is_reported(self, settings, monkeypatch):
+        settings.SWEEP_ROWS_PER_SHARD = 2
+        settings.SWEEP_MAX_ATTEMPTS = 2
+        monkeypatch.setattr(celery_app.conf, 'task_always_eager', True)
+        for i, book in enumerate(self.books):
+            self.borrow(self.borrowers[i % 3], book, due_in_days=-1)
+        shards = plan_shards('send_overdue_notifications', timezone.now())
+
+        def broken(name, now, chunk_size, id_range):
+            if id_range == shards[0]:
+                raise RuntimeError("connection lost")
+            return run_sweep(name, now, chunk_size, id_range)
+
+        monkeypatch.setattr(tasks, 'run_sweep', broken)
+        finished = []
+        monkeypatch.setattr(tasks.finish_sweep, 'run', wrap(tasks.finish_sweep.run, finished.append))
+
+        send_overdue_notifications()
+
+        assert len(finished) == 2
+        assert finished[0]['failed_shards'] == [shards[0]]
+        assert finished[0]['shards'] == 2
+
+
+    def seed_circulation(self):
+        now = timezone.now()
+        self.borrow(self.borrowers[0], self.books[0], due_in_days=-2)
+        self.borrow(self.borrowers[1], self.books[1], due_in_days=2)
+        self.borrow(self.borrowers[2], self.books[2], due_in_days=20)
+        # Out on a loan that predates the loan history
+        Book.objects.filter(pk=self.books[3].pk).update(available_copies=0)
+        Reservation.objects.create(borrower=self.borrowers[0], book=self.books[4], expiration_date=now - timedelta(days=1))
+        Reservation.objects.create(borrower=self.borrowers[1], book=self.books[5], expiration_date=now + timedelta(days=3))
+        Reservation.objects.create(borrower=self.borrowers[2], book=self.books[3], expiration_date=now + timedelta(days=3))
+
+    def test_daily_sweep_does_the_work_of_the_four_tasks(self, django_assert_max_num_queries):
+        self.seed_circulation()
+
+        # Per table: one plan, one read and one insert (no read-back, with streaming off); then
+        # the expired reservations' books are found and freed in bulk in a savepoint and checked
+        # for hold queues to serve, and the stale holds dropped
+        with django_assert_max_num_queries(17):
+            stats = daily_circulation_sweep()
+
+        assert stats['rows_scanned'] == 2 + 2
+        assert stats['rows_written'] == 5
+        assert stats['rows_deleted'] == 1
+        assert sorted(Notification.objects.values_list('kind', flat=True)) == [
+            'due_soon', 'due_soon', 'overdue', 'reservation_available', 'reservation_expired'
+        ]
+        assert Reservation.objects.count() == 2
+
+    def test_daily_sweep_and_individual_tasks_share_dedup_keys(self):
+        self.seed_circulation()
+        daily_circulation_sweep()
+        written = Notification.objects.count()
+
+        for task in (
+            send_due_date_notifications, send_overdue_notifications,
+            send_reservation_available_notifications, cancel_expired_reservations,
+        ):
+            task()
+
+        assert Notification.objects.count() == written
+
+
+def wrap(function, observe):
+    def wrapped(*args, **kwargs):
+        result = function(*args, **kwargs)
+        observe(result)
+        return result
+    return wrapped
@@ -0,0 +1,98 @@
+import pytest
+from datetime import timedelta
+from types import SimpleNamespace
+from django.contrib.auth.models import User
+from django.db import OperationalError
+from django.db.models import QuerySet
+from django.utils import timezone
+from libraryMS import tasks, telemetry
+from libraryMS.models import Author, Borrower, Book, BorrowingTransaction, TaskRun
+
+
+@pytest.mark.django_db
+class TestTaskTelemetry:
+
+    def setup_method(self):
+        author = Author.objects.create_user(username="author1", password="testpass123", date_of_birth="1990-01-01")
+        borrower = Borrower.objects.create_user(username="borrower1", password="testpass123")
+        book = Book.objects.create(
+            title="Dune", description="", author=author, ISBN="0000000000001",
+            category="fiction", publication_date="1965-08-01"
+        )
+        BorrowingTransaction.objects.create(borrower=borrower, book=book, due_date=timezone.now() - timedelta(days=1))
+
+    def test_publish_stamps_enqueue_time(self):
+        headers = {}
+        telemetry.stamp_enqueue_time(sender='libraryMS.tasks.send_overdue_notifications', headers=headers)
+        assert telemetry.ENQUEUED_HEADER in headers
+
+        other = {}
+        telemetry.stamp_enqueue_time(sender='celery.backend_cleanup', headers=other)
+        assert other == {}
+
+    def test_run_records_runtime_rows_and_queue_lag(self):
+        task = tasks.send_overdue_notifications
+        enqueued = (timezone.now() - timedelta(seconds=5)).timestamp()
+        task.push_request(id='task-1', hostname='worker@test', enqueued_at=enqueued)
+        try:
+            telemetry.record_start(task_id='task-1', task=task)
+            retval = task.run()
+            telemetry.record_finish(task_id='task-1', task=task, retval=retval, state='SUCCESS')
+        finally:
+            task.pop_request()
+
+        run = TaskRun.objects.get(task_id='task-1')
+        assert run.task_name == 'libraryMS.tasks.send_overdue_notifications'
+        assert run.status == 'succeeded'
+        assert run.worker == 'worker@test'
+        assert run.queue_lag == pytest.approx(5, abs=1)
+        assert run.runtime >= 0
+        assert (run.rows_scanned, run.rows_written, run.chunks) == (1, 1, 1)
+
+    def test_failed_run_keeps_the_error(self):
+        task = tasks.generate_report
+        task.push_request(id='task-2', hostname='worker@test')
+        try:
+            telemetry.record_start(task_id='task-2', task=task)
+            telemetry.record_failure(task_id='task-2', exception=ValueError("boom"))
+            telemetry.record_finish(task_id='task-2', task=task, retval=None, state='FAILURE')
+        finally:
+            task.pop_request()
+
+        run = TaskRun.objects.get(task_id='task-2')
+        assert run.status == 'failed'
+        assert run.error == "ValueError: boom"
+        assert run.queue_lag is None
+
+    def test_database_errors_never_reach_the_task(self, monkeypatch, caplog):
+        def unavailable(*args, **kwargs):
+            raise OperationalError("database is down")
+
+        telemetry._running['task-3'] = (0, 0.0)
+        monkeypatch.setattr(QuerySet, 'update', unavailable)
+        try:
+            telemetry.record_failure(task_id='task-3', exception=ValueError("boom"))
+            telemetry.record_retry(request=SimpleNamespace(id='task-3'), reason="later")
+        finally:
+            telemetry._running.pop('task-3')
+
+        assert [record.getMessage() for record in caplog.records] == [
+            "Could not record the failure of task task-3", "Could not record the retry of task task-3",
+        ]
+
+    def test_signals_record_an_eagerly_applied_task(self):
+        result = tasks.send_overdue_notifications.apply()
+
+        run = TaskRun.objects.get(task_id=result.id)
+        assert run.status == 'succeeded'
+        assert run.rows_written == 1
+
+    def test_admin_history_shows_per_task_summary(self, client):
+        tasks.send_overdue_notifications.apply()
+        admin = User.objects.create_superuser(username="admin", password="adminpass")
+        client.force_login(admin)
+
+        response = client.get('/admin/libraryMS/taskrun/?task_name=libraryMS.tasks.send_overdue_notifications')
+        assert response.status_code == 200
+        assert b"Per-task summary" in response.content
+        assert response.context['task_summary'][0]['runs'] == 1
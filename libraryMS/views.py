@@ -1,11 +1,11 @@
-from django.db.models import Avg
+from django.db.transaction import atomic
 from datetime import timedelta
 from django.utils import timezone
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status
 from rest_framework.views import APIView
-from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from libraryMS.models import Author, Borrower, Book, BorrowingTransaction, Reservation, Review, Notification
+from libraryMS.models import Author, Borrower, Book, BorrowingTransaction, Hold, Reservation, Review, Notification
 from libraryMS.serializers import (
     NotificationSerializer,
     SignUpSerializer,
@@ -13,6 +13,9 @@ from libraryMS.serializers import (
     BorrowerSerializer,
     BookSerializer,
     BorrowingTransactionSerializer,
+    CirculationBatchSerializer,
+    AddCopiesSerializer,
+    HoldSerializer,
     ReservationSerializer,
     ReviewSerializer,
 )
@@ -22,7 +25,15 @@ from libraryMS.permissions import (
 )
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from django_filters.rest_framework import DjangoFilterBackend
+from libraryMS import circulation, events, holds
+from libraryMS.cache import CachedListMixin
+from libraryMS.conditional import ConditionalGetMixin, bump_catalog_version
+from libraryMS.fieldsets import SparseFieldsetsMixin
+from libraryMS.pagination import BookPagination, IdCursorPagination
+from libraryMS.ratings import apply_rating_change
+from libraryMS.routers import ReplicaReadsMixin
+from libraryMS.search import BookFilter, CatalogSearchFilter
 
 
 class SignUpView(APIView):
@@ -39,9 +50,10 @@ class SignUpView(APIView):
 
 
 # Author ViewSet
-class AuthorViewSet(viewsets.ModelViewSet):
+class AuthorViewSet(ReplicaReadsMixin, SparseFieldsetsMixin, viewsets.ModelViewSet):
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
+    pagination_class = IdCursorPagination
     permission_classes = [IsAuthenticated]
 
     def get_permissions(self):
@@ -50,11 +62,17 @@ class AuthorViewSet(viewsets.ModelViewSet):
             return [IsOwnerOrReadOnly()]
         return super().get_permissions()
 
+    def perform_update(self, serializer):
+        serializer.save()
+        # Profiles are nested in every cached catalog page
+        bump_catalog_version()
+
 
 # Borrower ViewSet
-class BorrowerViewSet(viewsets.ModelViewSet):
+class BorrowerViewSet(ReplicaReadsMixin, SparseFieldsetsMixin, viewsets.ModelViewSet):
     queryset = Borrower.objects.all()
     serializer_class = BorrowerSerializer
+    pagination_class = IdCursorPagination
     permission_classes = [IsAuthenticated]
 
     def get_permissions(self):
@@ -63,48 +81,61 @@ class BorrowerViewSet(viewsets.ModelViewSet):
             return [IsOwnerOrReadOnly()]
         return super().get_permissions()
 
-
-class BookPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = 'page_size'
-    max_page_size = 100
+    def perform_update(self, serializer):
+        serializer.save()
+        # Profiles are nested in every cached catalog page
+        bump_catalog_version()
 
 
 # Book ViewSet
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(ReplicaReadsMixin, SparseFieldsetsMixin, ConditionalGetMixin, CachedListMixin, viewsets.ModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     pagination_class = BookPagination
-    search_fields = ['title', 'author__name', 'category']
-    filterset_fields = ['author', 'category']
+    filter_backends = [DjangoFilterBackend, CatalogSearchFilter]
+    filterset_class = BookFilter
+    # IsAuthor compares the book's author with the user's
+    required_columns = ('author',)
+
+    permission_classes = [IsAuthenticated]
 
-    permission_classes = [IsAuthenticated, IsAuthor]
+    def get_permissions(self):
+        # Borrowers browse and borrow from the catalog; only authors write to it, and only their own books
+        actionf = getattr(self, 'action', None)
+        if actionf in ['create', 'update', 'partial_update', 'destroy', 'copies']:
+            return [IsAuthenticated(), IsAuthor()]
+        return super().get_permissions()
 
     def get_queryset(self):
         # Filter books to show only those created by the logged-in author
         user = self.request.user
         # If the user is an author, show only their books
         if hasattr(user, 'author'):
-            return Book.objects.filter(author=user.author)
+            return super().get_queryset().filter(author=user.author)
 
-        # If the user is a borrower, show all books (they can also search and filter)
+        # If the user is a borrower, show all books (they can also search and filter by availability)
         if hasattr(user, 'borrower'):
-            queryset = super().get_queryset()
-            # Filtering by availability
-            is_available = self.request.query_params.get('available', None)
-            if is_available is not None:
-                queryset = queryset.filter(borrowed_by__isnull=True, reserved_by__isnull=True)  # Only books that aren't borrowed or reserved
-            return queryset
+            return super().get_queryset()
 
         return Book.objects.none()
 
+    def cache_variant(self, request):
+        # Authors see their own books; every borrower sees the same catalog and shares its cached pages
+        variant = self.variant_key(request)
+        return 'borrower' if variant.startswith('borrower:') else variant
+
     def perform_create(self, serializer):
         # Ensure the book is created by the logged-in author
         if hasattr(self.request.user, 'author'):
-            serializer.save(author=self.request.user.author)
+            serializer.save(author_id=self.request.user.author.pk)
+            bump_catalog_version()
         else:
             raise PermissionDenied("Only authors can create books.")
 
+    def perform_update(self, serializer):
+        serializer.save()
+        bump_catalog_version()
+
     def destroy(self, request, *args, **kwargs):
         # Prevent authors from deleting books
         raise PermissionDenied("Authors cannot delete books.")
@@ -117,73 +148,70 @@ class BookViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
 
         # Check if the author is allowed to update this book
-        if instance.author != request.user.author:
+        if instance.author_id != request.user.author.pk:
             raise PermissionDenied("You do not have permission to edit this book.")
 
-        # Ensure fields like borrowed_by, reserved_by, and average_rating are not updated
+        # Ensure fields like available_copies, reserved_by, and average_rating are not updated
         data = request.data
-        if 'borrowed_by' in data or 'reserved_by' in data or 'average_rating' in data:
-            raise PermissionDenied("You cannot update borrowed_by, reserved_by, or average_rating fields.")
+        if any(field in data for field in ('total_copies', 'available_copies', 'reserved_by', 'average_rating')):
+            raise PermissionDenied(
+                "You cannot update total_copies, available_copies, reserved_by, or average_rating fields."
+            )
 
         self.perform_update(serializer)
 
         return Response(serializer.data)
 
-    @action(detail=True, methods=['get'])
+    def reviews_queryset(self, book):
+        return self.sparse_queryset(Review.objects.filter(book=book))
+
+    @action(detail=True, methods=['get'], serializer_class=ReviewSerializer)
     def reviews(self, request, pk=None):
         """Fetch reviews for a specific book"""
         book = self.get_object()
-        reviews = Review.objects.filter(book=book)
-        serializer = ReviewSerializer(reviews, many=True)
-        return Response(serializer.data)
+        paginator = IdCursorPagination()
+        page = paginator.paginate_queryset(self.reviews_queryset(book), request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['post'], serializer_class=AddCopiesSerializer)
+    def copies(self, request, pk=None):
+        """Add copies of a book to the collection"""
+        book = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        circulation.add_copies(book.pk, serializer.validated_data['count'])
+        book.refresh_from_db(fields=['total_copies', 'available_copies'])
+        return Response(
+            {"total_copies": book.total_copies, "available_copies": book.available_copies},
+            status=status.HTTP_200_OK
+        )
 
     @action(detail=True, methods=['post'])
     def borrow(self, request, pk=None):
         """Borrow a book if it is available"""
-        book = self.get_object()
-        borrower = self.request.user.borrower
-
-        # Check if the book is already borrowed
-        if book.borrowed_by:
-            raise PermissionDenied("This book is currently borrowed by someone else.")
-
-        # Check if the book is already reserved
-        if book.reserved_by and book.reserved_by != borrower:
-            raise PermissionDenied("This book is currently reserved by someone else.")
-
-        # Check if the borrower already has 5 borrowed books
-        active_borrowings_count = BorrowingTransaction.objects.filter(borrower=borrower, is_returned=False).count()
-        if active_borrowings_count >= 5:
-            raise PermissionDenied("You cannot borrow more than 5 books at a time.")
-
-        if book.reserved_by == borrower:
-            Reservation.objects.filter(book=book, borrower=borrower).delete()
-            book.reserved_by = None
+        if not hasattr(self.request.user, 'borrower'):
+            raise PermissionDenied("Only borrowers can borrow books.")
 
-        # Create a new BorrowingTransaction
-        borrowed_date = timezone.now()
-        due_date = borrowed_date + timedelta(days=30)  # Due date is 30 days after borrowed date
-
-        # Create the borrowing transaction
-        BorrowingTransaction.objects.create(
-            borrower=self.request.user.borrower,
-            book=book,
-            borrowed_date=borrowed_date,
-            due_date=due_date,
-            is_returned=False
-        )
-
-        # Mark the book as borrowed
-        book.borrowed_by = self.request.user.borrower
-        book.save()
+        try:
+            circulation.borrow(pk, self.request.user.borrower.pk, books=self.get_queryset())
+        except Book.DoesNotExist:
+            raise NotFound("Book not found.")
+        except circulation.CirculationError as error:
+            raise PermissionDenied(str(error))
 
         return Response({"message": "Book borrowed successfully!"}, status=status.HTTP_200_OK)
 
 
 # Borrowing Transaction ViewSet
-class BorrowingTransactionViewSet(viewsets.ModelViewSet):
+# Read-only apart from its actions: loans are only written through circulation, which keeps copies and counters in step
+class BorrowingTransactionViewSet(
+    ReplicaReadsMixin, SparseFieldsetsMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+):
     queryset = BorrowingTransaction.objects.all()
     serializer_class = BorrowingTransactionSerializer
+    pagination_class = IdCursorPagination
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -191,7 +219,7 @@ class BorrowingTransactionViewSet(viewsets.ModelViewSet):
         borrower = user.borrower if hasattr(user, 'borrower') else None
 
         # Base queryset for the borrower
-        queryset = BorrowingTransaction.objects.filter(borrower=borrower)
+        queryset = self.queryset.filter(borrower=borrower)
 
         # Get filter parameters
         filter_type = self.request.query_params.get('filter', None)
@@ -215,23 +243,25 @@ class BorrowingTransactionViewSet(viewsets.ModelViewSet):
         transaction = self.get_object()
 
         # Ensure the borrower can only return their own borrowed books
-        if transaction.borrower != self.request.user.borrower:
+        if transaction.borrower_id != self.request.user.borrower.pk:
             raise PermissionDenied("You can only return books you have borrowed.")
 
-        # Ensure the book has not already been returned
-        if transaction.is_returned:
-            return Response({"error": "This book has already been returned."}, status=status.HTTP_400_BAD_REQUEST)
+        # Mark the transaction as returned and free the book for other borrowers
+        try:
+            circulation.return_book(transaction)
+        except circulation.CirculationError as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Mark the transaction as returned and update the book's status
-        transaction.is_returned = True
-        transaction.returned_date = timezone.now()
-        transaction.save()
+        return Response({"message": "Book returned successfully!"}, status=status.HTTP_200_OK)
 
-        # Free the book for other borrowers
-        transaction.book.borrowed_by = None
-        transaction.book.save()
+    @action(detail=False, methods=['post'], serializer_class=CirculationBatchSerializer)
+    def batch(self, request):
+        """Borrow, return and extend a stack of books at once, e.g. from a self-checkout kiosk"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-        return Response({"message": "Book returned successfully!"}, status=status.HTTP_200_OK)
+        results = circulation.apply_batch(self.request.user.borrower.pk, serializer.validated_data['operations'])
+        return Response({"results": results}, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['post'], url_path='extend')
     def extend_borrowing(self, request, pk=None):
@@ -251,9 +281,10 @@ class BorrowingTransactionViewSet(viewsets.ModelViewSet):
 
 
 # Reservation ViewSet
-class ReservationViewSet(viewsets.ModelViewSet):
+class ReservationViewSet(ReplicaReadsMixin, SparseFieldsetsMixin, viewsets.ModelViewSet):
     queryset = Reservation.objects.all()
     serializer_class = ReservationSerializer
+    pagination_class = IdCursorPagination
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -262,39 +293,55 @@ class ReservationViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'])
     def reserve_book(self, request, pk=None):
-        """Allow a borrower to reserve a book if it is already borrowed but not reserved"""
+        """
+        Allow a borrower to reserve a book if it is already borrowed but not reserved,
+        or to join its hold queue if someone else reserved it first
+        """
         try:
             book = Book.objects.get(pk=pk)
         except Book.DoesNotExist:
             return Response({"error": "Book not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        # Check if the book is currently borrowed
-        if not book.borrowed_by:
-            return Response({"error": "Book is not currently borrowed, cannot be reserved."}, status=status.HTTP_400_BAD_REQUEST)
+        borrower = request.user.borrower
 
-        # Check if the book is already reserved by someone else
-        if book.reserved_by:
-            return Response({"error": "Book is already reserved by someone else."}, status=status.HTTP_400_BAD_REQUEST)
+        # Check if every copy is currently borrowed, or the one left is held for someone
+        if book.available_copies and book.reserved_by_id is None:
+            return Response({"error": "Book is not currently borrowed, cannot be reserved."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Get the current borrowing transaction
-        borrowing_transaction = BorrowingTransaction.objects.filter(book=book, is_returned=False).first()
+        if BorrowingTransaction.objects.filter(book=book, borrower=borrower, is_returned=False).exists():
+            return Response({"error": "You are currently borrowing this book."}, status=status.HTTP_400_BAD_REQUEST)
+        if book.reserved_by_id == borrower.pk:
+            return Response({"error": "You have already reserved this book."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Someone else reserved it first, or the borrower already holds their one reservation: wait in line
+        if book.reserved_by_id is not None or Reservation.objects.filter(borrower=borrower).exists():
+            hold, created = holds.join_queue(book.pk, borrower.pk)
+            return Response(
+                {"message": "You have been added to the hold queue.", "hold": hold.pk, "position": hold.position},
+                status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+            )
+
+        # Get the borrowing transaction of the first copy due back
+        borrowing_transaction = (
+            BorrowingTransaction.objects.filter(book=book, is_returned=False).order_by('due_date').first()
+        )
 
         if not borrowing_transaction:
             return Response({"error": "No valid borrowing transaction found."}, status=status.HTTP_400_BAD_REQUEST)
 
         # Calculate the expiration date for the reservation (10 days after the book's due date)
-        expiration_date = borrowing_transaction.due_date + timezone.timedelta(days=10)
+        expiration_date = borrowing_transaction.due_date + holds.RESERVATION_GRACE
 
         # Create the reservation
         reservation = Reservation.objects.create(
-            borrower=request.user.borrower,
+            borrower=borrower,
             book=book,
             expiration_date=expiration_date
         )
 
-        # Update the book to reflect that it's reserved
-        book.reserved_by = request.user.borrower
-        book.save()
+        # Update the book to reflect that it's reserved, leaving its counters to the statements that maintain them
+        Book.objects.filter(pk=book.pk).update(reserved_by=borrower, updated_at=timezone.now())
+        bump_catalog_version([book.id], availability=True)
 
         return Response({"message": "Book reserved successfully!", "expiration_date": expiration_date}, status=status.HTTP_201_CREATED)
 
@@ -313,19 +360,38 @@ class ReservationViewSet(viewsets.ModelViewSet):
             return Response({"error": "You do not have permission to cancel this reservation."}, status=status.HTTP_403_FORBIDDEN)
 
         # Clear the reservation from the Book and delete the reservation record
-        book = reservation.book
-        book.reserved_by = None
-        book.save()
+        book_id = reservation.book_id
+        Book.objects.filter(pk=book_id).update(reserved_by=None, updated_at=timezone.now())
+        bump_catalog_version([book_id], availability=True)
 
         reservation.delete()
+        # The next borrower in the book's hold queue takes the reservation over
+        holds.promote([book_id])
 
         return Response({"message": "Your reservation has been canceled."}, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['get'], url_path='holds', serializer_class=HoldSerializer)
+    def list_holds(self, request):
+        """List the borrower's places in hold queues, with their current position"""
+        queryset = self.sparse_queryset(Hold.objects.filter(borrower=request.user.borrower))
+        paginator = IdCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['delete'], url_path=r'holds/(?P<hold_id>\d+)')
+    def leave_queue(self, request, hold_id=None):
+        """Give up a place in a hold queue"""
+        if not holds.leave_queue(hold_id, request.user.borrower.pk):
+            return Response({"error": "Hold not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
 # Review ViewSet
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(ReplicaReadsMixin, SparseFieldsetsMixin, viewsets.ModelViewSet):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
+    pagination_class = IdCursorPagination
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -333,7 +399,7 @@ class ReviewViewSet(viewsets.ModelViewSet):
         return self.queryset
 
     def perform_create(self, serializer):
-        """Allow users to create a review for books they've borrowed and update the book's average rating."""
+        """Allow users to create a review for books they've borrowed and update the book's rating counters."""
         borrower = self.request.user.borrower
         book = serializer.validated_data['book']
 
@@ -341,51 +407,54 @@ class ReviewViewSet(viewsets.ModelViewSet):
         if not BorrowingTransaction.objects.filter(borrower=borrower, book=book).exists():
             raise ValidationError("You can only review books that you have borrowed.")
 
-        # Save the review
-        serializer.save(borrower=borrower)
-
-        # Update the book's average rating
-        self.update_book_average_rating(book)
+        with atomic():
+            review = serializer.save(borrower_id=borrower.pk)
+            apply_rating_change(review.book_id, added=review.rating)
 
     def perform_update(self, serializer):
-        """Allow users to update their own reviews and update the book's average rating."""
-        review = self.get_object()
-        serializer.save()
-
-        # Update the book's average rating after the review is updated
-        self.update_book_average_rating(review.book)
+        """Allow users to update their own reviews and update the book's rating counters."""
+        with atomic():
+            # The counters hold the rating committed last, which a concurrent edit may have changed since the read
+            previous_rating = self.locked_rating(serializer.instance)
+            review = serializer.save()
+            if review.rating != previous_rating:
+                apply_rating_change(review.book_id, added=review.rating, removed=previous_rating)
 
     def perform_destroy(self, instance):
-        """Allow users to delete their reviews and update the book's average rating."""
-        book = instance.book
-        instance.delete()
-
-        # Update the book's average rating after the review is deleted
-        self.update_book_average_rating(book)
-
-    def update_book_average_rating(self, book):
-        """Calculate and update the average rating of a book based on all its reviews."""
-        average_rating = Review.objects.filter(book=book).aggregate(Avg('rating'))['rating__avg'] or 0
-        book.average_rating = average_rating
-        book.save()
+        """Allow users to delete their reviews and update the book's rating counters."""
+        with atomic():
+            rating = self.locked_rating(instance)
+            instance.delete()
+            apply_rating_change(instance.book_id, removed=rating)
+
+    def locked_rating(self, review):
+        """Lock the review's row until the transaction ends and return its current rating."""
+        try:
+            return Review.objects.select_for_update().values_list('rating', flat=True).get(pk=review.pk)
+        except Review.DoesNotExist:
+            raise NotFound("Review not found.")
 
     @action(detail=False, methods=['get'], url_path='book/(?P<book_id>[^/.]+)')
     def reviews_by_book(self, request, book_id=None):
         """Get all reviews for a specific book."""
-        reviews = self.queryset.filter(book__id=book_id)
-        serializer = ReviewSerializer(reviews, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        reviews = self.sparse_queryset(self.queryset.filter(book__id=book_id))
+        page = self.paginate_queryset(reviews)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(ReplicaReadsMixin, SparseFieldsetsMixin, viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
+    pagination_class = IdCursorPagination
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         """
-        Return notifications for the logged-in user only.
+        Return notifications for the logged-in borrower only; other accounts have none.
         """
-        return Notification.objects.filter(user=self.request.user).order_by('-created_at')
+        user = self.request.user
+        borrower = user.borrower if hasattr(user, 'borrower') else None
+        return Notification.objects.filter(borrower=borrower).order_by('-id')
 
     @action(detail=True, methods=['post'])
     def mark_as_read(self, request, pk=None):
@@ -395,6 +464,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
         notification = self.get_object()
         notification.read = True
         notification.save()
+        events.publish_read(notification.borrower_id, [notification.pk])
         return Response({"message": "Notification marked as read"})
 
     @action(detail=False, methods=['post'])
@@ -402,6 +472,8 @@ class NotificationViewSet(viewsets.ModelViewSet):
         """
         Mark all notifications for the logged-in user as read.
         """
-        notifications = Notification.objects.filter(user=self.request.user, read=False)
+        notifications = self.get_queryset().filter(read=False)
         count = notifications.update(read=True)
+        if count:
+            events.publish_read(self.request.user.borrower.pk)
         return Response({"message": f"{count} notifications marked as read"}, status=status.HTTP_200_OK)
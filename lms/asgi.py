@@ -9,8 +9,21 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler, ASGIRequest
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lms.settings')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+
+class LibraryASGIRequest(ASGIRequest):
+    # Resolved against the URLconf whose hot read endpoints are async-native
+    urlconf = 'lms.asgi_urls'
+
+
+class LibraryASGIHandler(ASGIHandler):
+    request_class = LibraryASGIRequest
+
+
+application = LibraryASGIHandler()
@@ -0,0 +1,24 @@
+"""
+URL configuration of the ASGI application (see lms.asgi).
+
+The hot read endpoints resolve to async-native viewsets, which serve their
+other methods through the regular views; everything else is lms.urls. The
+notification stream is only served here: under WSGI each open stream would
+hold a worker thread.
+"""
+from django.urls import include, path
+from rest_framework.routers import SimpleRouter
+from libraryMS.async_views import AsyncBookViewSet, AsyncBorrowingTransactionViewSet, AsyncNotificationViewSet
+from libraryMS.streams import notification_stream
+from lms.urls import urlpatterns as wsgi_urlpatterns
+
+router = SimpleRouter()
+router.register(r'books', AsyncBookViewSet, basename='book')
+router.register(r'borrowings', AsyncBorrowingTransactionViewSet, basename='borrowing')
+router.register(r'notifications', AsyncNotificationViewSet, basename='notification')
+
+urlpatterns = [
+    # Ahead of the router, whose notification detail route would take 'stream' for a primary key
+    path('libraryMS/notifications/stream/', notification_stream, name='notification_stream'),
+    path('libraryMS/', include(router.urls)),
+] + wsgi_urlpatterns
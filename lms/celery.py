@@ -19,21 +19,11 @@ app.autodiscover_tasks()
 # Optional: Set some default configuration
 app.conf.broker_url = 'redis://localhost:6379/0'  # Pointing to Redis running locally
 
+# One pass covers reservation expiry and availability, due date reminders and overdue
+# notices; the individual tasks remain available for one-off runs
 app.conf.beat_schedule = {
-    'cancel-expired-reservations-daily': {
-        'task': 'libraryMS.tasks.cancel_expired_reservations',
+    'daily-circulation-sweep': {
+        'task': 'libraryMS.tasks.daily_circulation_sweep',
         'schedule': crontab(minute=0, hour=9),
     },
-    'send-reservation-available-notifications': {
-        'task': 'libraryMS.tasks.send_reservation_available_notifications',
-        'schedule': crontab(minute=0, hour=9),
-    },
-    'send-due-date-notifications': {
-        'task': 'libraryMS.tasks.send_due_date_notifications',
-        'schedule': crontab(minute=0, hour=9),
-    },
-    'send_overdue_notifications': {
-        'task': 'libraryMS.tasks.send_overdue_notifications',
-        'schedule': crontab(minute=0, hour=9),
-    }
 }
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
+from importlib.util import find_spec
 import os
 import dj_database_url
 from datetime import timedelta
@@ -40,10 +41,12 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     # 'libraryMS.apps.LibraryConfig',
     'libraryMS',
+    'django_filters',
     'drf_spectacular',
 ]
 
@@ -52,15 +55,35 @@ AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
 ]
 
+# Offer application/msgpack alongside JSON (see libraryMS.renderers)
+MSGPACK_ENABLED = find_spec('msgpack') is not None
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-        'libraryMS.authentication.CustomModelBackend',
+        # Trusts the signed token instead of loading the user row on every request
+        'rest_framework_simplejwt.authentication.JWTStatelessUserAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # JSON goes through orjson when it is installed; MessagePack is only sent to clients asking for it
+    'DEFAULT_RENDERER_CLASSES': (
+        'libraryMS.renderers.FastJSONRenderer',
+        *(['libraryMS.renderers.MessagePackRenderer'] if MSGPACK_ENABLED else []),
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'libraryMS.renderers.FastJSONParser',
+        *(['libraryMS.renderers.MessagePackParser'] if MSGPACK_ENABLED else []),
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    'TEST_REQUEST_RENDERER_CLASSES': (
+        'rest_framework.renderers.MultiPartRenderer',
+        'libraryMS.renderers.FastJSONRenderer',
+        *(['libraryMS.renderers.MessagePackRenderer'] if MSGPACK_ENABLED else []),
+    ),
 }
 
 SIMPLE_JWT = {
@@ -68,6 +91,8 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    'TOKEN_OBTAIN_SERIALIZER': 'libraryMS.serializers.RoleTokenObtainPairSerializer',
+    'TOKEN_USER_CLASS': 'libraryMS.authentication.RoleTokenUser',
 }
 
 CELERY_BROKER_URL = 'redis://localhost:6379/0'  
@@ -76,8 +101,45 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+# Tasks whose runs are recorded as TaskRun rows (see libraryMS.telemetry)
+TASK_TELEMETRY_PREFIXES = ('libraryMS.tasks.',)
+# The daily sweeps run inline below this many matching rows, and otherwise as one
+# shard per this many rows, spread over the workers (see libraryMS.sweeps)
+SWEEP_ROWS_PER_SHARD = 20_000
+SWEEP_MAX_SHARDS = 32
+# Runs of a failed shard before its sweep gives up on it
+SWEEP_MAX_ATTEMPTS = 3
+
+# Pub/sub used to push new notifications to open streams, off when empty. 'memory://'
+# only reaches streams in the publishing process, so it suits a single ASGI process
+# and nothing else; a redis:// URL reaches every web process, from workers too.
+NOTIFICATION_EVENTS_URL = os.getenv('NOTIFICATION_EVENTS_URL', '')
+
+# Rendered catalog pages are cached per process in development; set CACHE_URL
+# (redis://...) so every web process shares the pages and their invalidations.
+CACHES = {
+    'default': (
+        {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': os.environ['CACHE_URL']}
+        if os.getenv('CACHE_URL') else
+        {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    ),
+}
+CATALOG_CACHE_ALIAS = 'default'
+# Upper bound on how long a page can survive a missed eviction
+CATALOG_CACHE_SECONDS = 300
+
+# Share of requests profiled (SQL, serializer and render time) into Server-Timing
+# headers and the histograms at /metrics; 0 leaves only one random draw per request.
+INSTRUMENTATION_SAMPLE_RATE = float(os.getenv('INSTRUMENTATION_SAMPLE_RATE', '0'))
+INSTRUMENTATION_SLOWEST_QUERIES = 3
+# Sampled requests slower than this are logged with their slowest statements
+INSTRUMENTATION_SLOW_REQUEST_MS = 500
+# /metrics requires "Authorization: Bearer <token>"; with no token it is only served under DEBUG
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
 
 MIDDLEWARE = [
+    # Outermost, so the profile covers every other middleware
+    'libraryMS.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -118,6 +180,23 @@ DATABASES = {
     )
 }
 
+# Read replicas, as comma-separated database URLs. Safe-method API reads, reports and the
+# reservation reconciliation scan use them (see libraryMS.routers); a second SQLite file
+# copied from the primary stands in for one locally.
+DATABASE_REPLICAS = []
+for index, url in enumerate(filter(None, os.getenv('DATABASE_REPLICA_URLS', '').split(','))):
+    DATABASES[f'replica_{index}'] = {**dj_database_url.parse(url.strip()), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica_{index}')
+DATABASE_ROUTERS = ['libraryMS.routers.PrimaryReplicaRouter']
+# A user's reads stay on the primary for this long after they write through the API
+REPLICA_STICKY_SECONDS = 10
+# Where those pins are kept; with replicas configured it must be shared by every worker (set CACHE_URL)
+REPLICA_PIN_CACHE = 'default'
+# Replicas further behind than this are skipped until they catch up
+REPLICA_MAX_LAG_SECONDS = 5
+# How long a replica's health and lag are trusted before checking again
+REPLICA_CHECK_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
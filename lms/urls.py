@@ -17,6 +17,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
+from libraryMS.instrumentation import metrics_view
 
 
 urlpatterns = [
@@ -25,4 +26,5 @@ urlpatterns = [
     path('schema/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
     path('admin/', admin.site.urls),
     path('libraryMS/', include('libraryMS.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]